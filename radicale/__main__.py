@@ -42,7 +42,6 @@ def run() -> None:
     if sys.platform == "win32":
         exit_signal_numbers.append(signal.SIGBREAK)
     else:
-        exit_signal_numbers.append(signal.SIGHUP)
         exit_signal_numbers.append(signal.SIGQUIT)
 
     # Raise SystemExit when signal arrives to run cleanup code
@@ -53,6 +52,9 @@ def run() -> None:
         sys.exit(1)
     for signal_number in exit_signal_numbers:
         signal.signal(signal_number, exit_signal_handler)
+    if sys.platform != "win32":
+        # Reloading is only possible after the server started
+        signal.signal(signal.SIGHUP, exit_signal_handler)
 
     log.setup()
 
@@ -64,6 +66,12 @@ def run() -> None:
     parser.add_argument("--version", action="version", version=VERSION)
     parser.add_argument("--verify-storage", action="store_true",
                         help="check the storage for errors and exit")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="build the caches of the storage and exit")
+    parser.add_argument("--jobs", type=int, metavar="VALUE",
+                        help="number of processes for --verify-storage "
+                        "(default: 1) and --warm-cache (default: number of "
+                        "CPUs)")
     parser.add_argument("-C", "--config",
                         help="use specific configuration files", nargs="*")
     parser.add_argument("-D", "--debug", action="store_const", const="debug",
@@ -151,7 +159,7 @@ def run() -> None:
             arguments_config[section] = arguments_config.get(section, {})
             arguments_config[section][option] = value
 
-    try:
+    def load_configuration() -> config.Configuration:
         configuration = config.load(config.parse_compound_paths(
             config.DEFAULT_CONFIG_PATH,
             os.environ.get("RADICALE_CONFIG"),
@@ -159,6 +167,16 @@ def run() -> None:
             else None))
         if arguments_config:
             configuration.update(arguments_config, "command line arguments")
+        return configuration
+
+    def reload_configuration() -> config.Configuration:
+        configuration = load_configuration()
+        log.set_level(cast(str, configuration.get("logging", "level")))
+        log.set_queued(configuration.get("logging", "queued"))
+        return configuration
+
+    try:
+        configuration = load_configuration()
     except Exception as e:
         logger.critical("Invalid configuration: %s", e, exc_info=True)
         sys.exit(1)
@@ -175,7 +193,8 @@ def run() -> None:
         try:
             storage_ = storage.load(configuration)
             with storage_.acquire_lock("r"):
-                if not storage_.verify():
+                if not storage_.verify(1 if args_ns.jobs is None
+                                       else args_ns.jobs):
                     logger.critical("Storage verifcation failed")
                     sys.exit(1)
         except Exception as e:
@@ -184,18 +203,46 @@ def run() -> None:
             sys.exit(1)
         return
 
+    if args_ns.warm_cache:
+        logger.info("Warming cache")
+        try:
+            storage_ = storage.load(configuration)
+            with storage_.acquire_lock("r"):
+                if not storage_.warm_cache(args_ns.jobs or 0):
+                    logger.critical("Failed to load some items")
+                    sys.exit(1)
+        except Exception as e:
+            logger.critical("An exception occurred while warming the "
+                            "cache: %s", e, exc_info=True)
+            sys.exit(1)
+        return
+
     # Create a socket pair to notify the server of program shutdown
     shutdown_socket, shutdown_socket_out = socket.socketpair()
 
+    # Create a socket pair to notify the server of configuration reloads
+    reload_socket, reload_socket_out = socket.socketpair()
+    reload_socket.setblocking(False)
+
     # Shutdown server when signal arrives
     def shutdown_signal_handler(signal_number: int,
                                 stack_frame: Optional[FrameType]) -> None:
         shutdown_socket.close()
+
+    # Reload configuration when SIGHUP arrives
+    def reload_signal_handler(signal_number: int,
+                              stack_frame: Optional[FrameType]) -> None:
+        with contextlib.suppress(OSError):
+            reload_socket.send(b"\0")
     for signal_number in exit_signal_numbers:
         signal.signal(signal_number, shutdown_signal_handler)
+    if sys.platform != "win32":
+        signal.signal(signal.SIGHUP, reload_signal_handler)
 
+    log.set_queued(configuration.get("logging", "queued"))
     try:
-        server.serve(configuration, shutdown_socket_out)
+        server.serve(configuration, shutdown_socket_out, reload_socket_out,
+                     reload_configuration)
     except Exception as e:
         logger.critical("An exception occurred during server startup: %s", e,
                         exc_info=True)
@@ -26,15 +26,19 @@ the built-in server (see ``radicale.server`` module).
 """
 
 import base64
+import codecs
 import datetime
+import json
+import logging
 import pprint
 import random
 import time
 import zlib
 from http import client
-from typing import Iterable, List, Mapping, Tuple, Union
+from typing import (Dict, Iterable, Iterator, List, Mapping, Optional, Tuple,
+                    Union)
 
-from radicale import config, httputils, log, pathutils, types
+from radicale import config, httputils, log, metrics, pathutils, types
 from radicale.app.base import ApplicationBase
 from radicale.app.delete import ApplicationPartDelete
 from radicale.app.get import ApplicationPartGet
@@ -53,6 +57,10 @@ from radicale.log import logger
 # Combination of types.WSGIStartResponse and WSGI application return value
 _IntermediateResponse = Tuple[str, List[Tuple[str, str]], Iterable[bytes]]
 
+# Principal collections that are known to exist are looked up again after
+# this time, other processes might have deleted them (seconds)
+PRINCIPAL_PATHS_TTL: float = 10
+
 
 class Application(ApplicationPartDelete, ApplicationPartHead,
                   ApplicationPartGet, ApplicationPartMkcalendar,
@@ -64,10 +72,14 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
 
     _mask_passwords: bool
     _auth_delay: float
-    _internal_server: bool
     _max_content_length: int
     _auth_realm: str
     _extra_headers: Mapping[str, str]
+    _metrics: bool
+    _access_log_sample_rate: float
+    # Paths of principal collections that are known to exist and the time
+    # when they must be looked up again
+    _principal_paths: Dict[str, float]
 
     def __init__(self, configuration: config.Configuration) -> None:
         """Initialize Application.
@@ -79,15 +91,39 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
         """
         super().__init__(configuration)
         self._mask_passwords = configuration.get("logging", "mask_passwords")
+        self._access_log_sample_rate = configuration.get(
+            "logging", "access_log_sample_rate")
         self._auth_delay = configuration.get("auth", "delay")
-        self._internal_server = configuration.get("server", "_internal_server")
         self._max_content_length = configuration.get(
             "server", "max_content_length")
         self._auth_realm = configuration.get("auth", "realm")
+        self._metrics = configuration.get("metrics", "enabled")
+        self._principal_paths = {}
         self._extra_headers = dict()
         for key in self.configuration.options("headers"):
             self._extra_headers[key] = configuration.get("headers", key)
 
+    def adopt_caches(self, previous: "Application") -> None:
+        """Take over compatible caches of ``previous`` after a reload."""
+        self._storage.adopt_caches(previous._storage)
+
+    def _invalidate_principal_paths(self, path: str) -> None:
+        """Forget principal collections at or below ``path``."""
+        prefix = pathutils.unstrip_path(pathutils.strip_path(path), True)
+        for principal_path in list(self._principal_paths):
+            if principal_path.startswith(prefix):
+                self._principal_paths.pop(principal_path, None)
+
+    def _metrics_method(self, environ: types.WSGIEnviron) -> str:
+        """Get the label of the request method in metrics.
+
+        Methods that aren't handled are combined, the label must not take
+        arbitrary values from clients.
+
+        """
+        method = environ.get("REQUEST_METHOD", "").upper()
+        return method if hasattr(self, "do_%s" % method) else "other"
+
     def _scrub_headers(self, environ: types.WSGIEnviron) -> types.WSGIEnviron:
         """Mask passwords and cookies."""
         headers = dict(environ)
@@ -102,7 +138,9 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
                  types.WSGIStartResponse) -> Iterable[bytes]:
         with log.register_stream(environ["wsgi.errors"]):
             try:
-                status_text, headers, answers = self._handle_request(environ)
+                with metrics.request(self._metrics_method(environ)):
+                    status_text, headers, answers = self._handle_request(
+                        environ)
             except Exception as e:
                 logger.error("An exception occurred during %s request on %r: "
                              "%s", environ.get("REQUEST_METHOD", "unknown"),
@@ -121,6 +159,43 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
             return []
         return answers
 
+    def _encode_stream(self, answer: Iterable[str], compress: bool
+                       ) -> Iterator[bytes]:
+        """Encode and optionally compress a streamed response."""
+        encoder = codecs.getincrementalencoder(self._encoding)()
+        zcomp: Optional["zlib._Compress"] = None
+        if compress:
+            zcomp = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        chunks: List[bytes] = []
+        size = 0
+        compress_seconds = 0.0
+        try:
+            for text in answer:
+                chunk = encoder.encode(text)
+                if zcomp is not None:
+                    start = time.perf_counter()
+                    chunk = zcomp.compress(chunk)
+                    compress_seconds += time.perf_counter() - start
+                chunks.append(chunk)
+                size += len(chunk)
+                # Combine small chunks
+                if size >= httputils.RESPONSE_BODY_CHUNK_SIZE:
+                    yield b"".join(chunks)
+                    chunks.clear()
+                    size = 0
+        finally:
+            # Release resources of the answer when the client disconnects
+            if hasattr(answer, "close"):
+                answer.close()  # type:ignore[attr-defined]
+        chunk = encoder.encode("", final=True)
+        if zcomp is not None:
+            start = time.perf_counter()
+            chunk = zcomp.compress(chunk) + zcomp.flush()
+            compress_seconds += time.perf_counter() - start
+            metrics.observe_phase("compress", compress_seconds)
+        chunks.append(chunk)
+        yield b"".join(chunks)
+
     def _handle_request(self, environ: types.WSGIEnviron
                         ) -> _IntermediateResponse:
         time_begin = datetime.datetime.now()
@@ -129,28 +204,44 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
 
         """Manage a request."""
         def response(status: int, headers: types.WSGIResponseHeaders,
-                     answer: Union[None, str, bytes]) -> _IntermediateResponse:
+                     answer: Union[None, str, bytes, Iterable[str]]
+                     ) -> _IntermediateResponse:
             """Helper to create response from internal types.WSGIResponse"""
             headers = dict(headers)
             # Set content length
-            answers = []
+            answers: Iterable[bytes] = []
             if answer is not None:
-                if isinstance(answer, str):
-                    logger.debug("Response content:\n%s", answer)
-                    headers["Content-Type"] += "; charset=%s" % self._encoding
-                    answer = answer.encode(self._encoding)
                 accept_encoding = [
                     encoding.strip() for encoding in
                     environ.get("HTTP_ACCEPT_ENCODING", "").split(",")
                     if encoding.strip()]
-
-                if "gzip" in accept_encoding:
-                    zcomp = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
-                    answer = zcomp.compress(answer) + zcomp.flush()
+                compress = "gzip" in accept_encoding
+                if compress:
                     headers["Content-Encoding"] = "gzip"
-
-                headers["Content-Length"] = str(len(answer))
-                answers.append(answer)
+                if not isinstance(answer, (str, bytes)):
+                    # Stream response without content length, the server
+                    # uses chunked transfer encoding
+                    headers["Content-Type"] += "; charset=%s" % self._encoding
+                    if request_method == "HEAD":
+                        # Release resources that are held by the stream
+                        if hasattr(answer, "close"):
+                            answer.close()  # type:ignore[attr-defined]
+                    else:
+                        answers = self._encode_stream(answer, compress)
+                else:
+                    if isinstance(answer, str):
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug("Response content:\n%s", answer)
+                        headers["Content-Type"] += "; charset=%s" % (
+                            self._encoding)
+                        answer = answer.encode(self._encoding)
+                    if compress:
+                        with metrics.phase("compress"):
+                            zcomp = zlib.compressobj(
+                                wbits=16 + zlib.MAX_WBITS)
+                            answer = zcomp.compress(answer) + zcomp.flush()
+                    headers["Content-Length"] = str(len(answer))
+                    answers = [answer]
 
             # Add extra headers set in configuration
             headers.update(self._extra_headers)
@@ -159,12 +250,24 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
             time_end = datetime.datetime.now()
             status_text = "%d %s" % (
                 status, client.responses.get(status, "Unknown"))
+            duration = (time_end - time_begin).total_seconds()
             logger.info("%s response status for %r%s in %.3f seconds: %s",
                         request_method, unsafe_path, depthinfo,
-                        (time_end - time_begin).total_seconds(), status_text)
+                        duration, status_text)
+            if (self._access_log_sample_rate > 0 and
+                    random.random() < self._access_log_sample_rate):
+                log.access_logger.info("%s", json.dumps({
+                    "time": time_begin.astimezone().isoformat(),
+                    "remote": environ.get("REMOTE_ADDR", ""),
+                    "user": user, "method": request_method,
+                    "path": unsafe_path, "depth": environ.get(
+                        "HTTP_DEPTH", ""), "status": status,
+                    "duration": round(duration, 6),
+                    "user_agent": environ.get("HTTP_USER_AGENT", "")}))
             # Return response content
             return status_text, list(headers.items()), answers
 
+        user = ""
         remote_host = "unknown"
         if environ.get("REMOTE_HOST"):
             remote_host = repr(environ["REMOTE_HOST"])
@@ -182,8 +285,9 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
         logger.info("%s request for %r%s received from %s%s",
                     request_method, unsafe_path, depthinfo,
                     remote_host, remote_useragent)
-        logger.debug("Request headers:\n%s",
-                     pprint.pformat(self._scrub_headers(environ)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request headers:\n%s",
+                         pprint.pformat(self._scrub_headers(environ)))
 
         # SCRIPT_NAME is already removed from PATH_INFO, according to the
         # WSGI specification.
@@ -207,6 +311,13 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
         path = pathutils.sanitize_path(unsafe_path)
         logger.debug("Sanitized path: %r", path)
 
+        # Metrics are exposed without authentication
+        if (self._metrics and path == "/.metrics" and
+                request_method in ("GET", "HEAD")):
+            return response(client.OK, {
+                "Content-Type": "text/plain; version=0.0.4"},
+                metrics.expose())
+
         # Get function corresponding to method
         function = getattr(self, "do_%s" % request_method, None)
         if not function:
@@ -236,7 +347,9 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
                 self.configuration, environ, base64.b64decode(
                     authorization.encode("ascii"))).split(":", 1)
 
-        user = self._auth.login(login, password) or "" if login else ""
+        if login:
+            with metrics.phase("auth"):
+                user = self._auth.login(login, password) or ""
         if user and login == user:
             logger.info("Successful login: %r", user)
         elif user:
@@ -258,11 +371,17 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
         # Create principal collection
         if user:
             principal_path = "/%s/" % user
-            with self._storage.acquire_lock("r", user):
-                principal = next(iter(self._storage.discover(
-                    principal_path, depth="1")), None)
-            if not principal:
-                if "W" in self._rights.authorization(user, principal_path):
+            if (self._principal_paths.get(principal_path, 0) <=
+                    time.monotonic()):
+                with self._storage.acquire_lock("r", user), \
+                        metrics.phase("principal"):
+                    principal = next(iter(self._storage.discover(
+                        principal_path)), None)
+                if principal:
+                    self._principal_paths[principal_path] = (
+                        time.monotonic() + PRINCIPAL_PATHS_TTL)
+                elif "W" in self._rights.authorization(
+                        user, principal_path):
                     with self._storage.acquire_lock("w", user):
                         try:
                             self._storage.create_collection(principal_path)
@@ -270,22 +389,34 @@ class Application(ApplicationPartDelete, ApplicationPartHead,
                             logger.warning("Failed to create principal "
                                            "collection %r: %s", user, e)
                             user = ""
+                        else:
+                            self._principal_paths[principal_path] = (
+                                time.monotonic() + PRINCIPAL_PATHS_TTL)
                 else:
                     logger.warning("Access to principal path %r denied by "
                                    "rights backend", principal_path)
 
-        if self._internal_server:
-            # Verify content length
-            content_length = int(environ.get("CONTENT_LENGTH") or 0)
-            if content_length:
-                if (self._max_content_length > 0 and
-                        content_length > self._max_content_length):
-                    logger.info("Request body too large: %d", content_length)
-                    return response(*httputils.REQUEST_ENTITY_TOO_LARGE)
+        # Verify content length before the request body is read, it's also
+        # enforced while reading
+        content_length = int(environ.get("CONTENT_LENGTH") or 0)
+        if content_length:
+            if (self._max_content_length > 0 and
+                    content_length > self._max_content_length):
+                logger.info("Request body too large: %d", content_length)
+                return response(*httputils.REQUEST_ENTITY_TOO_LARGE)
 
         if not login or user:
-            status, headers, answer = function(
-                environ, base_prefix, path, user)
+            try:
+                status, headers, answer = function(
+                    environ, base_prefix, path, user)
+            except httputils.RequestBodyTooLargeError as e:
+                logger.info("%s", e)
+                return response(*httputils.REQUEST_ENTITY_TOO_LARGE)
+            finally:
+                # Collections might have been deleted or replaced
+                if request_method in ("DELETE", "MKCALENDAR", "MKCOL",
+                                      "MOVE"):
+                    self._invalidate_principal_paths(path)
             if (status, headers, answer) == httputils.NOT_ALLOWED:
                 logger.info("Access to %r denied for %s", path,
                             repr(user) if user else "anonymous user")
@@ -19,10 +19,10 @@ import logging
 import posixpath
 import sys
 import xml.etree.ElementTree as ET
-from typing import Optional
+from typing import Iterator, List, Optional
 
-from radicale import (auth, config, httputils, pathutils, rights, storage,
-                      types, web, xmlutils)
+from radicale import (auth, config, httputils, metrics, pathutils, rights,
+                      storage, types, web, xmlutils)
 from radicale.log import logger
 
 # HACK: https://github.com/tiran/defusedxml/issues/54
@@ -49,29 +49,59 @@ class ApplicationBase:
 
     def _read_xml_request_body(self, environ: types.WSGIEnviron
                                ) -> Optional[ET.Element]:
-        content = httputils.decode_request(
-            self.configuration, environ,
-            httputils.read_raw_request_body(self.configuration, environ))
-        if not content:
-            return None
-        try:
-            xml_content = DefusedET.fromstring(content)
-        except ET.ParseError as e:
-            logger.debug("Request content (Invalid XML):\n%s", content)
-            raise RuntimeError("Failed to parse XML: %s" % e) from e
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug("Request content:\n%s",
-                         xmlutils.pretty_xml(xml_content))
-        return xml_content
+        charsets = httputils.request_charsets(self.configuration, environ)
+        raw_chunks = httputils.iter_raw_request_body(
+            self.configuration, environ)
+        # The request body can only be read once, chunks are kept for
+        # decoding with the next charset until the last one is tried
+        cached_chunks: List[bytes] = []
+
+        def iter_chunks(cache: bool) -> Iterator[bytes]:
+            yield from cached_chunks
+            for chunk in raw_chunks:
+                if cache:
+                    cached_chunks.append(chunk)
+                yield chunk
+
+        for i, charset in enumerate(charsets):
+            is_last = i == len(charsets) - 1
+            # The XML is parsed while the request body is read and decoded
+            parser = DefusedET.XMLParser()
+            empty = True
+            try:
+                for text in httputils.decode_request_chunks(iter_chunks(
+                        not is_last or logger.isEnabledFor(logging.DEBUG)),
+                        charset):
+                    empty = False
+                    parser.feed(text)
+                if empty:
+                    return None
+                xml_content = parser.close()
+            except UnicodeDecodeError:
+                if is_last:
+                    raise
+                continue
+            except ET.ParseError as e:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Request content (Invalid XML):\n%s",
+                                 b"".join(cached_chunks).decode(
+                                     charset, errors="replace"))
+                raise RuntimeError("Failed to parse XML: %s" % e) from e
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Request content:\n%s",
+                             xmlutils.pretty_xml(xml_content))
+            return xml_content
+        raise RuntimeError("No charset to decode request body")
 
     def _xml_response(self, xml_content: ET.Element) -> bytes:
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("Response content:\n%s",
                          xmlutils.pretty_xml(xml_content))
-        f = io.BytesIO()
-        ET.ElementTree(xml_content).write(f, encoding=self._encoding,
-                                          xml_declaration=True)
-        return f.getvalue()
+        with metrics.phase("xml"):
+            f = io.BytesIO()
+            ET.ElementTree(xml_content).write(f, encoding=self._encoding,
+                                              xml_declaration=True)
+            return f.getvalue()
 
     def _webdav_error_response(self, status: int, human_tag: str
                                ) -> types.WSGIResponse:
@@ -98,7 +128,9 @@ class Access:
         self.path = path
         self.parent_path = pathutils.unstrip_path(
             posixpath.dirname(pathutils.strip_path(path)), True)
-        self.permissions = self._rights.authorization(self.user, self.path)
+        with metrics.phase("rights"):
+            self.permissions = self._rights.authorization(
+                self.user, self.path)
         self._parent_permissions = None
 
     @property
@@ -106,8 +138,9 @@ class Access:
         if self.path == self.parent_path:
             return self.permissions
         if self._parent_permissions is None:
-            self._parent_permissions = self._rights.authorization(
-                self.user, self.parent_path)
+            with metrics.phase("rights"):
+                self._parent_permissions = self._rights.authorization(
+                    self.user, self.parent_path)
         return self._parent_permissions
 
     def check(self, permission: str,
@@ -19,8 +19,10 @@
 
 import posixpath
 from http import client
+from typing import Iterator, Sequence
 from urllib.parse import quote
 
+import radicale.item as radicale_item
 from radicale import httputils, pathutils, storage, types, xmlutils
 from radicale.app.base import Access, ApplicationBase
 from radicale.log import logger
@@ -57,6 +59,20 @@ class ApplicationPartGet(ApplicationBase):
             value += "; filename*=%s''%s" % (self._encoding, encoded_filename)
         return value
 
+    def _stream_collection(self, collection: storage.BaseCollection,
+                           items: Sequence[radicale_item.Item]
+                           ) -> Iterator[str]:
+        """Serialize ``collection`` with the ``items`` that were read while
+           the storage was locked."""
+        try:
+            yield from collection.iter_serialize(items)
+        except Exception as e:
+            # The status and the headers were already sent, the response is
+            # aborted
+            logger.error("An exception occurred while streaming %r: %s",
+                         collection.path, e, exc_info=True)
+            raise
+
     def do_GET(self, environ: types.WSGIEnviron, base_prefix: str, path: str,
                user: str) -> types.WSGIResponse:
         """Manage GET request."""
@@ -105,5 +121,9 @@ class ApplicationPartGet(ApplicationBase):
                 "ETag": item.etag}
             if content_disposition:
                 headers["Content-Disposition"] = content_disposition
-            answer = item.serialize()
-            return client.OK, headers, answer
+            if not isinstance(item, storage.BaseCollection):
+                return client.OK, headers, item.serialize()
+            # The body is generated from the items that match the headers, the
+            # lock isn't held while it's sent to the client
+            items = list(item.get_all())
+        return client.OK, headers, self._stream_collection(item, items)
@@ -17,29 +17,163 @@
 # You should have received a copy of the GNU General Public License
 # along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
 
+import concurrent.futures
 import contextlib
+import functools
+import math
+import multiprocessing
 import posixpath
 import socket
+import threading
+import time
 import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
 from http import client
-from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple)
 from urllib.parse import unquote, urlparse
 
+import vobject
+
 import radicale.item as radicale_item
-from radicale import httputils, pathutils, storage, types, xmlutils
+from radicale import (config, httputils, metrics, pathutils, storage, types,
+                      xmlutils)
 from radicale.app.base import Access, ApplicationBase
+from radicale.item import expand as radicale_expand
 from radicale.item import filter as radicale_filter
 from radicale.log import logger
 
+# Texts of items that are sent to worker processes for filtering
+# (href, text, name, component name)
+ItemText = Tuple[Optional[str], str, str, str]
+
+# Chunks per worker process, smaller chunks balance the load better
+CHUNKS_PER_WORKER: int = 4
+
+# Time to wait for the worker processes, the items are matched in the request
+# thread when it's exceeded (seconds)
+PARALLEL_TIMEOUT: float = 30
+
+_executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_executor_workers: int = 0
+# Number of requests that use each pool
+_executor_users: Dict[concurrent.futures.Executor, int] = {}
+_executor_lock: threading.Lock = threading.Lock()
+
+
+def _release_executor(executor: concurrent.futures.Executor) -> None:
+    """Shut down ``executor`` if it was replaced and isn't used anymore.
+
+    ``_executor_lock`` must be held.
+
+    """
+    if executor is not _executor and not _executor_users.get(executor):
+        _executor_users.pop(executor, None)
+        executor.shutdown(wait=False)
+
+
+@contextlib.contextmanager
+def use_executor(workers: int
+                 ) -> Iterator[concurrent.futures.ProcessPoolExecutor]:
+    """Use the process pool for filtering with ``workers`` processes.
+
+    The pool is shared by all applications of the process, it's replaced
+    when the configuration changes the number of processes. Replaced pools
+    are shut down when the last request stops using them.
+
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            previous = _executor
+            # Worker processes are spawned, forking a multithreaded
+            # process is unsafe
+            _executor = concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+            if previous is not None:
+                _release_executor(previous)
+        executor = _executor
+        _executor_users[executor] = _executor_users.get(executor, 0) + 1
+    try:
+        yield executor
+    finally:
+        with _executor_lock:
+            _executor_users[executor] -= 1
+            _release_executor(executor)
+
+
+def discard_executor(executor: concurrent.futures.Executor) -> None:
+    """Replace ``executor`` with a new pool on the next ``use_executor``."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+        _release_executor(executor)
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_filters(collection_tag: str, filters: Tuple[bytes, ...]
+                     ) -> radicale_filter.ItemMatcher:
+    return radicale_filter.compile_filters(
+        [ET.fromstring(filter_) for filter_ in filters], collection_tag)
+
+
+def match_chunk(collection_path: str, collection_tag: str,
+                filters: Tuple[bytes, ...], item_texts: Sequence[ItemText]
+                ) -> List[bool]:
+    """Match items against serialized ``filters`` in a worker process."""
+    filter_plan = _compile_filters(collection_tag, filters)
+    return [filter_plan(radicale_item.Item(
+        collection_path=collection_path, href=href, text=text, name=name,
+        component_name=component_name))
+        for href, text, name, component_name in item_texts]
+
+
+def match_parallel(executor: concurrent.futures.Executor, workers: int,
+                   collection_path: str, collection_tag: str,
+                   filters: Sequence[ET.Element],
+                   items: Sequence[radicale_item.Item]) -> List[bool]:
+    """Match ``items`` against ``filters`` in chunks with ``executor``.
+
+    Raises ``concurrent.futures.TimeoutError`` when the results aren't
+    available after ``PARALLEL_TIMEOUT``.
+
+    """
+    serialized_filters = tuple(ET.tostring(filter_) for filter_ in filters)
+    item_texts = [(item.href, item.serialize(), item.name,
+                   item.component_name) for item in items]
+    chunk_size = math.ceil(len(item_texts) / (workers * CHUNKS_PER_WORKER))
+    futures = [executor.submit(
+        match_chunk, collection_path, collection_tag, serialized_filters,
+        item_texts[i:i + chunk_size])
+        for i in range(0, len(item_texts), chunk_size)]
+    deadline = time.monotonic() + PARALLEL_TIMEOUT
+    results: List[bool] = []
+    try:
+        for future in futures:
+            results.extend(future.result(
+                max(0, deadline - time.monotonic())))
+    except concurrent.futures.TimeoutError:
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
 
 def xml_report(base_prefix: str, path: str, xml_request: Optional[ET.Element],
                collection: storage.BaseCollection, encoding: str,
-               unlock_storage_fn: Callable[[], None]
+               unlock_storage_fn: Callable[[], None],
+               executor: Optional[concurrent.futures.Executor] = None,
+               workers: int = 0, parallel_min_items: int = 0
                ) -> Tuple[int, ET.Element]:
     """Read and answer REPORT requests.
 
     Read rfc3253-3.6 for info.
 
+    Filters are matched with ``executor`` in ``workers`` processes, if at
+    least ``parallel_min_items`` items can't be matched by the storage.
+
     """
     multistatus = ET.Element(xmlutils.make_clark("D:multistatus"))
     if xml_request is None:
@@ -50,6 +184,17 @@ def xml_report(base_prefix: str, path: str, xml_request: Optional[ET.Element],
     props = ([prop.tag for prop in prop_element]
              if prop_element is not None else [])
 
+    # Window (start, end, limit) of C:expand or C:limit-recurrence-set
+    expand_window: Optional[Tuple[datetime, datetime, bool]] = None
+    calendar_data = (prop_element.find(xmlutils.make_clark("C:calendar-data"))
+                     if prop_element is not None else None)
+    if calendar_data is not None:
+        for tag, limit in (("C:expand", False),
+                           ("C:limit-recurrence-set", True)):
+            element = calendar_data.find(xmlutils.make_clark(tag))
+            if element is not None:
+                expand_window = (*parse_time_window(element), limit)
+
     hreferences: Iterable[str]
     if root.tag == xmlutils.make_clark("D:sync-collection"):
         # Append current sync token to response
@@ -57,17 +202,56 @@ def xml_report(base_prefix: str, path: str, xml_request: Optional[ET.Element],
         sync_token_element.text = "sync_token"
         multistatus.append(sync_token_element)
 
+    filters: Sequence[ET.Element] = ()
+    if root.tag in (xmlutils.make_clark("C:calendar-query"),
+                    xmlutils.make_clark("CR:addressbook-query")):
+        filters = (root.findall(xmlutils.make_clark("C:filter")) +
+                   root.findall(xmlutils.make_clark("CR:filter")))
+
     # Retrieve everything required for finishing the request.
-    retrieved_items = list(retrieve_items(collection))
     collection_tag = collection.tag
+    # The filters are compiled once and the plan is shared by all items
+    filter_plan = (radicale_filter.compile_filters(filters, collection_tag)
+                   if filters else None)
+    retrieved_items = list(retrieve_items(collection, filters))
     # !!! Don't access storage after this !!!
     unlock_storage_fn()
 
+    unmatched_items = [item for item, filters_matched in retrieved_items
+                       if not filters_matched]
+    if (executor is not None and workers > 0 and unmatched_items and
+            len(unmatched_items) >= parallel_min_items):
+        try:
+            with metrics.phase("filter_parallel"):
+                results = match_parallel(
+                    executor, workers, collection.path, collection_tag,
+                    filters, unmatched_items)
+        except concurrent.futures.TimeoutError:
+            # Items are matched in this process
+            logger.warning("Filtering items in worker processes timed out "
+                           "after %.1f seconds", PARALLEL_TIMEOUT)
+        except Exception as e:
+            # Items are matched in this process
+            logger.warning("Failed to filter items in worker processes: %s",
+                           e, exc_info=True)
+            if isinstance(e, concurrent.futures.BrokenExecutor):
+                discard_executor(executor)
+        else:
+            matched_items = {id(item) for item, matched in zip(
+                unmatched_items, results) if matched}
+            retrieved_items = [
+                (item, True) for item, filters_matched in retrieved_items
+                if filters_matched or id(item) in matched_items]
+    del unmatched_items
+
     while retrieved_items:
         # ``item.vobject_item`` might be accessed during filtering.
         # Don't keep reference to ``item``, because VObject requires a lot of
         # memory.
         item, filters_matched = retrieved_items.pop(0)
+        if (filter_plan is not None and not filters_matched and
+                not filter_plan(item)):
+            continue
 
         found_props = []
         not_found_props = []
@@ -80,6 +264,11 @@ def xml_report(base_prefix: str, path: str, xml_request: Optional[ET.Element],
             elif tag == xmlutils.make_clark("D:getcontenttype"):
                 element.text = xmlutils.get_content_type(item, encoding)
                 found_props.append(element)
+            elif (tag == xmlutils.make_clark("C:calendar-data") and
+                    expand_window is not None and
+                    collection_tag == "VCALENDAR"):
+                element.text = radicale_expand.expand(item, *expand_window)
+                found_props.append(element)
             elif tag in (
                     xmlutils.make_clark("C:calendar-data"),
                     xmlutils.make_clark("CR:address-data")):
@@ -98,6 +287,87 @@ def xml_report(base_prefix: str, path: str, xml_request: Optional[ET.Element],
     return client.MULTI_STATUS, multistatus
 
 
+def parse_time_window(element: ET.Element) -> Tuple[datetime, datetime]:
+    """Get the window of a C:expand, C:limit-recurrence-set or C:time-range
+       element."""
+    start = element.get("start")
+    end = element.get("end")
+    if not start or not end:
+        raise ValueError("Missing start or end in %r" % element.tag)
+    return (datetime.strptime(start, "%Y%m%dT%H%M%SZ").replace(
+                tzinfo=timezone.utc),
+            datetime.strptime(end, "%Y%m%dT%H%M%SZ").replace(
+                tzinfo=timezone.utc))
+
+
+def free_busy_report(xml_request: ET.Element,
+                     collection: storage.BaseCollection,
+                     unlock_storage_fn: Callable[[], None]) -> str:
+    """Read and answer free-busy-query REPORT requests.
+
+    The busy time of the items is precomputed when they are stored, it's
+    only computed for windows outside of the precomputed window.
+
+    See rfc4791-7.10.
+
+    """
+    if collection.tag != "VCALENDAR":
+        raise ValueError("free-busy-query on collection %r without calendar" %
+                         collection.path)
+    time_range = xml_request.find(xmlutils.make_clark("C:time-range"))
+    if time_range is None:
+        raise ValueError("Missing time-range in free-busy-query")
+    start, end = parse_time_window(time_range)
+    if start >= end:
+        raise ValueError("Empty time-range in free-busy-query")
+    # Prefilter the events in the window with the storage
+    filter_ = ET.Element(xmlutils.make_clark("C:filter"))
+    ET.SubElement(ET.SubElement(ET.SubElement(
+        filter_, xmlutils.make_clark("C:comp-filter"), name="VCALENDAR"),
+        xmlutils.make_clark("C:comp-filter"), name="VEVENT"),
+        xmlutils.make_clark("C:time-range"),
+        start=time_range.get("start", ""), end=time_range.get("end", ""))
+    items = [item for item, _ in collection.get_filtered([filter_])]
+    # !!! Don't access storage after this !!!
+    unlock_storage_fn()
+
+    start_ts = math.floor(start.timestamp())
+    end_ts = math.ceil(end.timestamp())
+    periods: Dict[str, List[Tuple[int, int]]] = {}
+    while items:
+        item = items.pop(0)
+        busy_start, busy_end, intervals = item.busy_time
+        if start_ts < busy_start or busy_end < end_ts:
+            _, _, intervals = radicale_item.find_busy_time(
+                item.vobject_item, item.component_name, start, end)
+        for interval_start, interval_end, fbtype in intervals:
+            if interval_start < end_ts and start_ts < interval_end:
+                periods.setdefault(fbtype, []).append((
+                    max(interval_start, start_ts),
+                    min(interval_end, end_ts)))
+
+    utc = vobject.icalendar.utc
+    calendar = vobject.iCalendar()
+    freebusy = calendar.add("vfreebusy")
+    freebusy.add("dtstamp").value = datetime.now(utc)
+    freebusy.add("dtstart").value = start.astimezone(utc)
+    freebusy.add("dtend").value = end.astimezone(utc)
+    for fbtype, fbtype_periods in sorted(periods.items()):
+        # Merge overlapping periods
+        merged: List[Tuple[int, int]] = []
+        for period_start, period_end in sorted(fbtype_periods):
+            if merged and period_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], period_end))
+            else:
+                merged.append((period_start, period_end))
+        line = freebusy.add("freebusy")
+        line.value = [(datetime.fromtimestamp(period_start, utc),
+                       datetime.fromtimestamp(period_end, utc))
+                      for period_start, period_end in merged]
+        line.fbtype_param = fbtype
+    return calendar.serialize()
+
+
 def xml_item_response(base_prefix: str, href: str,
                       found_props: Sequence[ET.Element] = (),
                       not_found_props: Sequence[ET.Element] = (),
@@ -128,10 +398,18 @@ def xml_item_response(base_prefix: str, href: str,
     return response
 
 
-def retrieve_items( collection: storage.BaseCollection) -> Iterator[Tuple[radicale_item.Item, bool]]:
-    """Retrieves all items that are referenced in ``hreferences`` from
-       ``collection`` and adds 404 responses for missing and invalid items
-       to ``multistatus``."""
+def retrieve_items(collection: storage.BaseCollection,
+                   filters: Sequence[ET.Element] = ()
+                   ) -> Iterator[Tuple[radicale_item.Item, bool]]:
+    """Retrieves all items of ``collection``.
+
+    With ``filters`` the items are prefiltered by the storage, the items
+    are returned with a bool that indicates if ``filters`` are fully matched.
+
+    """
+    if filters:
+        yield from collection.get_filtered(filters)
+        return
     for item in collection.get_all():
         yield item, True
 
@@ -139,34 +417,20 @@ def retrieve_items( collection: storage.BaseCollection) -> Iterator[Tuple[radica
 def test_filter(collection_tag: str, item: radicale_item.Item,
                 filter_: ET.Element) -> bool:
     """Match an item against a filter."""
-    if (collection_tag == "VCALENDAR" and
-            filter_.tag != xmlutils.make_clark("C:%s" % filter_)):
-        if len(filter_) == 0:
-            return True
-        if len(filter_) > 1:
-            raise ValueError("Filter with %d children" % len(filter_))
-        if filter_[0].tag != xmlutils.make_clark("C:comp-filter"):
-            raise ValueError("Unexpected %r in filter" % filter_[0].tag)
-        return radicale_filter.comp_match(item, filter_[0])
-    if (collection_tag == "VADDRESSBOOK" and
-            filter_.tag != xmlutils.make_clark("CR:%s" % filter_)):
-        for child in filter_:
-            if child.tag != xmlutils.make_clark("CR:prop-filter"):
-                raise ValueError("Unexpected %r in filter" % child.tag)
-        test = filter_.get("test", "anyof")
-        if test == "anyof":
-            return any(radicale_filter.prop_match(item.vobject_item, f, "CR")
-                       for f in filter_)
-        if test == "allof":
-            return all(radicale_filter.prop_match(item.vobject_item, f, "CR")
-                       for f in filter_)
-        raise ValueError("Unsupported filter test: %r" % test)
-    raise ValueError("Unsupported filter %r for %r" %
-                     (filter_.tag, collection_tag))
+    return radicale_filter.compile_filter(filter_, collection_tag)(item)
 
 
 class ApplicationPartReport(ApplicationBase):
 
+    _report_workers: int
+    _report_parallel_min_items: int
+
+    def __init__(self, configuration: config.Configuration) -> None:
+        super().__init__(configuration)
+        self._report_workers = configuration.get("server", "report_workers")
+        self._report_parallel_min_items = configuration.get(
+            "server", "report_parallel_min_items")
+
     def do_REPORT(self, environ: types.WSGIEnviron, base_prefix: str,
                   path: str, user: str) -> types.WSGIResponse:
         """Manage REPORT request."""
@@ -189,13 +453,30 @@ class ApplicationPartReport(ApplicationBase):
             else:
                 assert item.collection is not None
                 collection = item.collection
-            try:
-                status, xml_answer = xml_report(
-                    base_prefix, path, xml_content, collection, self._encoding,
-                    lock_stack.close)
-            except ValueError as e:
-                logger.warning(
-                    "Bad REPORT request on %r: %s", path, e, exc_info=True)
-                return httputils.BAD_REQUEST
+            if (xml_content is not None and xml_content.tag ==
+                    xmlutils.make_clark("C:free-busy-query")):
+                try:
+                    answer = free_busy_report(
+                        xml_content, collection, lock_stack.close)
+                except ValueError as e:
+                    logger.warning("Bad REPORT request on %r: %s", path, e,
+                                   exc_info=True)
+                    return httputils.BAD_REQUEST
+                headers = {"Content-Type": "text/calendar; charset=%s" %
+                           self._encoding}
+                return client.OK, headers, answer
+            with contextlib.ExitStack() as executor_stack:
+                executor = (executor_stack.enter_context(
+                    use_executor(self._report_workers))
+                    if self._report_workers > 0 else None)
+                try:
+                    status, xml_answer = xml_report(
+                        base_prefix, path, xml_content, collection,
+                        self._encoding, lock_stack.close, executor,
+                        self._report_workers, self._report_parallel_min_items)
+                except ValueError as e:
+                    logger.warning("Bad REPORT request on %r: %s", path, e,
+                                   exc_info=True)
+                    return httputils.BAD_REQUEST
         headers = {"Content-Type": "text/xml; charset=%s" % self._encoding}
         return status, headers, self._xml_response(xml_answer)
@@ -48,29 +48,54 @@ When passlib[bcrypt] is installed:
 """
 
 import functools
+import hashlib
 import hmac
-from typing import Any
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from passlib.hash import apr_md5_crypt
 
 from radicale import auth, config
+from radicale.log import logger
 
 
 class Auth(auth.BaseAuth):
 
     _filename: str
     _encoding: str
+    _cache_seconds: float
+    _lock: threading.Lock
+    # Signature of the loaded htpasswd file (inode, size, mtime)
+    _file_signature: Optional[Tuple[int, int, int]]
+    # Hashes by login
+    _index: Dict[str, List[str]]
+    # Hash that is verified for unknown logins
+    _dummy_hash: str
+    # Keyed digest of the password and expiration time by login
+    _verified: Dict[str, Tuple[bytes, float]]
+    _verified_key: bytes
 
     def __init__(self, configuration: config.Configuration) -> None:
         super().__init__(configuration)
         self._filename = configuration.get("auth", "htpasswd_filename")
         self._encoding = configuration.get("encoding", "stock")
+        self._cache_seconds = configuration.get(
+            "auth", "htpasswd_cache_seconds")
         encryption: str = configuration.get("auth", "htpasswd_encryption")
+        self._lock = threading.Lock()
+        self._file_signature = None
+        self._index = {}
+        self._verified = {}
+        self._verified_key = os.urandom(32)
 
         if encryption == "plain":
             self._verify = self._plain
+            self._dummy_hash = ""
         elif encryption == "md5":
             self._verify = self._md5apr1
+            self._dummy_hash = apr_md5_crypt.hash("")
         elif encryption == "bcrypt":
             try:
                 from passlib.hash import bcrypt
@@ -81,7 +106,7 @@ class Auth(auth.BaseAuth):
             # A call to `encrypt` raises passlib.exc.MissingBackendError with a
             # good error message if bcrypt backend is not available. Trigger
             # this here.
-            bcrypt.hash("test-bcrypt-backend")
+            self._dummy_hash = bcrypt.hash("test-bcrypt-backend")
             self._verify = functools.partial(self._bcrypt, bcrypt)
         else:
             raise RuntimeError("The htpasswd encryption method %r is not "
@@ -97,37 +122,83 @@ class Auth(auth.BaseAuth):
     def _md5apr1(self, hash_value: str, password: str) -> bool:
         return apr_md5_crypt.verify(password, hash_value.strip())
 
+    def _load_index(self) -> None:
+        """Read the htpasswd file if it was changed."""
+        try:
+            stat = os.stat(self._filename)
+        except OSError as e:
+            raise RuntimeError("Failed to load htpasswd file %r: %s" %
+                               (self._filename, e)) from e
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if signature == self._file_signature:
+            return
+        with self._lock:
+            if signature == self._file_signature:
+                return
+            index: Dict[str, List[str]] = {}
+            try:
+                with open(self._filename, encoding=self._encoding) as f:
+                    for line in f:
+                        line = line.rstrip("\n")
+                        if line.lstrip() and not line.lstrip().startswith(
+                                "#"):
+                            try:
+                                hash_login, hash_value = line.split(
+                                    ":", maxsplit=1)
+                            except ValueError as e:
+                                raise RuntimeError(
+                                    "Invalid htpasswd file %r: %s" %
+                                    (self._filename, e)) from e
+                            index.setdefault(hash_login, []).append(
+                                hash_value)
+            except OSError as e:
+                raise RuntimeError("Failed to load htpasswd file %r: %s" %
+                                   (self._filename, e)) from e
+            logger.debug("Loaded %d logins from htpasswd file %r",
+                         len(index), self._filename)
+            self._index = index
+            # Passwords might have been changed
+            self._verified = {}
+            self._file_signature = signature
+
+    def _password_digest(self, password: str) -> bytes:
+        return hmac.new(self._verified_key, password.encode(),
+                        hashlib.sha256).digest()
+
     def login(self, login: str, password: str) -> str:
         """Validate credentials.
 
-        Iterate through htpasswd credential file until login matches, extract
-        hash (encrypted password) and check hash against password,
-        using the method specified in the Radicale config.
+        The htpasswd file is indexed by login and read again when it's
+        modified. Only the hash of ``login`` is checked against the password,
+        using the method specified in the Radicale config. Unknown logins
+        are checked against a dummy hash to avoid timing attacks, see #591.
 
-        The content of the file is not cached because reading is generally a
-        very cheap operation, and it's useful to get live updates of the
-        htpasswd file.
+        Successful logins are remembered for ``htpasswd_cache_seconds``.
 
         """
-        try:
-            with open(self._filename, encoding=self._encoding) as f:
-                for line in f:
-                    line = line.rstrip("\n")
-                    if line.lstrip() and not line.lstrip().startswith("#"):
-                        try:
-                            hash_login, hash_value = line.split(
-                                ":", maxsplit=1)
-                            # Always compare both login and password to avoid
-                            # timing attacks, see #591.
-                            login_ok = hmac.compare_digest(
-                                hash_login.encode(), login.encode())
-                            password_ok = self._verify(hash_value, password)
-                            if login_ok and password_ok:
-                                return login
-                        except ValueError as e:
-                            raise RuntimeError("Invalid htpasswd file %r: %s" %
-                                               (self._filename, e)) from e
-        except OSError as e:
-            raise RuntimeError("Failed to load htpasswd file %r: %s" %
-                               (self._filename, e)) from e
+        self._load_index()
+        # Results are only stored for the loaded version of the file
+        index, verified_logins = self._index, self._verified
+        digest = b""
+        if self._cache_seconds > 0:
+            digest = self._password_digest(password)
+            verified = verified_logins.get(login)
+            if (verified is not None and verified[1] > time.monotonic() and
+                    hmac.compare_digest(verified[0], digest)):
+                return login
+        hash_values = index.get(login)
+        if not hash_values:
+            self._verify(self._dummy_hash, password)
+            return ""
+        for hash_value in hash_values:
+            try:
+                password_ok = self._verify(hash_value, password)
+            except ValueError as e:
+                raise RuntimeError("Invalid htpasswd file %r: %s" %
+                                   (self._filename, e)) from e
+            if password_ok:
+                if self._cache_seconds > 0:
+                    verified_logins[login] = (
+                        digest, time.monotonic() + self._cache_seconds)
+                return login
         return ""
@@ -114,6 +114,10 @@ DEFAULT_CONFIG_SCHEMA: types.CONFIG_SCHEMA = OrderedDict([
             "value": "8",
             "help": "maximum number of parallel connections",
             "type": positive_int}),
+        ("workers", {
+            "value": "1",
+            "help": "number of worker processes (0 for number of CPUs)",
+            "type": positive_int}),
         ("max_content_length", {
             "value": "100000000",
             "help": "maximum size of request body in bytes",
@@ -122,6 +126,30 @@ DEFAULT_CONFIG_SCHEMA: types.CONFIG_SCHEMA = OrderedDict([
             "value": "30",
             "help": "socket timeout",
             "type": positive_float}),
+        ("report_workers", {
+            "value": "0",
+            "help": "number of processes for filtering REPORT requests "
+                    "(0 to disable)",
+            "type": positive_int}),
+        ("report_parallel_min_items", {
+            "value": "1000",
+            "help": "minimum number of items to filter in processes",
+            "type": positive_int}),
+        ("event_loop", {
+            "value": "False",
+            "help": "handle connections in an event loop and process "
+                    "requests in a thread pool",
+            "type": bool}),
+        ("max_queued_requests", {
+            "value": "256",
+            "help": "maximum number of requests waiting for a worker in "
+                    "event loop mode",
+            "type": positive_int}),
+        ("target_latency", {
+            "value": "0",
+            "help": "request processing time that the adaptive concurrency "
+                    "limit aims for in event loop mode (seconds)",
+            "type": positive_float}),
         ("ssl", {
             "value": "False",
             "help": "use SSL connection",
@@ -143,6 +171,15 @@ DEFAULT_CONFIG_SCHEMA: types.CONFIG_SCHEMA = OrderedDict([
             "help": "set CA certificate for validating clients",
             "aliases": ("--certificate-authority",),
             "type": filepath}),
+        ("ciphersuite", {
+            "value": "ECDHE+AESGCM:ECDHE+CHACHA20",
+            "help": "set OpenSSL cipher list for TLS 1.2 and older",
+            "type": str}),
+        ("ssl_session_tickets", {
+            "value": "2",
+            "help": "number of TLS session tickets sent to clients "
+                    "(0 to disable session tickets)",
+            "type": positive_int}),
         ("_internal_server", {
             "value": "False",
             "help": "the internal server is used",
@@ -170,6 +207,10 @@ DEFAULT_CONFIG_SCHEMA: types.CONFIG_SCHEMA = OrderedDict([
             "value": "md5",
             "help": "htpasswd encryption method",
             "type": str}),
+        ("htpasswd_cache_seconds", {
+            "value": "0",
+            "help": "remember successful htpasswd logins for seconds",
+            "type": positive_float}),
         ("realm", {
             "value": "Radicale - Password Required",
             "help": "message displayed when a password is needed",
@@ -202,6 +243,26 @@ DEFAULT_CONFIG_SCHEMA: types.CONFIG_SCHEMA = OrderedDict([
             "value": "2592000",  # 30 days
             "help": "delete sync token that are older",
             "type": positive_int}),
+        ("expansion_horizon", {
+            "value": "3650",  # 10 years
+            "help": "stop expanding recurrences for the cache after days "
+                    "(0 for no limit)",
+            "type": positive_int}),
+        ("item_cache_signature", {
+            "value": "False",
+            "help": "validate the item cache with the inode, size and "
+                    "modification time of files",
+            "type": bool}),
+        ("item_memory_cache_size", {
+            "value": "67108864",  # 64 MiB
+            "help": "memory used to keep entries of the item cache in each "
+                    "process (bytes, 0 to disable)",
+            "type": positive_int}),
+        ("group_commit_window", {
+            "value": "0",
+            "help": "write changes to a journal that is synced once for all "
+                    "changes within this time (seconds, 0 to disable)",
+            "type": positive_float}),
         ("hook", {
             "value": "",
             "help": "command that is run after changes to storage",
@@ -224,6 +285,19 @@ DEFAULT_CONFIG_SCHEMA: types.CONFIG_SCHEMA = OrderedDict([
         ("mask_passwords", {
             "value": "True",
             "help": "mask passwords in logs",
+            "type": bool}),
+        ("queued", {
+            "value": "True",
+            "help": "format and write log messages in a background thread",
+            "type": bool}),
+        ("access_log_sample_rate", {
+            "value": "0",
+            "help": "fraction of requests that are logged as JSON",
+            "type": positive_float})])),
+    ("metrics", OrderedDict([
+        ("enabled", {
+            "value": "False",
+            "help": "expose request metrics at /.metrics",
             "type": bool})])),
     ("headers", OrderedDict([
         ("_allow_extra", str)]))])
@@ -22,13 +22,15 @@ Helper functions for HTTP.
 
 """
 
+import codecs
 import contextlib
+import logging
 import os
 import pathlib
 import sys
 import time
 from http import client
-from typing import List, Mapping, Union, cast
+from typing import Iterable, Iterator, List, Mapping, Union, cast
 
 from radicale import config, pathutils, types
 from radicale.log import logger
@@ -97,11 +99,19 @@ MIMETYPES: Mapping[str, str] = {
     ".xml": "text/xml"}
 FALLBACK_MIMETYPE: str = "application/octet-stream"
 
+# Size of chunks read from the request body
+REQUEST_BODY_CHUNK_SIZE: int = 64 * 1024
+# Minimal size of chunks of streamed responses
+RESPONSE_BODY_CHUNK_SIZE: int = 64 * 1024
 
-def decode_request(configuration: "config.Configuration",
-                   environ: types.WSGIEnviron, text: bytes) -> str:
-    """Try to magically decode ``text`` according to given ``environ``."""
-    # List of charsets to try
+
+class RequestBodyTooLargeError(ValueError):
+    """The request body exceeds ``max_content_length``."""
+
+
+def request_charsets(configuration: "config.Configuration",
+                     environ: types.WSGIEnviron) -> List[str]:
+    """Charsets to try for decoding the request body, in order."""
     charsets: List[str] = []
 
     # First append content charset given in the request
@@ -118,8 +128,13 @@ def decode_request(configuration: "config.Configuration",
     for i, s in reversed(list(enumerate(charsets))):
         if s in charsets[:i]:
             del charsets[i]
+    return charsets
 
-    # Try to decode
+
+def decode_request(configuration: "config.Configuration",
+                   environ: types.WSGIEnviron, text: bytes) -> str:
+    """Try to magically decode ``text`` according to given ``environ``."""
+    charsets = request_charsets(configuration, environ)
     for charset in charsets:
         with contextlib.suppress(UnicodeDecodeError):
             return text.decode(charset)
@@ -127,22 +142,70 @@ def decode_request(configuration: "config.Configuration",
                              "all codecs failed [%s]" % ", ".join(charsets))
 
 
-def read_raw_request_body(configuration: "config.Configuration",
-                          environ: types.WSGIEnviron) -> bytes:
+def decode_request_chunks(chunks: Iterable[bytes], charset: str
+                          ) -> Iterator[str]:
+    """Decode ``chunks`` incrementally with ``charset``.
+
+    Raises ``UnicodeDecodeError`` if the data is invalid.
+
+    """
+    decoder = codecs.getincrementaldecoder(charset)()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_raw_request_body(configuration: "config.Configuration",
+                          environ: types.WSGIEnviron) -> Iterator[bytes]:
+    """Read the request body in chunks.
+
+    ``max_content_length`` is enforced while reading, this also covers
+    WSGI servers that pass chunked requests without ``CONTENT_LENGTH``.
+
+    """
+    max_content_length: int = configuration.get(
+        "server", "max_content_length")
     content_length = int(environ.get("CONTENT_LENGTH") or 0)
     if not content_length:
-        return b""
-    content = environ["wsgi.input"].read(content_length)
-    if len(content) < content_length:
-        raise RuntimeError("Request body too short: %d" % len(content))
-    return content
+        if not environ.get("wsgi.input_terminated"):
+            return
+        # Read until EOF
+        content_length = -1
+    if 0 < max_content_length < content_length:
+        raise RequestBodyTooLargeError(
+            "Request body too large: %d" % content_length)
+    size = 0
+    while content_length < 0 or size < content_length:
+        chunk_size = REQUEST_BODY_CHUNK_SIZE
+        if content_length >= 0:
+            chunk_size = min(chunk_size, content_length - size)
+        chunk = environ["wsgi.input"].read(chunk_size)
+        if not chunk:
+            if content_length < 0:
+                break
+            raise RuntimeError("Request body too short: %d" % size)
+        size += len(chunk)
+        if 0 < max_content_length < size:
+            raise RequestBodyTooLargeError(
+                "Request body too large: %d" % size)
+        yield chunk
+
+
+def read_raw_request_body(configuration: "config.Configuration",
+                          environ: types.WSGIEnviron) -> bytes:
+    return b"".join(iter_raw_request_body(configuration, environ))
 
 
 def read_request_body(configuration: "config.Configuration",
                       environ: types.WSGIEnviron) -> str:
     content = decode_request(configuration, environ,
                              read_raw_request_body(configuration, environ))
-    logger.debug("Request content:\n%s", content)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request content:\n%s", content)
     return content
 
 
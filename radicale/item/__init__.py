@@ -28,19 +28,33 @@ import contextlib
 import math
 import os
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from hashlib import sha256
 from itertools import chain
-from typing import (Any, Callable, List, MutableMapping, Optional, Sequence,
-                    Tuple)
+from typing import (Any, Callable, Hashable, Iterator, List, MutableMapping,
+                    Optional, Sequence, Tuple)
 
 import vobject
 
 from radicale import storage  # noqa:F401
-from radicale import pathutils
+from radicale import pathutils, utils
+from radicale.item import expand as radicale_expand
 from radicale.item import filter as radicale_filter
 from radicale.log import logger
 
+# Busy time of an item (start, end, intervals)
+# The intervals are tuples (start, end, FBTYPE) of POSIX timestamps in the
+# window from start to end.
+BusyTime = Tuple[int, int, Tuple[Tuple[int, int, str], ...]]
+
+# Window around the current time for which the busy time of items is
+# computed when they are stored
+BUSY_TIME_PAST: timedelta = timedelta(days=31)
+BUSY_TIME_HORIZON: timedelta = timedelta(days=366)
+# The busy time is computed again when its window ends less than
+# ``BUSY_TIME_HORIZON - BUSY_TIME_REFRESH`` in the future
+BUSY_TIME_REFRESH: timedelta = timedelta(days=30)
+
 
 def read_components(s: str) -> List[vobject.base.Component]:
     """Wrapper for vobject.readComponents"""
@@ -289,6 +303,43 @@ def find_tag(vobject_item: vobject.base.Component) -> str:
     return ""
 
 
+# Maximum number of memoized time ranges
+TIME_RANGE_CACHE_SIZE: int = 4096
+
+# Properties that affect the time range of components
+TIME_RANGE_PROPERTIES: Sequence[str] = (
+    "DTSTART", "DTEND", "DURATION", "DUE", "COMPLETED", "CREATED", "RRULE",
+    "RDATE", "EXDATE", "EXRULE", "RECURRENCE-ID")
+
+_expansion_horizon: Optional[timedelta] = None
+_time_ranges: "utils.LRUCache[Hashable, Tuple[int, int]]" = utils.LRUCache(
+    "time_range", TIME_RANGE_CACHE_SIZE)
+
+
+def set_expansion_horizon(days: int) -> None:
+    """Stop the expansion of recurrences for ``find_time_range`` at ``days``
+       in the future. ``0`` disables the limit."""
+    global _expansion_horizon
+    _expansion_horizon = timedelta(days=days) if days > 0 else None
+
+
+def _time_range_key(vobject_item: vobject.base.Component, tag: str
+                    ) -> Hashable:
+    """Get the properties of ``vobject_item`` that affect its time range."""
+
+    def properties(component: vobject.base.Component) -> Iterator[Hashable]:
+        # Timezones are included completely
+        is_timezone = component.name in ("VTIMEZONE", "STANDARD", "DAYLIGHT")
+        for child in component.getChildren():
+            if isinstance(child, vobject.base.Component):
+                if child.name in (tag, "VTIMEZONE", "STANDARD", "DAYLIGHT"):
+                    yield child.name, tuple(properties(child))
+            elif is_timezone or child.name in TIME_RANGE_PROPERTIES:
+                yield (child.name, str(child.value), str(child.params))
+
+    return tag, _expansion_horizon, tuple(properties(vobject_item))
+
+
 def find_time_range(vobject_item: vobject.base.Component, tag: str
                     ) -> Tuple[int, int]:
     """Find enclosing time range from ``vobject item``.
@@ -300,19 +351,37 @@ def find_time_range(vobject_item: vobject.base.Component, tag: str
 
     This is intened to be used for matching against simplified prefilters.
 
+    Recurrences are expanded up to the horizon of ``set_expansion_horizon``,
+    the range of items that recur after it is open-ended. Results are
+    memoized by the properties that affect them.
+
     """
     if not tag:
         return radicale_filter.TIMESTAMP_MIN, radicale_filter.TIMESTAMP_MAX
+    key = _time_range_key(vobject_item, tag)
+    time_range = _time_ranges.get(key)
+    if time_range is not None:
+        return time_range
+    horizon = (None if _expansion_horizon is None else
+               datetime.now(timezone.utc) + _expansion_horizon)
     start = end = None
 
     def range_fn(range_start: datetime, range_end: datetime,
                  is_recurrence: bool) -> bool:
         nonlocal start, end
+        visited = start is not None
         if start is None or range_start < start:
             start = range_start
         if end is None or end < range_end:
             end = range_end
-        return False
+        if (horizon is not None and visited and not is_recurrence and
+                horizon < range_start):
+            # The main component recurs after the horizon
+            end = radicale_filter.DATETIME_MAX
+            return True
+        # The enclosing range can't grow anymore
+        return (start == radicale_filter.DATETIME_MIN and
+                end == radicale_filter.DATETIME_MAX)
 
     def infinity_fn(range_start: datetime) -> bool:
         nonlocal start, end
@@ -326,7 +395,58 @@ def find_time_range(vobject_item: vobject.base.Component, tag: str
         start = radicale_filter.DATETIME_MIN
     if end is None:
         end = radicale_filter.DATETIME_MAX
-    return math.floor(start.timestamp()), math.ceil(end.timestamp())
+    time_range = math.floor(start.timestamp()), math.ceil(end.timestamp())
+    _time_ranges.put(key, time_range)
+    return time_range
+
+
+def find_busy_time(vobject_item: vobject.base.Component, tag: str,
+                   start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> BusyTime:
+    """Find the busy time of the events in ``vobject_item`` from ``start``
+       to ``end``.
+
+    ``tag`` must be set to the return value of ``find_tag``.
+
+    Recurrences are expanded in the window. Transparent and cancelled
+    events are free. The window defaults to ``BUSY_TIME_PAST`` and
+    ``BUSY_TIME_HORIZON`` around the current time.
+
+    See rfc4791-7.10.
+
+    """
+    if start is None or end is None:
+        today = datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        start = today - BUSY_TIME_PAST
+        end = today + BUSY_TIME_HORIZON
+    intervals = []
+    if tag == "VEVENT":
+        for component, instance_start, instance_end, _ in (
+                radicale_expand.iter_instances(
+                    vobject_item, tag, start, end)):
+            transp = getattr(component, "transp", None)
+            if transp is not None and transp.value.upper() == "TRANSPARENT":
+                continue
+            status = getattr(component, "status", None)
+            status = status.value.upper() if status is not None else ""
+            if status == "CANCELLED":
+                continue
+            intervals.append((
+                math.floor(max(instance_start, start).timestamp()),
+                math.ceil(min(instance_end, end).timestamp()),
+                "BUSY-TENTATIVE" if status == "TENTATIVE" else "BUSY"))
+    intervals.sort()
+    return (math.floor(start.timestamp()), math.ceil(end.timestamp()),
+            tuple(intervals))
+
+
+def is_busy_time_stale(busy_time: BusyTime) -> bool:
+    """Check if the window of ``busy_time`` doesn't cover the near future
+       anymore. See ``BUSY_TIME_REFRESH``."""
+    horizon = (datetime.now(timezone.utc) + BUSY_TIME_HORIZON -
+               BUSY_TIME_REFRESH)
+    return busy_time[1] < horizon.timestamp()
 
 
 class Item:
@@ -344,6 +464,7 @@ class Item:
     _name: Optional[str]
     _component_name: Optional[str]
     _time_range: Optional[Tuple[int, int]]
+    _busy_time: Optional[BusyTime]
 
     def __init__(self,
                  collection_path: Optional[str] = None,
@@ -356,7 +477,8 @@ class Item:
                  uid: Optional[str] = None,
                  name: Optional[str] = None,
                  component_name: Optional[str] = None,
-                 time_range: Optional[Tuple[int, int]] = None):
+                 time_range: Optional[Tuple[int, int]] = None,
+                 busy_time: Optional[BusyTime] = None):
         """Initialize an item.
 
         ``collection_path`` the path of the parent collection (optional if
@@ -384,6 +506,8 @@ class Item:
 
         ``time_range`` the enclosing time range. See ``find_time_range``.
 
+        ``busy_time`` the busy time. See ``find_busy_time``.
+
         """
         if text is None and vobject_item is None:
             raise ValueError(
@@ -406,6 +530,7 @@ class Item:
         self._name = name
         self._component_name = component_name
         self._time_range = time_range
+        self._busy_time = busy_time
 
     def serialize(self) -> str:
         if self._text is None:
@@ -460,6 +585,13 @@ class Item:
                 self.vobject_item, self.component_name)
         return self._time_range
 
+    @property
+    def busy_time(self) -> BusyTime:
+        if self._busy_time is None or is_busy_time_stale(self._busy_time):
+            self._busy_time = find_busy_time(
+                self.vobject_item, self.component_name)
+        return self._busy_time
+
     def prepare(self) -> None:
         """Fill cache with values."""
         orig_vobject_item = self._vobject_item
@@ -469,4 +601,5 @@ class Item:
         self.name
         self.time_range
         self.component_name
+        self.busy_time
         self._vobject_item = orig_vobject_item
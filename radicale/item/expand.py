@@ -0,0 +1,244 @@
+# This file is part of Radicale - CalDAV and CardDAV server
+#
+# This library is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Expansion of recurring components for the CALDAV:expand and
+CALDAV:limit-recurrence-set elements of calendar-data.
+
+See rfc4791-9.6.5 and rfc4791-9.6.6.
+
+"""
+
+import math
+from datetime import date, datetime, timezone
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+import vobject
+
+from radicale import item, utils
+from radicale.item import filter as radicale_filter
+
+# Maximum number of expanded items that are kept in memory
+EXPANSION_CACHE_SIZE: int = 1024
+
+# Expansion windows are widened to whole buckets (seconds), requests for
+# windows in the same buckets (e.g. "this month") share the expansion
+WINDOW_BUCKET: int = 24 * 60 * 60
+
+COMPONENT_NAMES: Sequence[str] = ("VEVENT", "VTODO", "VJOURNAL")
+
+# Properties that define the recurrence set of a component
+RECURRENCE_PROPERTIES: Sequence[str] = ("rrule", "rdate", "exdate", "exrule")
+
+# Component of an expanded item (start, end, text)
+Instance = Tuple[int, int, str]
+
+# Expanded item (header of the calendar, components)
+Expansion = Tuple[str, Sequence[Instance]]
+
+
+_cache: "utils.LRUCache[Hashable, Expansion]" = utils.LRUCache(
+    "expand", EXPANSION_CACHE_SIZE)
+
+
+def _to_utc(value: date) -> date:
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # VObject only recognizes its own UTC timezone
+        return value.astimezone(vobject.icalendar.utc)
+    return value
+
+
+def _component_range(component: vobject.base.Component
+                     ) -> Tuple[datetime, datetime]:
+    """Get the time range of a single instance of ``component``."""
+    dtstart = getattr(component, "dtstart", None)
+    end_line = (getattr(component, "dtend", None) or
+                getattr(component, "due", None))
+    if dtstart is None:
+        if end_line is None:
+            return radicale_filter.DATETIME_MIN, radicale_filter.DATETIME_MAX
+        end = radicale_filter.date_to_datetime(end_line.value)
+        return end - radicale_filter.SECOND, end
+    start = radicale_filter.date_to_datetime(dtstart.value)
+    duration = getattr(component, "duration", None)
+    if end_line is not None:
+        end = radicale_filter.date_to_datetime(end_line.value)
+    elif duration is not None:
+        end = start + duration.value
+    elif isinstance(dtstart.value, datetime):
+        end = start
+    else:
+        end = start + radicale_filter.DAY
+    return start, max(end, start + radicale_filter.SECOND)
+
+
+def _timestamp(value: datetime) -> int:
+    if value == radicale_filter.DATETIME_MIN:
+        return radicale_filter.TIMESTAMP_MIN
+    if value == radicale_filter.DATETIME_MAX:
+        return radicale_filter.TIMESTAMP_MAX
+    return math.floor(value.timestamp())
+
+
+def _split_components(vobject_item: vobject.base.Component,
+                      component_name: str
+                      ) -> Tuple[List[vobject.base.Component],
+                                 Dict[datetime, vobject.base.Component]]:
+    """Get the main components and the overridden instances by
+       RECURRENCE-ID."""
+    masters: List[vobject.base.Component] = []
+    overrides: Dict[datetime, vobject.base.Component] = {}
+    for component in getattr(vobject_item,
+                             "%s_list" % component_name.lower(), []):
+        recurrence_id = getattr(component, "recurrence_id", None)
+        if recurrence_id is not None and recurrence_id.value:
+            overrides[radicale_filter.date_to_datetime(
+                recurrence_id.value)] = component
+        else:
+            masters.append(component)
+    return masters, overrides
+
+
+def iter_instances(vobject_item: vobject.base.Component,
+                   component_name: str, start: datetime, end: datetime
+                   ) -> Iterator[Tuple[vobject.base.Component, datetime,
+                                       datetime, Optional[date]]]:
+    """Iterate over the instances of the components ``component_name`` of
+       ``vobject_item`` that overlap the window from ``start`` to ``end``.
+
+    Yields tuples (``component``, ``start``, ``end``, ``occurrence``).
+    ``occurrence`` is the start of the occurrence in the recurrence set of
+    ``component`` or ``None`` if the component is a single instance.
+
+    """
+    masters, overrides = _split_components(vobject_item, component_name)
+    for master in masters:
+        master_start, master_end = _component_range(master)
+        if not master.rruleset or "dtstart" not in master.contents:
+            if master_start < end and start < master_end:
+                yield master, master_start, master_end, None
+            continue
+        is_datetime = isinstance(master.dtstart.value, datetime)
+        for occurrence in master.getrruleset(addRDate=True):
+            occurrence_start = radicale_filter.date_to_datetime(occurrence)
+            if occurrence_start >= end:
+                break
+            occurrence_end = occurrence_start + (master_end - master_start)
+            if occurrence_end <= start or occurrence_start in overrides:
+                continue
+            yield (master, occurrence_start, occurrence_end,
+                   occurrence if is_datetime else occurrence.date())
+    for override in overrides.values():
+        override_start, override_end = _component_range(override)
+        if override_start < end and start < override_end:
+            yield override, override_start, override_end, None
+
+
+def _instance(component: vobject.base.Component,
+              occurrence: Optional[date] = None) -> Instance:
+    """Serialize a single instance of ``component`` with times in UTC.
+
+    With ``occurrence`` the instance is the occurrence of the recurrence set
+    that starts at ``occurrence``.
+
+    """
+    instance = component.duplicate(component)
+    if occurrence is not None:
+        for name in RECURRENCE_PROPERTIES:
+            instance.contents.pop(name, None)
+        for name in ("dtend", "due"):
+            if name in instance.contents:
+                line = getattr(instance, name)
+                line.value = occurrence + (line.value -
+                                           instance.dtstart.value)
+        instance.dtstart.value = occurrence
+        instance.add("recurrence-id").value = occurrence
+    for name in ("dtstart", "dtend", "due", "recurrence_id"):
+        line = getattr(instance, name, None)
+        if line is not None:
+            line.value = _to_utc(line.value)
+            line.params.pop("X-VOBJ-ORIGINAL-TZID", None)
+    start, end = _component_range(instance)
+    return _timestamp(start), _timestamp(end), instance.serialize()
+
+
+def _expand(vobject_item: vobject.base.Component, start: datetime,
+            end: datetime, limit: bool) -> Expansion:
+    """Expand the components of ``vobject_item`` in the window from
+       ``start`` to ``end``.
+
+    With ``limit`` the recurrence sets are kept and only overridden
+    instances outside of the window are removed.
+
+    """
+    header = "BEGIN:VCALENDAR\r\n" + "".join(
+        line.serialize() for line in vobject_item.getChildren()
+        if not isinstance(line, vobject.base.Component))
+    instances: List[Instance] = []
+    if not limit:
+        for component_name in COMPONENT_NAMES:
+            for component, _, _, occurrence in iter_instances(
+                    vobject_item, component_name, start, end):
+                instances.append(_instance(component, occurrence))
+        return header, instances
+    for timezone_ in getattr(vobject_item, "vtimezone_list", []):
+        instances.append((radicale_filter.TIMESTAMP_MIN,
+                          radicale_filter.TIMESTAMP_MAX,
+                          timezone_.serialize()))
+    for component_name in COMPONENT_NAMES:
+        masters, overrides = _split_components(vobject_item, component_name)
+        for master in masters:
+            instances.append((radicale_filter.TIMESTAMP_MIN,
+                              radicale_filter.TIMESTAMP_MAX,
+                              master.serialize()))
+        for recurrence_id, override in overrides.items():
+            # Overridden instances affect the window of their original and
+            # of their new time
+            override_start, override_end = _component_range(override)
+            override_start = min(override_start, recurrence_id)
+            override_end = max(override_end,
+                               recurrence_id + radicale_filter.SECOND)
+            if override_start < end and start < override_end:
+                instances.append((_timestamp(override_start),
+                                  _timestamp(override_end),
+                                  override.serialize()))
+    return header, instances
+
+
+def expand(item_: "item.Item", start: datetime, end: datetime,
+           limit: bool = False) -> str:
+    """Get the text of ``item_`` with recurrences expanded in the window
+       from ``start`` to ``end``. See ``_expand``.
+
+    Expansions are cached by etag and window bucket.
+
+    """
+    start_ts = math.floor(start.timestamp())
+    end_ts = math.ceil(end.timestamp())
+    bucket_start = start_ts - start_ts % WINDOW_BUCKET
+    bucket_end = end_ts + -end_ts % WINDOW_BUCKET
+    key = (item_.etag, limit, bucket_start, bucket_end)
+    expansion = _cache.get(key)
+    if expansion is None:
+        expansion = _expand(
+            item_.vobject_item,
+            datetime.fromtimestamp(bucket_start, timezone.utc),
+            datetime.fromtimestamp(bucket_end, timezone.utc), limit)
+        _cache.put(key, expansion)
+    header, instances = expansion
+    return header + "".join(
+        text for instance_start, instance_end, text in instances
+        if instance_start < end_ts and start_ts < instance_end
+    ) + "END:VCALENDAR\r\n"
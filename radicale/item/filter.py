@@ -22,8 +22,8 @@ import math
 import xml.etree.ElementTree as ET
 from datetime import date, datetime, timedelta, timezone
 from itertools import chain
-from typing import (Callable, Iterable, Iterator, List, Optional, Sequence,
-                    Tuple)
+from typing import (Callable, Iterable, Iterator, List, Mapping, Optional,
+                    Sequence, Tuple)
 
 import vobject
 
@@ -52,6 +52,27 @@ def date_to_datetime(d: date) -> datetime:
     return d
 
 
+# Match functions of compiled filters
+ItemMatcher = Callable[["item.Item"], bool]
+ComponentMatcher = Callable[[vobject.base.Component], bool]
+
+
+def _lower(value: str) -> str:
+    return value.lower()
+
+
+def _octet(value: str) -> str:
+    return value
+
+
+# Functions that normalize texts for the collations of text-match filters.
+# "i;ascii-casemap" and "i;unicode-casemap" are case-insensitive.
+COLLATIONS: Mapping[str, Callable[[str], str]] = {
+    "i;octet": _octet,
+    "i;ascii-casemap": _lower,
+    "i;unicode-casemap": _lower}
+
+
 def comp_match(item: "item.Item", filter_: ET.Element, level: int = 0) -> bool:
     """Check whether the ``item`` matches the comp ``filter_``.
 
@@ -60,53 +81,69 @@ def comp_match(item: "item.Item", filter_: ET.Element, level: int = 0) -> bool:
 
     See rfc4791-9.7.1.
 
+    """
+    return compile_comp_match(filter_, level)(item)
+
+
+def compile_comp_match(filter_: ET.Element, level: int = 0) -> ItemMatcher:
+    """Compile the comp ``filter_`` to a function that matches items.
+
+    See ``comp_match``.
+
     """
 
     # TODO: Filtering VALARM and VFREEBUSY is not implemented
     # HACK: the filters are tested separately against all components
 
-    if level == 0:
-        tag = item.name
-    elif level == 1:
-        tag = item.component_name
-    else:
+    if level > 1:
         logger.warning(
             "Filters with three levels of comp-filter are not supported")
-        return True
-    if not tag:
-        return False
+        return lambda item: True
+
+    def get_tag(item: "item.Item") -> str:
+        return item.name if level == 0 else item.component_name
+
     name = filter_.get("name", "").upper()
     if len(filter_) == 0:
         # Point #1 of rfc4791-9.7.1
-        return name == tag
+        return lambda item: bool(get_tag(item)) and name == get_tag(item)
     if len(filter_) == 1:
         if filter_[0].tag == xmlutils.make_clark("C:is-not-defined"):
             # Point #2 of rfc4791-9.7.1
-            return name != tag
-    if name != tag:
-        return False
+            return lambda item: bool(get_tag(item)) and name != get_tag(item)
     if (level == 0 and name != "VCALENDAR" or
             level == 1 and name not in ("VTODO", "VEVENT", "VJOURNAL")):
         logger.warning("Filtering %s is not supported", name)
-        return True
+        return lambda item: bool(get_tag(item)) and name == get_tag(item)
     # Point #3 and #4 of rfc4791-9.7.1
-    components = ([item.vobject_item] if level == 0
-                  else list(getattr(item.vobject_item,
-                                    "%s_list" % tag.lower())))
+    prop_matchers: List[ComponentMatcher] = []
+    item_matchers: List[ItemMatcher] = []
     for child in filter_:
         if child.tag == xmlutils.make_clark("C:prop-filter"):
-            if not any(prop_match(comp, child, "C")
-                       for comp in components):
-                return False
+            prop_matchers.append(compile_prop_match(child, "C"))
         elif child.tag == xmlutils.make_clark("C:time-range"):
-            if not time_range_match(item.vobject_item, filter_[0], tag):
-                return False
+            time_range_matcher = compile_time_range_match(child, name)
+            item_matchers.append(
+                lambda item: time_range_matcher(item.vobject_item))
         elif child.tag == xmlutils.make_clark("C:comp-filter"):
-            if not comp_match(item, child, level=level + 1):
-                return False
+            item_matchers.append(compile_comp_match(child, level + 1))
         else:
             raise ValueError("Unexpected %r in comp-filter" % child.tag)
-    return True
+    components_attr = "%s_list" % name.lower()
+
+    def match(item: "item.Item") -> bool:
+        tag = get_tag(item)
+        if not tag or name != tag:
+            return False
+        if prop_matchers:
+            components = ([item.vobject_item] if level == 0 else
+                          list(getattr(item.vobject_item, components_attr)))
+            for prop_matcher in prop_matchers:
+                if not any(prop_matcher(comp) for comp in components):
+                    return False
+        return all(item_matcher(item) for item_matcher in item_matchers)
+
+    return match
 
 
 def prop_match(vobject_item: vobject.base.Component,
@@ -115,42 +152,59 @@ def prop_match(vobject_item: vobject.base.Component,
 
     See rfc4791-9.7.2 and rfc6352-10.5.1.
 
+    """
+    return compile_prop_match(filter_, ns)(vobject_item)
+
+
+def compile_prop_match(filter_: ET.Element, ns: str) -> ComponentMatcher:
+    """Compile the prop ``filter_`` to a function that matches components.
+
+    See ``prop_match``.
+
     """
     name = filter_.get("name", "").lower()
     if len(filter_) == 0:
         # Point #1 of rfc4791-9.7.2
-        return name in vobject_item.contents
+        return lambda vobject_item: name in vobject_item.contents
     if len(filter_) == 1:
         if filter_[0].tag == xmlutils.make_clark("%s:is-not-defined" % ns):
             # Point #2 of rfc4791-9.7.2
-            return name not in vobject_item.contents
-    if name not in vobject_item.contents:
-        return False
+            return lambda vobject_item: name not in vobject_item.contents
     # Point #3 and #4 of rfc4791-9.7.2
+    matchers: List[ComponentMatcher] = []
     for child in filter_:
         if ns == "C" and child.tag == xmlutils.make_clark("C:time-range"):
-            if not time_range_match(vobject_item, child, name):
-                return False
+            matchers.append(compile_time_range_match(child, name))
         elif child.tag == xmlutils.make_clark("%s:text-match" % ns):
-            if not text_match(vobject_item, child, name, ns):
-                return False
+            matchers.append(compile_text_match(child, name, ns))
         elif child.tag == xmlutils.make_clark("%s:param-filter" % ns):
-            if not param_filter_match(vobject_item, child, name, ns):
-                return False
+            matchers.append(compile_param_filter_match(child, name, ns))
         else:
             raise ValueError("Unexpected %r in prop-filter" % child.tag)
-    return True
+
+    def match(vobject_item: vobject.base.Component) -> bool:
+        return name in vobject_item.contents and all(
+            matcher(vobject_item) for matcher in matchers)
+
+    return match
 
 
 def time_range_match(vobject_item: vobject.base.Component,
                      filter_: ET.Element, child_name: str) -> bool:
     """Check whether the component/property ``child_name`` of
        ``vobject_item`` matches the time-range ``filter_``."""
+    return compile_time_range_match(filter_, child_name)(vobject_item)
+
+
+def compile_time_range_match(filter_: ET.Element, child_name: str
+                             ) -> ComponentMatcher:
+    """Compile the time-range ``filter_`` to a function that matches
+       components. See ``time_range_match``."""
 
     start_text = filter_.get("start")
     end_text = filter_.get("end")
     if not start_text and not end_text:
-        return False
+        return lambda vobject_item: False
     if start_text:
         start = datetime.strptime(start_text, "%Y%m%dT%H%M%SZ")
     else:
@@ -162,23 +216,26 @@ def time_range_match(vobject_item: vobject.base.Component,
     start = start.replace(tzinfo=timezone.utc)
     end = end.replace(tzinfo=timezone.utc)
 
-    matched = False
-
-    def range_fn(range_start: datetime, range_end: datetime,
-                 is_recurrence: bool) -> bool:
-        nonlocal matched
-        if start < range_end and range_start < end:
-            matched = True
-            return True
-        if end < range_start and not is_recurrence:
-            return True
-        return False
-
     def infinity_fn(start: datetime) -> bool:
         return False
 
-    visit_time_ranges(vobject_item, child_name, range_fn, infinity_fn)
-    return matched
+    def match(vobject_item: vobject.base.Component) -> bool:
+        matched = False
+
+        def range_fn(range_start: datetime, range_end: datetime,
+                     is_recurrence: bool) -> bool:
+            nonlocal matched
+            if start < range_end and range_start < end:
+                matched = True
+                return True
+            if end < range_start and not is_recurrence:
+                return True
+            return False
+
+        visit_time_ranges(vobject_item, child_name, range_fn, infinity_fn)
+        return matched
+
+    return match
 
 
 def visit_time_ranges(vobject_item: vobject.base.Component, child_name: str,
@@ -442,36 +499,46 @@ def text_match(vobject_item: vobject.base.Component,
     See rfc4791-9.7.5.
 
     """
-    # TODO: collations are not supported, but the default ones needed
-    # for DAV servers are actually pretty useless. Texts are lowered to
-    # be case-insensitive, almost as the "i;ascii-casemap" value.
-    text = next(filter_.itertext()).lower()
+    return compile_text_match(filter_, child_name, ns, attrib_name)(
+        vobject_item)
+
+
+def compile_text_match(filter_: ET.Element, child_name: str, ns: str,
+                       attrib_name: Optional[str] = None) -> ComponentMatcher:
+    """Compile the text-match ``filter_`` to a function that matches
+       components. See ``text_match``."""
+    # Unknown collations are handled case-insensitive
+    normalize = COLLATIONS.get(filter_.get("collation", ""), _lower)
+    text = normalize(next(filter_.itertext(), ""))
     match_type = "contains"
     if ns == "CR":
         match_type = filter_.get("match-type", match_type)
-
-    def match(value: str) -> bool:
-        value = value.lower()
-        if match_type == "equals":
-            return value == text
-        if match_type == "contains":
-            return text in value
-        if match_type == "starts-with":
-            return value.startswith(text)
-        if match_type == "ends-with":
-            return value.endswith(text)
+    value_match: Callable[[str], bool]
+    if match_type == "equals":
+        value_match = text.__eq__
+    elif match_type == "contains":
+        value_match = lambda value: text in value  # noqa: E731
+    elif match_type == "starts-with":
+        value_match = lambda value: value.startswith(text)  # noqa: E731
+    elif match_type == "ends-with":
+        value_match = lambda value: value.endswith(text)  # noqa: E731
+    else:
         raise ValueError("Unexpected text-match match-type: %r" % match_type)
+    negate = filter_.get("negate-condition") == "yes"
+    children_attr = "%s_list" % child_name
+
+    def match(vobject_item: vobject.base.Component) -> bool:
+        children = getattr(vobject_item, children_attr, [])
+        if attrib_name is not None:
+            condition = any(
+                value_match(normalize(attrib)) for child in children
+                for attrib in child.params.get(attrib_name, []))
+        else:
+            condition = any(value_match(normalize(child.value))
+                            for child in children)
+        return condition != negate
 
-    children = getattr(vobject_item, "%s_list" % child_name, [])
-    if attrib_name is not None:
-        condition = any(
-            match(attrib) for child in children
-            for attrib in child.params.get(attrib_name, []))
-    else:
-        condition = any(match(child.value) for child in children)
-    if filter_.get("negate-condition") == "yes":
-        return not condition
-    return condition
+    return match
 
 
 def param_filter_match(vobject_item: vobject.base.Component,
@@ -481,18 +548,73 @@ def param_filter_match(vobject_item: vobject.base.Component,
     See rfc4791-9.7.3.
 
     """
+    return compile_param_filter_match(filter_, parent_name, ns)(vobject_item)
+
+
+def compile_param_filter_match(filter_: ET.Element, parent_name: str, ns: str
+                               ) -> ComponentMatcher:
+    """Compile the param-filter ``filter_`` to a function that matches
+       components. See ``param_filter_match``."""
     name = filter_.get("name", "").upper()
-    children = getattr(vobject_item, "%s_list" % parent_name, [])
-    condition = any(name in child.params for child in children)
+    children_attr = "%s_list" % parent_name
+
+    def condition(vobject_item: vobject.base.Component) -> bool:
+        return any(name in child.params
+                   for child in getattr(vobject_item, children_attr, []))
+
     if len(filter_) > 0:
         if filter_[0].tag == xmlutils.make_clark("%s:text-match" % ns):
-            return condition and text_match(
-                vobject_item, filter_[0], parent_name, ns, name)
+            text_matcher = compile_text_match(
+                filter_[0], parent_name, ns, name)
+            return lambda vobject_item: (condition(vobject_item) and
+                                         text_matcher(vobject_item))
         if filter_[0].tag == xmlutils.make_clark("%s:is-not-defined" % ns):
-            return not condition
+            return lambda vobject_item: not condition(vobject_item)
     return condition
 
 
+def compile_filter(filter_: ET.Element, collection_tag: str) -> ItemMatcher:
+    """Compile the ``filter_`` of a REPORT request to a function that matches
+       items of a collection with the tag ``collection_tag``.
+
+    The result can be reused for all items of the collection.
+
+    """
+    if collection_tag == "VCALENDAR":
+        if len(filter_) == 0:
+            return lambda item: True
+        if len(filter_) > 1:
+            raise ValueError("Filter with %d children" % len(filter_))
+        if filter_[0].tag != xmlutils.make_clark("C:comp-filter"):
+            raise ValueError("Unexpected %r in filter" % filter_[0].tag)
+        return compile_comp_match(filter_[0])
+    if collection_tag == "VADDRESSBOOK":
+        prop_matchers: List[ComponentMatcher] = []
+        for child in filter_:
+            if child.tag != xmlutils.make_clark("CR:prop-filter"):
+                raise ValueError("Unexpected %r in filter" % child.tag)
+            prop_matchers.append(compile_prop_match(child, "CR"))
+        test = filter_.get("test", "anyof")
+        if test == "anyof":
+            return lambda item: any(prop_matcher(item.vobject_item)
+                                    for prop_matcher in prop_matchers)
+        if test == "allof":
+            return lambda item: all(prop_matcher(item.vobject_item)
+                                    for prop_matcher in prop_matchers)
+        raise ValueError("Unsupported filter test: %r" % test)
+    raise ValueError("Unsupported filter %r for %r" %
+                     (filter_.tag, collection_tag))
+
+
+def compile_filters(filters: Iterable[ET.Element], collection_tag: str
+                    ) -> ItemMatcher:
+    """Compile ``filters`` to a function that checks if an item matches all
+       of them. See ``compile_filter``."""
+    matchers = [compile_filter(filter_, collection_tag)
+                for filter_ in filters]
+    return lambda item: all(matcher(item) for matcher in matchers)
+
+
 def simplify_prefilters(filters: Iterable[ET.Element], collection_tag: str
                         ) -> Tuple[Optional[str], int, int, bool]:
     """Creates a simplified condition from ``filters``.
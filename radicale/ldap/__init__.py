@@ -1,11 +1,12 @@
 import datetime
 import json
+import logging
 import os
 
 import ldap3
 
 from dateutil.parser import parse
-from radicale import logger
+from radicale import logger, metrics
 from dataclasses import dataclass
 from typing import Optional, List
 from radicale.redis import client as redis_client
@@ -52,10 +53,12 @@ class LdapService:
 
         conn.bind()
 
-        try:
-            logger.debug("LDAP whoami: %s" % conn.extend.standard.who_am_i())
-        except Exception as err:
-            logger.debug("LDAP error: %s" % err)
+        if logger.isEnabledFor(logging.DEBUG):
+            try:
+                logger.debug("LDAP whoami: %s",
+                             conn.extend.standard.who_am_i())
+            except Exception as err:
+                logger.debug("LDAP error: %s", err)
 
         conn.search(search_base=os.getenv("LDAP_BASE"),
                     search_scope="LEVEL",
@@ -65,11 +68,14 @@ class LdapService:
         return conn.response
 
     def sync(self) -> List[LdapUser]:
-        cached = redis_client.get(REDIS_CACHE_KEY)
+        with metrics.phase("redis"):
+            cached = redis_client.get(REDIS_CACHE_KEY)
+        metrics.cache_result("ldap_users", bool(cached))
         if cached:
             users = json.loads(cached)
         else:
-            users = self._get_ldap_users()
+            with metrics.phase("ldap"):
+                users = self._get_ldap_users()
             users = [dict(u["attributes"]) for u in users]
             json_objects = json.dumps(users, default=str)
             redis_client.setex(name=REDIS_CACHE_KEY, value=json_objects,
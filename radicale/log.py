@@ -23,13 +23,19 @@ Log messages are sent to the first available target of:
   - Error stream specified by the WSGI server in "wsgi.errors"
   - ``sys.stderr``
 
+With ``set_queued`` log records are formatted and written by a background
+thread.
+
 """
 
+import contextlib
 import logging
 import os
+import queue
 import sys
 import threading
-from typing import Any, Callable, ClassVar, Dict, Iterator, Union
+from typing import (Any, Callable, ClassVar, Dict, Iterator, List, Optional,
+                    Set, Tuple, Union)
 
 from radicale import types
 
@@ -39,6 +45,11 @@ DATE_FORMAT: str = "%Y-%m-%d %H:%M:%S %z"
 
 logger: logging.Logger = logging.getLogger(LOGGER_NAME)
 
+# Sampled access log entries are logged independently of the level of
+# ``logger``
+access_logger: logging.Logger = logging.getLogger(LOGGER_NAME + ".access")
+access_logger.setLevel(logging.INFO)
+
 
 class RemoveTracebackFilter(logging.Filter):
 
@@ -68,6 +79,12 @@ class IdentLogRecordFactory:
         return record
 
 
+# Queued log record with its target stream, ``threading.Event`` requests a
+# flush and ``None`` stops the background thread
+_QueueItem = Union[Tuple[logging.LogRecord, types.ErrorStream],
+                   threading.Event, None]
+
+
 class ThreadedStreamHandler(logging.Handler):
     """Sends logging output to the stream registered for the current thread or
        ``sys.stderr`` when no stream was registered."""
@@ -75,22 +92,102 @@ class ThreadedStreamHandler(logging.Handler):
     terminator: ClassVar[str] = "\n"
 
     _streams: Dict[int, types.ErrorStream]
+    _queue: Optional["queue.SimpleQueue[_QueueItem]"]
+    _writer: Optional[threading.Thread]
 
     def __init__(self) -> None:
         super().__init__()
         self._streams = {}
+        self._queue = None
+        self._writer = None
 
     def emit(self, record: logging.LogRecord) -> None:
         try:
             stream = self._streams.get(threading.get_ident(), sys.stderr)
-            msg = self.format(record)
-            stream.write(msg)
-            stream.write(self.terminator)
+            items = self._queue
+            if items is not None:
+                # Merge the arguments into the message, they might be
+                # modified before the record is formatted
+                record.msg = record.getMessage()
+                record.args = None
+                items.put((record, stream))
+                return
+            self._write(record, stream)
             if hasattr(stream, "flush"):
                 stream.flush()
         except Exception:
             self.handleError(record)
 
+    def _write(self, record: logging.LogRecord, stream: types.ErrorStream
+               ) -> None:
+        msg = self.format(record)
+        stream.write(msg)
+        stream.write(self.terminator)
+
+    def _run_writer(self, items: "queue.SimpleQueue[_QueueItem]") -> None:
+        while True:
+            # Write all queued records before flushing the streams once
+            item = items.get()
+            streams: Set[types.ErrorStream] = set()
+            events: List[threading.Event] = []
+            while True:
+                if isinstance(item, threading.Event):
+                    events.append(item)
+                elif item is not None:
+                    record, stream = item
+                    try:
+                        self._write(record, stream)
+                        streams.add(stream)
+                    except Exception:
+                        self.handleError(record)
+                else:
+                    break
+                try:
+                    item = items.get_nowait()
+                except queue.Empty:
+                    break
+            for stream in streams:
+                if hasattr(stream, "flush"):
+                    with contextlib.suppress(Exception):
+                        stream.flush()
+            for event in events:
+                event.set()
+            if item is None:
+                return
+
+    def start_writer(self) -> None:
+        """Format and write log records in a background thread."""
+        with self.lock:  # type:ignore[union-attr]
+            if self._writer is not None:
+                return
+            items: "queue.SimpleQueue[_QueueItem]" = queue.SimpleQueue()
+            self._writer = threading.Thread(
+                target=self._run_writer, args=(items,), daemon=True,
+                name="LogWriter")
+            self._writer.start()
+            self._queue = items
+
+    def stop_writer(self) -> None:
+        """Write all queued log records and stop the background thread."""
+        with self.lock:  # type:ignore[union-attr]
+            writer, items = self._writer, self._queue
+            self._writer = self._queue = None
+        if writer is not None and items is not None:
+            items.put(None)
+            writer.join()
+
+    def flush(self) -> None:
+        items, writer = self._queue, self._writer
+        if items is None or writer is threading.current_thread():
+            return
+        event = threading.Event()
+        items.put(event)
+        event.wait()
+
+    def close(self) -> None:
+        self.stop_writer()
+        super().close()
+
     @types.contextmanager
     def register_stream(self, stream: types.ErrorStream) -> Iterator[None]:
         """Register stream for logging output of the current thread."""
@@ -108,13 +205,17 @@ def register_stream(stream: types.ErrorStream) -> Iterator[None]:
     yield
 
 
+_handler: Optional[ThreadedStreamHandler] = None
+
+
 def setup() -> None:
     """Set global logging up."""
-    global register_stream
+    global register_stream, _handler
     handler = ThreadedStreamHandler()
     logging.basicConfig(format=LOGGER_FORMAT, datefmt=DATE_FORMAT,
                         handlers=[handler])
     register_stream = handler.register_stream
+    _handler = handler
     log_record_factory = IdentLogRecordFactory(logging.getLogRecordFactory())
     logging.setLogRecordFactory(log_record_factory)
     set_level(logging.WARNING)
@@ -129,3 +230,18 @@ def set_level(level: Union[int, str]) -> None:
     logger.removeFilter(REMOVE_TRACEBACK_FILTER)
     if level > logging.DEBUG:
         logger.addFilter(REMOVE_TRACEBACK_FILTER)
+
+
+def set_queued(enabled: bool) -> None:
+    """Write log records in a background thread.
+
+    Only use this when the registered streams stay valid after requests,
+    e.g. with the internal server.
+
+    """
+    if _handler is None:
+        return
+    if enabled:
+        _handler.start_writer()
+    else:
+        _handler.stop_writer()
@@ -0,0 +1,267 @@
+# This file is part of Radicale - CalDAV and CardDAV server
+#
+# This library is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Request metrics in the Prometheus text exposition format.
+
+Metrics are collected per process. Requests are timed with ``request``,
+phases of the request (e.g. authentication or waiting for the storage lock)
+with ``phase`` or ``observe_phase`` in the same thread.
+
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+from typing import (Dict, Iterable, Iterator, List, Optional, Sequence, Tuple,
+                    TypeVar)
+
+# Upper bounds of histogram buckets (seconds)
+BUCKETS: Sequence[float] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                            1, 2.5, 5, 10)
+
+_T = TypeVar("_T")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, value.replace(
+        "\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in zip(names, values))
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Base class for metrics with labels."""
+
+    name: str
+    documentation: str
+    type: str
+    label_names: Sequence[str]
+    _lock: threading.Lock
+
+    def __init__(self, name: str, documentation: str,
+                 label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        """Get the metric in the text exposition format."""
+        with self._lock:
+            samples = list(self._samples())
+        return "".join(["# HELP %s %s\n" % (self.name, self.documentation),
+                        "# TYPE %s %s\n" % (self.name, self.type),
+                        *samples])
+
+
+class Counter(Metric):
+    """Monotonically increasing value."""
+
+    type = "counter"
+    _values: Dict[Tuple[str, ...], float]
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def _samples(self) -> Iterable[str]:
+        if not self.label_names and not self._values:
+            self._values[()] = 0
+        for labels, value in sorted(self._values.items()):
+            yield "%s%s %s\n" % (self.name, _format_labels(
+                self.label_names, labels), _format_value(value))
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in buckets."""
+
+    type = "histogram"
+    buckets: Sequence[float]
+    # Tuples of bucket counts, sum and count
+    _values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]]
+
+    def __init__(self, *args, buckets: Sequence[float] = BUCKETS,
+                 **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = (
+                    [0] * (len(self.buckets) + 1), [0.0])
+            bucket_counts, total = values
+            bucket_counts[index] += 1
+            total[0] += value
+
+    def _samples(self) -> Iterable[str]:
+        label_names = (*self.label_names, "le")
+        for labels, (bucket_counts, total) in sorted(self._values.items()):
+            count = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")),
+                                           bucket_counts):
+                count += bucket_count
+                yield "%s_bucket%s %d\n" % (self.name, _format_labels(
+                    label_names, (*labels, _format_value(bound))), count)
+            formatted_labels = _format_labels(self.label_names, labels)
+            yield "%s_sum%s %s\n" % (self.name, formatted_labels,
+                                     _format_value(total[0]))
+            yield "%s_count%s %d\n" % (self.name, formatted_labels, count)
+
+
+class Registry:
+    """Collection of metrics."""
+
+    _metrics: Dict[str, Metric]
+
+    def __init__(self) -> None:
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError("Duplicate metric: %r" % metric.name)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))  # type:ignore
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))  # type:ignore
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))  # type:ignore
+
+    def expose(self) -> str:
+        """Get all metrics in the text exposition format."""
+        return "".join(metric.expose() for metric in self._metrics.values())
+
+
+REGISTRY: Registry = Registry()
+
+REQUESTS_IN_FLIGHT: Gauge = REGISTRY.gauge(
+    "radicale_requests_in_flight", "Requests that are processed")
+REQUEST_DURATION: Histogram = REGISTRY.histogram(
+    "radicale_request_duration_seconds", "Duration of requests",
+    ("method",))
+PHASE_DURATION: Histogram = REGISTRY.histogram(
+    "radicale_request_phase_duration_seconds",
+    "Time spent in phases of requests", ("method", "phase"))
+STORAGE_LOCK_WAIT: Histogram = REGISTRY.histogram(
+    "radicale_storage_lock_wait_seconds",
+    "Time spent waiting for the storage lock", ("mode",))
+CACHE_HITS: Counter = REGISTRY.counter(
+    "radicale_cache_hits_total", "Cache hits", ("cache",))
+CACHE_MISSES: Counter = REGISTRY.counter(
+    "radicale_cache_misses_total", "Cache misses", ("cache",))
+TLS_HANDSHAKE_DURATION: Histogram = REGISTRY.histogram(
+    "radicale_tls_handshake_duration_seconds", "Duration of TLS handshakes",
+    ("resumed",))
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def request(method: str) -> Iterator[None]:
+    """Time a request of the current thread."""
+    _local.method = method
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REQUEST_DURATION.observe(time.perf_counter() - start, method)
+        REQUESTS_IN_FLIGHT.dec()
+        _local.method = None
+
+
+def observe_phase(name: str, seconds: float) -> None:
+    """Record time spent in the phase ``name`` of the current request."""
+    method: Optional[str] = getattr(_local, "method", None)
+    PHASE_DURATION.observe(seconds, method or "", name)
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the phase ``name`` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(name, time.perf_counter() - start)
+
+
+def time_iter(name: str, iterable: Iterable[_T]) -> Iterator[_T]:
+    """Time the phase ``name`` while ``iterable`` produces items.
+
+    Time spent by the consumer between items is not included.
+
+    """
+    iterator = iter(iterable)
+    total = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                total += time.perf_counter() - start
+            yield item
+    finally:
+        observe_phase(name, total)
+
+
+def cache_result(cache: str, hit: bool) -> None:
+    """Count a hit or miss of ``cache``."""
+    (CACHE_HITS if hit else CACHE_MISSES).inc(cache)
+
+
+def expose() -> str:
+    """Get all metrics in the text exposition format."""
+    return REGISTRY.expose()
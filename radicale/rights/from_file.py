@@ -35,38 +35,97 @@ Leading or ending slashes are trimmed from collection's path.
 """
 
 import configparser
+import functools
+import os
 import re
+import threading
+from typing import Callable, List, Optional, Pattern, Tuple
 
 from radicale import config, pathutils, rights
 from radicale.log import logger
 
+# Maximum number of memoized results of ``Rights.authorization``
+AUTHORIZATION_CACHE_SIZE: int = 4096
+
 
 class Rights(rights.BaseRights):
 
     _filename: str
+    _lock: threading.Lock
+    # Signature of the loaded rights file (inode, size, mtime)
+    _file_signature: Optional[Tuple[int, int, int]]
+    _cached_authorization: Callable[[str, str], str]
 
     def __init__(self, configuration: config.Configuration) -> None:
         super().__init__(configuration)
         self._filename = configuration.get("rights", "file")
+        self._lock = threading.Lock()
+        self._file_signature = None
+        self._cached_authorization = functools.partial(
+            self._authorization, [])
 
-    def authorization(self, user: str, path: str) -> str:
-        user = user or ""
-        sane_path = pathutils.strip_path(path)
-        # Prevent "regex injection"
-        escaped_user = re.escape(user)
-        rights_config = configparser.ConfigParser()
+    def _load_rules(self) -> None:
+        """Compile the rules of the rights file if it was changed."""
         try:
-            with open(self._filename, "r") as f:
-                rights_config.read_file(f)
-        except Exception as e:
+            stat = os.stat(self._filename)
+        except OSError as e:
             raise RuntimeError("Failed to load rights file %r: %s" %
                                (self._filename, e)) from e
-        for section in rights_config.sections():
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if signature == self._file_signature:
+            return
+        with self._lock:
+            if signature == self._file_signature:
+                return
+            rights_config = configparser.ConfigParser()
+            try:
+                with open(self._filename, "r") as f:
+                    rights_config.read_file(f)
+            except Exception as e:
+                raise RuntimeError("Failed to load rights file %r: %s" %
+                                   (self._filename, e)) from e
+            rules: List[Tuple[str, Pattern[str], str, str]] = []
+            for section in rights_config.sections():
+                try:
+                    user_pattern = rights_config.get(section, "user")
+                    collection_pattern = rights_config.get(
+                        section, "collection")
+                    permissions = rights_config.get(section, "permissions")
+                    # Use empty format() for harmonized handling of curly
+                    # braces
+                    user_regex = re.compile(user_pattern.format())
+                except Exception as e:
+                    raise RuntimeError(
+                        "Error in section %r of rights file %r: %s" %
+                        (section, self._filename, e)) from e
+                rules.append((section, user_regex, collection_pattern,
+                              permissions))
+            logger.debug("Loaded %d rules from rights file %r", len(rules),
+                         self._filename)
+            # Results of the previous rules are discarded
+            self._cached_authorization = functools.lru_cache(
+                maxsize=AUTHORIZATION_CACHE_SIZE)(
+                    functools.partial(self._authorization, rules))
+            self._file_signature = signature
+
+    def authorization(self, user: str, path: str) -> str:
+        self._load_rules()
+        return self._cached_authorization(
+            user or "", pathutils.strip_path(path))
+
+    def _authorization(self, rules: List[Tuple[str, Pattern[str], str, str]],
+                       user: str, sane_path: str) -> str:
+        """Match ``user`` and ``sane_path`` against the compiled ``rules``.
+
+        ``rules`` are tuples of section name, user regex, collection pattern
+        and permissions.
+
+        """
+        # Prevent "regex injection"
+        escaped_user = re.escape(user)
+        for section, user_regex, collection_pattern, permissions in rules:
             try:
-                user_pattern = rights_config.get(section, "user")
-                collection_pattern = rights_config.get(section, "collection")
-                # Use empty format() for harmonized handling of curly braces
-                user_match = re.fullmatch(user_pattern.format(), user)
+                user_match = user_regex.fullmatch(user)
                 collection_match = user_match and re.fullmatch(
                     collection_pattern.format(
                         *(re.escape(s) for s in user_match.groups()),
@@ -76,11 +135,11 @@ class Rights(rights.BaseRights):
                                    "%s" % (section, self._filename, e)) from e
             if user_match and collection_match:
                 logger.debug("Rule %r:%r matches %r:%r from section %r",
-                             user, sane_path, user_pattern,
+                             user, sane_path, user_regex.pattern,
                              collection_pattern, section)
-                return rights_config.get(section, "permissions")
+                return permissions
             logger.debug("Rule %r:%r doesn't match %r:%r from section %r",
-                         user, sane_path, user_pattern, collection_pattern,
-                         section)
+                         user, sane_path, user_regex.pattern,
+                         collection_pattern, section)
         logger.info("Rights: %r:%r doesn't match any section", user, sane_path)
         return ""
@@ -22,19 +22,32 @@ Built-in WSGI server.
 
 """
 
+import collections
+import contextlib
+import email.utils
 import errno
 import http
+import http.client
+import io
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
 import select
+import selectors
+import signal
 import socket
 import socketserver
 import ssl
 import sys
+import threading
+import time
 import wsgiref.simple_server
-from typing import (Any, Callable, Dict, List, MutableMapping, Optional, Set,
-                    Tuple, Union)
+from typing import (Any, Callable, Deque, Dict, Iterable, List, Mapping,
+                    MutableMapping, Optional, Set, Tuple, Union)
 from urllib.parse import unquote
 
-from radicale import Application, config
+from radicale import Application, config, log, metrics
 from radicale.log import logger
 
 COMPAT_EAI_ADDRFAMILY: int
@@ -77,11 +90,40 @@ class ParallelHTTPServer(socketserver.ThreadingMixIn,
     daemon_threads: bool = True
 
     def __init__(self, configuration: config.Configuration, family: int,
-                 address: Tuple[str, int], RequestHandlerClass:
-                 Callable[..., http.server.BaseHTTPRequestHandler]) -> None:
+                 address: Union[ADDRESS_TYPE, Tuple[str, int]],
+                 RequestHandlerClass:
+                 Callable[..., http.server.BaseHTTPRequestHandler],
+                 reuse_port: bool = False, activate: bool = True,
+                 listen_socket: Optional[socket.socket] = None) -> None:
+        """
+        ``reuse_port`` sets ``SO_REUSEPORT`` before binding the socket.
+        With ``activate`` set to ``False`` the socket is bound but not
+        listening. ``listen_socket`` is an already bound socket (e.g. from
+        another process) that is used instead of binding a new one.
+
+        """
         self.configuration = configuration
         self.address_family = family
-        super().__init__(address, RequestHandlerClass)
+        self.reuse_port = reuse_port
+        super().__init__(address, RequestHandlerClass,  # type:ignore[arg-type]
+                         bind_and_activate=False)
+        try:
+            if listen_socket is None:
+                self.server_bind()
+            else:
+                self.socket.close()
+                self.socket = listen_socket
+                # See ``http.server.HTTPServer.server_bind``
+                self.server_address = listen_socket.getsockname()
+                host, port = self.server_address[:2]
+                self.server_name = socket.getfqdn(host)
+                self.server_port = port
+                self.setup_environ()
+            if activate:
+                self.server_activate()
+        except BaseException:
+            self.server_close()
+            raise
         self.worker_sockets = set()
         self._timeout = configuration.get("server", "timeout")
 
@@ -89,6 +131,10 @@ class ParallelHTTPServer(socketserver.ThreadingMixIn,
         if self.address_family == socket.AF_INET6:
             # Only allow IPv6 connections to the IPv6 socket
             self.socket.setsockopt(COMPAT_IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET,
+                                   socket.SO_REUSEPORT,  # type:ignore
+                                   1)
         super().server_bind()
 
     def get_request(  # type:ignore[override]
@@ -151,11 +197,52 @@ class ParallelHTTPServer(socketserver.ThreadingMixIn,
                          sys.exc_info()[1], exc_info=True)
 
 
+class HandshakeStatistics:
+    """Thread-safe counters for TLS handshakes."""
+
+    count: int
+    resumed: int
+    failed: int
+    total_seconds: float
+    _lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.count = self.resumed = self.failed = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, sock: ssl.SSLSocket, client_address: ADDRESS_TYPE,
+               seconds: float) -> None:
+        """Record a successful handshake that took ``seconds``."""
+        resumed = sock.session_reused
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            if resumed:
+                self.resumed += 1
+        metrics.TLS_HANDSHAKE_DURATION.observe(
+            seconds, "true" if resumed else "false")
+        logger.debug("SSL handshake with %s finished in %.3f ms "
+                     "(%s, %s, %s)", format_address(client_address),
+                     seconds * 1000, sock.version(),
+                     (sock.cipher() or ("unknown",))[0],
+                     "resumed" if resumed else "full")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failed += 1
+
+
 class ParallelHTTPSServer(ParallelHTTPServer):
 
+    handshake_statistics: HandshakeStatistics
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.handshake_statistics = HandshakeStatistics()
+        super().__init__(*args, **kwargs)
+
     def server_bind(self) -> None:
         super().server_bind()
-        # Wrap the TCP socket in an SSL socket
         certfile: str = self.configuration.get("server", "certificate")
         keyfile: str = self.configuration.get("server", "key")
         cafile: str = self.configuration.get("server", "certificate_authority")
@@ -174,11 +261,40 @@ class ParallelHTTPSServer(ParallelHTTPServer):
                     "Invalid %s value for option %r in section %r in %s: %r "
                     "(%s)" % (type_name, name, "server", source, filename,
                               e)) from e
+
+    def server_activate(self) -> None:
+        super().server_activate()
+        # Wrap the TCP socket in an SSL socket
+        certfile: str = self.configuration.get("server", "certificate")
+        keyfile: str = self.configuration.get("server", "key")
+        cafile: str = self.configuration.get("server", "certificate_authority")
+        ciphersuite: str = self.configuration.get("server", "ciphersuite")
+        session_tickets: int = self.configuration.get(
+            "server", "ssl_session_tickets")
         context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
         context.load_cert_chain(certfile=certfile, keyfile=keyfile)
         if cafile:
             context.load_verify_locations(cafile=cafile)
             context.verify_mode = ssl.CERT_REQUIRED
+        if ciphersuite:
+            try:
+                context.set_ciphers(ciphersuite)
+            except ssl.SSLError as e:
+                raise RuntimeError(
+                    "Invalid value for option %r in section %r in %s: %r "
+                    "(%s)" % ("ciphersuite", "server",
+                              self.configuration.get_source(
+                                  "server", "ciphersuite"),
+                              ciphersuite, e)) from e
+        context.options |= ssl.OP_CIPHER_SERVER_PREFERENCE
+        # The session cache of the context is used for session IDs,
+        # session tickets allow resumption without server state
+        if session_tickets == 0:
+            context.options |= ssl.OP_NO_TICKET
+        else:
+            context.options &= ~ssl.OP_NO_TICKET
+        if hasattr(context, "num_tickets"):
+            context.num_tickets = session_tickets
         self.socket = context.wrap_socket(
             self.socket, server_side=True, do_handshake_on_connect=False)
 
@@ -187,12 +303,16 @@ class ParallelHTTPSServer(ParallelHTTPServer):
             ) -> None:
         try:
             try:
+                start = time.perf_counter()
                 request.do_handshake()
+                self.handshake_statistics.record(
+                    request, client_address, time.perf_counter() - start)
             except socket.timeout:
                 raise
             except Exception as e:
                 raise RuntimeError("SSL handshake failed: %s" % e) from e
         except Exception:
+            self.handshake_statistics.record_failure()
             try:
                 self.handle_error(request, client_address)
             finally:
@@ -255,78 +375,781 @@ class RequestHandler(wsgiref.simple_server.WSGIRequestHandler):
         handler.run(app)
 
 
-def serve(configuration: config.Configuration,
-          shutdown_socket: Optional[socket.socket] = None) -> None:
-    """Serve radicale from configuration.
+class RequestScheduler:
+    """Run requests in a pool of worker threads.
 
-    `shutdown_socket` can be used to gracefully shutdown the server.
-    The socket can be created with `socket.socketpair()`, when the other socket
-    gets closed the server stops accepting new requests by clients and the
-    function returns after all active requests are finished.
+    Requests wait in a bounded queue for a free worker. The number of requests
+    that are processed concurrently is limited by an adaptive limit, that is
+    adjusted with AIMD (additive increase, multiplicative decrease) based on
+    the observed processing time of requests.
 
     """
 
-    logger.info("Starting Radicale")
+    _max_workers: int
+    _max_queued: int
+    _target_latency: float
+    _condition: threading.Condition
+    _queue: Deque[Tuple[Callable[..., None], Tuple[Any, ...]]]
+    _threads: List[threading.Thread]
+    _idle: int
+    _active: int
+    _limit: float
+    _average_latency: float
+    _last_decrease: float
+    _shutdown: bool
+
+    def __init__(self, max_workers: int, max_queued: int,
+                 target_latency: float) -> None:
+        """
+        ``max_workers`` is the maximum number of worker threads, ``0`` for no
+        limit. ``max_queued`` is the maximum number of waiting requests, ``0``
+        for no limit. ``target_latency`` is the processing time (seconds)
+        that the adaptive limit aims for, ``0`` disables the adaptive limit.
+
+        """
+        self._max_workers = max_workers
+        self._max_queued = max_queued
+        self._target_latency = target_latency
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._threads = []
+        self._idle = 0
+        self._active = 0
+        if target_latency <= 0:
+            self._limit = float(max_workers or "inf")
+        else:
+            self._limit = float(max_workers or 8)
+        self._average_latency = 0.0
+        self._last_decrease = 0.0
+        self._shutdown = False
+
+    @property
+    def limit(self) -> int:
+        """Current limit for concurrently processed requests."""
+        return max(1, int(min(self._limit, self._max_workers or
+                              float("inf"))))
+
+    def submit(self, fn: Callable[..., None], *args: Any) -> bool:
+        """Queue ``fn(*args)`` for execution in a worker thread.
+
+        Returns ``False`` if the queue is full.
+
+        """
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            if 0 < self._max_queued <= len(self._queue):
+                return False
+            self._queue.append((fn, args))
+            if self._idle == 0 and (
+                    self._max_workers <= 0 or
+                    len(self._threads) < self._max_workers):
+                thread = threading.Thread(target=self._worker, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        return True
+
+    def retry_after(self) -> int:
+        """Estimated time (seconds) until the queue has capacity again."""
+        with self._condition:
+            return max(1, math.ceil(len(self._queue) * self._average_latency /
+                                    self.limit))
+
+    def shutdown(self) -> None:
+        """Process the remaining requests and stop all worker threads."""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue or self._active >= self.limit:
+                    if self._shutdown and not self._queue:
+                        return
+                    self._idle += 1
+                    try:
+                        self._condition.wait()
+                    finally:
+                        self._idle -= 1
+                fn, args = self._queue.popleft()
+                self._active += 1
+            start = time.monotonic()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error("An exception occurred during request: %s", e,
+                             exc_info=True)
+            finally:
+                latency = time.monotonic() - start
+                with self._condition:
+                    self._active -= 1
+                    self._update_limit(latency)
+                    self._condition.notify_all()
+
+    def _update_limit(self, latency: float) -> None:
+        self._average_latency += (latency - self._average_latency) / 8
+        if self._target_latency <= 0:
+            return
+        old_limit = self.limit
+        now = time.monotonic()
+        if latency > self._target_latency:
+            # Decrease at most once per target latency, requests that were
+            # started before the last decrease don't reflect the new limit
+            if now - self._last_decrease > self._target_latency:
+                self._limit = max(1.0, self._limit * 0.9)
+                self._last_decrease = now
+        elif self._max_workers <= 0 or self._limit < self._max_workers:
+            self._limit += 1 / self._limit
+        if self.limit != old_limit:
+            logger.debug("Concurrency limit changed to %d", self.limit)
+
+
+class EventLoopRequest:
+    """Request parsed by ``EventLoopServer``."""
+
+    method: str
+    target: str
+    version: str
+    headers: http.client.HTTPMessage
+    content_length: int
+    keep_alive: bool
+    body: bytes
+
+    def __init__(self, raw_headers: bytes) -> None:
+        """Parse the request line and the header block ``raw_headers``.
+
+        Raises ``ValueError`` for malformed requests.
+
+        """
+        raw_request_line, _, raw_header_fields = raw_headers.partition(
+            b"\r\n")
+        words = str(raw_request_line, "iso-8859-1").split()
+        if len(words) != 3:
+            raise ValueError("Bad request line: %r" % raw_request_line)
+        self.method, self.target, self.version = words
+        if self.version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise ValueError("Unsupported HTTP version: %r" % self.version)
+        try:
+            self.headers = http.client.parse_headers(
+                io.BytesIO(raw_header_fields))
+        except http.client.HTTPException as e:
+            raise ValueError("Bad request headers: %s" % e) from e
+        if self.headers.get("Transfer-Encoding", "identity") != "identity":
+            raise ValueError("Unsupported transfer encoding: %r" %
+                             self.headers["Transfer-Encoding"])
+        content_length = self.headers.get("Content-Length", "0").strip()
+        if not content_length.isdigit():
+            raise ValueError("Bad content length: %r" % content_length)
+        self.content_length = int(content_length)
+        connection = self.headers.get("Connection", "").lower()
+        if self.version == "HTTP/1.0":
+            self.keep_alive = "keep-alive" in connection
+        else:
+            self.keep_alive = "close" not in connection
+        self.body = b""
+
+
+class EventLoopConnection:
+    """Client connection of ``EventLoopServer``."""
+
+    sock: socket.socket
+    client_address: ADDRESS_TYPE
+    server: ParallelHTTPServer
+    buffer: bytearray
+    request: Optional[EventLoopRequest]
+    handshake_done: bool
+    handshake_start: float
+    events: int
+    last_activity: float
+
+    def __init__(self, sock: socket.socket, client_address: ADDRESS_TYPE,
+                 server: ParallelHTTPServer) -> None:
+        self.sock = sock
+        self.client_address = client_address
+        self.server = server
+        self.buffer = bytearray()
+        self.request = None
+        self.handshake_done = not isinstance(sock, ssl.SSLSocket)
+        self.handshake_start = time.perf_counter()
+        self.events = 0
+        self.last_activity = time.monotonic()
+
+
+class EventLoopServer:
+    """Serve the listening sockets of ``servers`` from a single thread.
+
+    All connections are multiplexed with ``selectors``. Requests are read and
+    parsed in the event loop, complete requests are dispatched to the worker
+    threads of a ``RequestScheduler`` that run the WSGI application and write
+    the response. Requests are rejected with ``503 Service Unavailable`` when
+    the queue of the scheduler is full. Idle keep-alive connections don't
+    occupy a thread.
+
+    """
+
+    _servers: Mapping[socket.socket, ParallelHTTPServer]
+    _shutdown_socket: Optional[socket.socket]
+    _reload_socket: Optional[socket.socket]
+    _reload: Optional[Callable[[], None]]
+    _timeout: float
+    _max_content_length: int
+    _selector: selectors.BaseSelector
+    _scheduler: RequestScheduler
+    _idle_connections: "collections.OrderedDict[socket.socket, EventLoopConnection]"  # noqa:E501
+    _finished_connections: Deque[Tuple[EventLoopConnection, bool]]
+    _wakeup_socket: socket.socket
+    _wakeup_socket_out: socket.socket
+
+    def __init__(self, configuration: config.Configuration,
+                 servers: Mapping[socket.socket, ParallelHTTPServer],
+                 shutdown_socket: Optional[socket.socket] = None,
+                 reload_socket: Optional[socket.socket] = None,
+                 reload: Optional[Callable[[], None]] = None) -> None:
+        """``reload`` is called when data arrives on ``reload_socket``."""
+        self._servers = servers
+        self._shutdown_socket = shutdown_socket
+        self._reload_socket = reload_socket
+        self._reload = reload
+        self._timeout = configuration.get("server", "timeout")
+        self._max_content_length = configuration.get(
+            "server", "max_content_length")
+        max_connections: int = configuration.get("server", "max_connections")
+        self._selector = selectors.DefaultSelector()
+        self._scheduler = RequestScheduler(
+            max_connections,
+            configuration.get("server", "max_queued_requests"),
+            configuration.get("server", "target_latency"))
+        self._idle_connections = collections.OrderedDict()
+        self._finished_connections = collections.deque()
+        # Worker threads use this socket pair to wake up the event loop
+        self._wakeup_socket, self._wakeup_socket_out = socket.socketpair()
+        self._wakeup_socket.setblocking(False)
+        self._wakeup_socket_out.setblocking(False)
+
+    def run(self) -> None:
+        """Run the event loop until ``shutdown_socket`` gets closed.
+
+        Returns after all active requests are finished.
+
+        """
+        select_timeout = None
+        if sys.platform == "win32":
+            # Fallback to busy waiting. (select(...) blocks SIGINT on Windows.)
+            select_timeout = 1.0
+        for sock in self._servers:
+            sock.setblocking(False)
+            self._selector.register(sock, selectors.EVENT_READ, self._accept)
+        self._selector.register(self._wakeup_socket, selectors.EVENT_READ,
+                                self._process_finished_connections)
+        if self._shutdown_socket is not None:
+            self._selector.register(self._shutdown_socket,
+                                    selectors.EVENT_READ, None)
+        if self._reload_socket is not None:
+            self._selector.register(self._reload_socket,
+                                    selectors.EVENT_READ, self._handle_reload)
+        try:
+            while True:
+                timeout = self._next_expiration()
+                if timeout is None or (select_timeout is not None and
+                                       select_timeout < timeout):
+                    timeout = select_timeout
+                events = self._selector.select(timeout)
+                if any(key.fileobj is self._shutdown_socket
+                       for key, _ in events):
+                    logger.info("Stopping Radicale")
+                    break
+                for key, _ in events:
+                    if isinstance(key.data, EventLoopConnection):
+                        self._read(key.data)
+                    else:
+                        key.data(key.fileobj)
+                self._expire_idle_connections()
+        finally:
+            for sock in self._servers:
+                self._selector.unregister(sock)
+            for connection in list(self._idle_connections.values()):
+                self._close_connection(connection)
+            # Wait for active requests
+            self._scheduler.shutdown()
+            while self._finished_connections:
+                connection, _ = self._finished_connections.popleft()
+                self._close_connection(connection)
+            self._selector.close()
+            self._wakeup_socket.close()
+            self._wakeup_socket_out.close()
+
+    def _handle_reload(self, sock: socket.socket) -> None:
+        if not _read_reload_socket(sock):
+            self._selector.unregister(sock)
+            return
+        if self._reload is not None:
+            self._reload()
+
+    def _next_expiration(self) -> Optional[float]:
+        if self._timeout <= 0 or not self._idle_connections:
+            return None
+        connection = next(iter(self._idle_connections.values()))
+        return max(0.0, connection.last_activity + self._timeout -
+                   time.monotonic())
+
+    def _expire_idle_connections(self) -> None:
+        if self._timeout <= 0:
+            return
+        deadline = time.monotonic() - self._timeout
+        while self._idle_connections:
+            connection = next(iter(self._idle_connections.values()))
+            if connection.last_activity > deadline:
+                break
+            logger.debug("Closing idle connection from %s",
+                         format_address(connection.client_address))
+            self._close_connection(connection)
+
+    def _accept(self, sock: socket.socket) -> None:
+        try:
+            client_sock, client_address = sock.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            logger.warning("Failed to accept connection: %s", e)
+            return
+        client_sock.setblocking(False)
+        self._wait_for_request(EventLoopConnection(
+            client_sock, client_address, self._servers[sock]))
+
+    def _register(self, connection: EventLoopConnection, events: int
+                  ) -> None:
+        if connection.events == events:
+            return
+        if connection.events:
+            self._selector.modify(connection.sock, events, connection)
+        else:
+            self._selector.register(connection.sock, events, connection)
+        connection.events = events
+
+    def _unregister(self, connection: EventLoopConnection) -> None:
+        self._idle_connections.pop(connection.sock, None)
+        if connection.events:
+            self._selector.unregister(connection.sock)
+            connection.events = 0
+
+    def _wait_for_request(self, connection: EventLoopConnection) -> None:
+        connection.last_activity = time.monotonic()
+        self._idle_connections[connection.sock] = connection
+        self._register(connection, selectors.EVENT_READ)
+        if connection.buffer:
+            # Pipelined request
+            self._parse(connection)
+
+    def _close_connection(self, connection: EventLoopConnection) -> None:
+        self._unregister(connection)
+        with contextlib.suppress(OSError):
+            connection.sock.shutdown(socket.SHUT_WR)
+        connection.sock.close()
+
+    def _read(self, connection: EventLoopConnection) -> None:
+        sock = connection.sock
+        try:
+            if not connection.handshake_done:
+                assert isinstance(sock, ssl.SSLSocket)
+                sock.do_handshake()
+                connection.handshake_done = True
+                assert isinstance(connection.server, ParallelHTTPSServer)
+                connection.server.handshake_statistics.record(
+                    sock, connection.client_address,
+                    time.perf_counter() - connection.handshake_start)
+                self._register(connection, selectors.EVENT_READ)
+            data = sock.recv(65536)
+            if isinstance(sock, ssl.SSLSocket):
+                # The SSL layer might have buffered more decrypted data
+                while sock.pending():
+                    data += sock.recv(sock.pending())
+        except (BlockingIOError, InterruptedError, ssl.SSLWantReadError):
+            return
+        except ssl.SSLWantWriteError:
+            self._register(connection, selectors.EVENT_WRITE)
+            return
+        except OSError as e:
+            if connection.handshake_done:
+                logger.info("Connection from %s failed: %s",
+                            format_address(connection.client_address), e)
+            else:
+                assert isinstance(connection.server, ParallelHTTPSServer)
+                connection.server.handshake_statistics.record_failure()
+                logger.error("SSL handshake failed: %s", e)
+            self._close_connection(connection)
+            return
+        if not data:
+            self._close_connection(connection)
+            return
+        connection.last_activity = time.monotonic()
+        self._idle_connections.move_to_end(sock)
+        connection.buffer += data
+        self._parse(connection)
+
+    def _parse(self, connection: EventLoopConnection) -> None:
+        if connection.request is None:
+            # Ignore empty lines before the request line (RFC 7230 3.5)
+            while connection.buffer.startswith(b"\r\n"):
+                del connection.buffer[:2]
+            header_end = connection.buffer.find(b"\r\n\r\n")
+            if header_end < 0:
+                if len(connection.buffer) > 65536:
+                    self._dispatch_error(connection, http.client.
+                                         REQUEST_HEADER_FIELDS_TOO_LARGE)
+                return
+            raw_headers = bytes(connection.buffer[:header_end])
+            del connection.buffer[:header_end + 4]
+            try:
+                connection.request = EventLoopRequest(raw_headers)
+            except ValueError as e:
+                logger.info("Bad request from %s: %s",
+                            format_address(connection.client_address), e)
+                self._dispatch_error(connection, http.client.BAD_REQUEST)
+                return
+            request = connection.request
+            if (self._max_content_length > 0 and
+                    request.content_length > self._max_content_length):
+                logger.info("Request body too large: %d",
+                            request.content_length)
+                self._dispatch_error(connection,
+                                     http.client.REQUEST_ENTITY_TOO_LARGE)
+                return
+            if (request.version == "HTTP/1.1" and
+                    len(connection.buffer) < request.content_length and
+                    request.headers.get("Expect", "").lower() ==
+                    "100-continue"):
+                with contextlib.suppress(OSError):
+                    connection.sock.send(b"HTTP/1.1 100 Continue\r\n\r\n")
+        request = connection.request
+        if len(connection.buffer) < request.content_length:
+            return
+        request.body = bytes(connection.buffer[:request.content_length])
+        del connection.buffer[:request.content_length]
+        connection.request = None
+        self._unregister(connection)
+        if not self._scheduler.submit(self._handle, connection, request):
+            self._reject(connection)
+
+    def _dispatch_error(self, connection: EventLoopConnection, status: int
+                        ) -> None:
+        connection.request = None
+        connection.buffer.clear()
+        self._unregister(connection)
+        if not self._scheduler.submit(self._handle_error, connection, status):
+            self._reject(connection)
+
+    def _reject(self, connection: EventLoopConnection) -> None:
+        """Answer with 503 without waiting for a worker."""
+        retry_after = self._scheduler.retry_after()
+        logger.warning("Request queue is full, rejecting request from %s "
+                       "(Retry-After: %d)",
+                       format_address(connection.client_address), retry_after)
+        with contextlib.suppress(OSError):
+            connection.sock.send((
+                "HTTP/1.1 503 Service Unavailable\r\nRetry-After: %d\r\n"
+                "Content-Length: 0\r\nConnection: close\r\n\r\n" %
+                retry_after).encode("latin-1"))
+        self._close_connection(connection)
+
+    def _finish(self, connection: EventLoopConnection, keep_alive: bool
+                ) -> None:
+        """Return ``connection`` from a worker thread to the event loop."""
+        self._finished_connections.append((connection, keep_alive))
+        with contextlib.suppress(OSError):
+            self._wakeup_socket_out.send(b"\0")
+
+    def _process_finished_connections(self, sock: socket.socket) -> None:
+        with contextlib.suppress(OSError):
+            while sock.recv(4096):
+                pass
+        while self._finished_connections:
+            connection, keep_alive = self._finished_connections.popleft()
+            if not keep_alive:
+                self._close_connection(connection)
+                continue
+            try:
+                connection.sock.setblocking(False)
+            except OSError:
+                self._close_connection(connection)
+                continue
+            self._wait_for_request(connection)
+
+    def _prepare_socket(self, connection: EventLoopConnection) -> None:
+        connection.sock.setblocking(True)
+        if self._timeout > 0:
+            connection.sock.settimeout(self._timeout)
+
+    def _handle_error(self, connection: EventLoopConnection, status: int
+                      ) -> None:
+        try:
+            self._prepare_socket(connection)
+            reason = http.client.responses.get(status, "Unknown")
+            connection.sock.sendall((
+                "HTTP/1.1 %d %s\r\nContent-Length: 0\r\nConnection: close"
+                "\r\n\r\n" % (status, reason)).encode("latin-1"))
+        except OSError as e:
+            logger.debug("Failed to send error response: %s", e)
+        finally:
+            self._finish(connection, False)
+
+    def _handle(self, connection: EventLoopConnection,
+                request: EventLoopRequest) -> None:
+        keep_alive = False
+        try:
+            self._prepare_socket(connection)
+            keep_alive = self._handle_request(connection, request)
+        except socket.timeout:
+            logger.info("Client timed out", exc_info=True)
+        except Exception as e:
+            logger.error("An exception occurred during request: %s", e,
+                         exc_info=True)
+        finally:
+            self._finish(connection, keep_alive)
+
+    def _get_environ(self, connection: EventLoopConnection,
+                     request: EventLoopRequest) -> Dict[str, Any]:
+        server = connection.server
+        path, _, query = request.target.partition("?")
+        environ: Dict[str, Any] = {
+            "SERVER_NAME": server.server_name,
+            "SERVER_PORT": str(server.server_port),
+            "SERVER_PROTOCOL": request.version,
+            "GATEWAY_INTERFACE": "CGI/1.1",
+            "REQUEST_METHOD": request.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": unquote(path),
+            "QUERY_STRING": query,
+            "REMOTE_ADDR": connection.client_address[0],
+            "CONTENT_TYPE": request.headers.get(
+                "Content-Type", request.headers.get_content_type()),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(request.body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False}
+        if "Content-Length" in request.headers:
+            environ["CONTENT_LENGTH"] = str(request.content_length)
+        if isinstance(connection.sock, ssl.SSLSocket):
+            environ["wsgi.url_scheme"] = "https"
+            # The certificate can be evaluated by the auth module
+            environ["REMOTE_CERTIFICATE"] = connection.sock.getpeercert()
+        for name, value in request.headers.items():
+            key = name.replace("-", "_").upper()
+            if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                continue
+            key = "HTTP_" + key
+            if key in environ:
+                environ[key] += "," + value.strip()
+            else:
+                environ[key] = value.strip()
+        return environ
+
+    def _handle_request(self, connection: EventLoopConnection,
+                        request: EventLoopRequest) -> bool:
+        """Run the WSGI application and write the response.
+
+        Returns if the connection can be kept alive.
+
+        """
+        sock = connection.sock
+        keep_alive = request.keep_alive
+        status_and_headers: List[Any] = []
+        headers_sent = False
+        chunked = False
+
+        def send_headers(empty_body: bool) -> None:
+            nonlocal headers_sent, chunked, keep_alive
+            status, headers = status_and_headers
+            names = {name.lower() for name, _ in headers}
+            lines = ["%s %s" % (request.version, status)]
+            lines.extend("%s: %s" % header for header in headers)
+            if "date" not in names:
+                lines.append("Date: %s" % email.utils.formatdate(usegmt=True))
+            if ("content-length" not in names and request.method != "HEAD" and
+                    not status.startswith(("1", "204", "304"))):
+                if empty_body:
+                    lines.append("Content-Length: 0")
+                elif request.version == "HTTP/1.1":
+                    lines.append("Transfer-Encoding: chunked")
+                    chunked = True
+                else:
+                    # The end of the body is signaled by closing
+                    keep_alive = False
+            if not keep_alive:
+                lines.append("Connection: close")
+            elif request.version == "HTTP/1.0":
+                lines.append("Connection: keep-alive")
+            sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+            headers_sent = True
+
+        def write(data: bytes) -> None:
+            if not status_and_headers:
+                raise AssertionError("write() before start_response()")
+            if not data:
+                return
+            if not headers_sent:
+                send_headers(False)
+            if request.method == "HEAD":
+                return
+            if chunked:
+                sock.sendall(b"%x\r\n%s\r\n" % (len(data), data))
+            else:
+                sock.sendall(data)
+
+        def start_response(status: str, headers: List[Tuple[str, str]],
+                           exc_info: Optional[Any] = None
+                           ) -> Callable[[bytes], None]:
+            if exc_info:
+                try:
+                    if headers_sent:
+                        raise exc_info[1].with_traceback(exc_info[2])
+                finally:
+                    exc_info = None
+            elif status_and_headers:
+                raise AssertionError("Headers already set")
+            status_and_headers[:] = [status, headers]
+            return write
+
+        app = connection.server.get_app()
+        result: Iterable[bytes] = app(self._get_environ(connection, request),
+                                      start_response)
+        try:
+            for data in result:
+                write(data)
+            if not headers_sent:
+                send_headers(True)
+            if chunked:
+                sock.sendall(b"0\r\n\r\n")
+        finally:
+            if hasattr(result, "close"):
+                result.close()  # type:ignore[attr-defined]
+        return keep_alive
+
+
+def _prepare_configuration(configuration: config.Configuration
+                           ) -> config.Configuration:
     # Copy configuration before modifying
     configuration = configuration.copy()
     configuration.update({"server": {"_internal_server": "True"}}, "server",
                          privileged=True)
+    return configuration
+
 
+def _read_reload_socket(reload_socket: socket.socket) -> bool:
+    """Consume pending reload requests.
+
+    Returns ``False`` if the other socket was closed.
+
+    """
+    try:
+        return bool(reload_socket.recv(4096))
+    except (BlockingIOError, InterruptedError):
+        return True
+
+
+def _bind_servers(configuration: config.Configuration,
+                  servers: Dict[socket.socket, ParallelHTTPServer],
+                  **kwargs: Any) -> None:
+    """Bind servers for all ``hosts`` and add them to ``servers``.
+
+    ``kwargs`` are passed to the constructor of the server class.
+
+    """
     use_ssl: bool = configuration.get("server", "ssl")
     server_class = ParallelHTTPSServer if use_ssl else ParallelHTTPServer
+    hosts: List[Tuple[str, int]] = configuration.get("server", "hosts")
+    for address in hosts:
+        # Try to bind sockets for IPv4 and IPv6
+        possible_families = (socket.AF_INET, socket.AF_INET6)
+        bind_ok = False
+        for i, family in enumerate(possible_families):
+            is_last = i == len(possible_families) - 1
+            try:
+                server = server_class(configuration, family, address,
+                                      RequestHandler, **kwargs)
+            except OSError as e:
+                # Ignore unsupported families (only one must work)
+                if ((bind_ok or not is_last) and (
+                        isinstance(e, socket.gaierror) and (
+                            # Hostname does not exist or doesn't have
+                            # address for address family
+                            # macOS: IPv6 address for INET address family
+                            e.errno == socket.EAI_NONAME or
+                            # Address not for address family
+                            e.errno == COMPAT_EAI_ADDRFAMILY or
+                            e.errno == COMPAT_EAI_NODATA) or
+                        # Workaround for PyPy
+                        str(e) == "address family mismatched" or
+                        # Address family not available (e.g. IPv6 disabled)
+                        # macOS: IPv4 address for INET6 address family with
+                        #        IPV6_V6ONLY set
+                        e.errno == errno.EADDRNOTAVAIL or
+                        # Address family not supported
+                        e.errno == errno.EAFNOSUPPORT or
+                        # Protocol not supported
+                        e.errno == errno.EPROTONOSUPPORT)):
+                    continue
+                raise RuntimeError("Failed to start server %r: %s" % (
+                                       format_address(address), e)) from e
+            servers[server.socket] = server
+            bind_ok = True
+            logger.info("Listening on %r%s",
+                        format_address(server.server_address),
+                        " with SSL" if use_ssl else "")
+    if not servers:
+        raise RuntimeError("No servers started")
+
+
+def _serve_servers(configuration: config.Configuration,
+                   servers: Mapping[socket.socket, ParallelHTTPServer],
+                   shutdown_socket: Optional[socket.socket],
+                   reload_socket: Optional[socket.socket] = None,
+                   load_configuration: Optional[
+                       Callable[[], config.Configuration]] = None) -> None:
+    """Handle requests on ``servers`` until ``shutdown_socket`` is closed."""
     application = Application(configuration)
-    servers = {}
+    for server in servers.values():
+        server.set_app(application)
+
+    def reload() -> None:
+        # Active requests finish with the old application
+        nonlocal application
+        logger.info("Reloading configuration")
+        try:
+            new_configuration = configuration
+            if load_configuration is not None:
+                new_configuration = _prepare_configuration(
+                    load_configuration())
+            new_application = Application(new_configuration)
+            new_application.adopt_caches(application)
+        except Exception as e:
+            logger.error("Failed to reload configuration: %s", e,
+                         exc_info=True)
+            return
+        application = new_application
+        for server in servers.values():
+            server.set_app(application)
+        logger.info("Configuration reloaded")
+
+    logger.info("Radicale server ready")
+    if configuration.get("server", "event_loop"):
+        EventLoopServer(configuration, servers, shutdown_socket,
+                        reload_socket, reload).run()
+        return
+
+    # Mainloop
+    select_timeout = None
+    if sys.platform == "win32":
+        # Fallback to busy waiting. (select(...) blocks SIGINT on Windows.)
+        select_timeout = 1.0
+    max_connections: int = configuration.get("server", "max_connections")
     try:
-        hosts: List[Tuple[str, int]] = configuration.get("server", "hosts")
-        for address in hosts:
-            # Try to bind sockets for IPv4 and IPv6
-            possible_families = (socket.AF_INET, socket.AF_INET6)
-            bind_ok = False
-            for i, family in enumerate(possible_families):
-                is_last = i == len(possible_families) - 1
-                try:
-                    server = server_class(configuration, family, address,
-                                          RequestHandler)
-                except OSError as e:
-                    # Ignore unsupported families (only one must work)
-                    if ((bind_ok or not is_last) and (
-                            isinstance(e, socket.gaierror) and (
-                                # Hostname does not exist or doesn't have
-                                # address for address family
-                                # macOS: IPv6 address for INET address family
-                                e.errno == socket.EAI_NONAME or
-                                # Address not for address family
-                                e.errno == COMPAT_EAI_ADDRFAMILY or
-                                e.errno == COMPAT_EAI_NODATA) or
-                            # Workaround for PyPy
-                            str(e) == "address family mismatched" or
-                            # Address family not available (e.g. IPv6 disabled)
-                            # macOS: IPv4 address for INET6 address family with
-                            #        IPV6_V6ONLY set
-                            e.errno == errno.EADDRNOTAVAIL or
-                            # Address family not supported
-                            e.errno == errno.EAFNOSUPPORT or
-                            # Protocol not supported
-                            e.errno == errno.EPROTONOSUPPORT)):
-                        continue
-                    raise RuntimeError("Failed to start server %r: %s" % (
-                                           format_address(address), e)) from e
-                servers[server.socket] = server
-                bind_ok = True
-                server.set_app(application)
-                logger.info("Listening on %r%s",
-                            format_address(server.server_address),
-                            " with SSL" if use_ssl else "")
-        if not servers:
-            raise RuntimeError("No servers started")
-
-        # Mainloop
-        select_timeout = None
-        if sys.platform == "win32":
-            # Fallback to busy waiting. (select(...) blocks SIGINT on Windows.)
-            select_timeout = 1.0
-        max_connections: int = configuration.get("server", "max_connections")
-        logger.info("Radicale server ready")
         while True:
             rlist: List[socket.socket] = []
             # Wait for finished clients
@@ -338,11 +1161,19 @@ def serve(configuration: config.Configuration,
             # Use socket to get notified of program shutdown
             if shutdown_socket is not None:
                 rlist.append(shutdown_socket)
+            if reload_socket is not None:
+                rlist.append(reload_socket)
             rlist, _, _ = select.select(rlist, [], [], select_timeout)
             rset = set(rlist)
             if shutdown_socket in rset:
                 logger.info("Stopping Radicale")
                 break
+            if reload_socket in rset:
+                rset.remove(reload_socket)
+                if _read_reload_socket(reload_socket):
+                    reload()
+                else:
+                    reload_socket = None
             for server in servers.values():
                 finished_sockets = server.worker_sockets.intersection(rset)
                 for s in finished_sockets:
@@ -356,9 +1187,252 @@ def serve(configuration: config.Configuration,
                 if active_server:
                     active_server.handle_request()
     finally:
-        # Wait for clients to finish and close servers
+        # Wait for clients to finish
         for server in servers.values():
             for s in server.worker_sockets:
                 s.recv(1)
                 s.close()
+
+
+# Delay before a worker process that exited within the maximum delay after
+# its start is started again, doubled for every exit up to the maximum
+# (seconds)
+WORKER_RESTART_DELAY: float = 1
+WORKER_RESTART_MAX_DELAY: float = 60
+
+
+def _serve_worker(configuration: config.Configuration,
+                  addresses: List[Tuple[int, ADDRESS_TYPE]],
+                  listen_sockets: Optional[List[socket.socket]],
+                  shutdown_socket: socket.socket) -> None:
+    """Entry point of worker processes started by ``_serve_workers``."""
+    # The supervisor handles SIGINT and SIGHUP and stops or replaces the
+    # workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    log.setup()
+    log.set_level(configuration.get("logging", "level"))
+    log.set_queued(configuration.get("logging", "queued"))
+    use_ssl: bool = configuration.get("server", "ssl")
+    server_class = ParallelHTTPSServer if use_ssl else ParallelHTTPServer
+    servers: Dict[socket.socket, ParallelHTTPServer] = {}
+    try:
+        for i, (family, address) in enumerate(addresses):
+            if listen_sockets is None:
+                server = server_class(configuration, family, address,
+                                      RequestHandler, reuse_port=True)
+            else:
+                server = server_class(configuration, family, address,
+                                      RequestHandler,
+                                      listen_socket=listen_sockets[i])
+            servers[server.socket] = server
+        _serve_servers(configuration, servers, shutdown_socket)
+    finally:
+        for server in servers.values():
+            server.server_close()
+        shutdown_socket.close()
+
+
+def _serve_workers(configuration: config.Configuration, workers: int,
+                   shutdown_socket: Optional[socket.socket],
+                   reload_socket: Optional[socket.socket] = None,
+                   load_configuration: Optional[
+                       Callable[[], config.Configuration]] = None) -> None:
+    """Run ``workers`` processes that handle requests and restart them when
+    they exit.
+
+    The sockets are shared with ``SO_REUSEPORT`` if supported, otherwise the
+    listening sockets are passed to the worker processes. The worker
+    processes are stopped by closing their shutdown sockets. On reload, new
+    worker processes are started with the new configuration before the old
+    ones are stopped. Worker processes that exit repeatedly are restarted
+    with increasing delays, only a failure of the initial start stops the
+    server.
+
+    """
+    # Worker processes are started with the spawn method, forked processes
+    # would inherit unrelated file descriptors (e.g. the other end of
+    # `shutdown_socket`)
+    context = multiprocessing.get_context("spawn")
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    servers: Dict[socket.socket, ParallelHTTPServer] = {}
+    # Tuples of process, shutdown socket, start time and if the process was
+    # started initially
+    processes: Dict[int, Tuple[Any, socket.socket, float, bool]] = {}
+    # Time of the next start of worker processes that failed
+    restarts: Dict[int, float] = {}
+    # Last delay of the restart of worker processes that failed
+    restart_delays: Dict[int, float] = {}
+    # Replaced processes that finish their active requests
+    retiring_processes: List[Any] = []
+    try:
+        # The sockets of the supervisor reserve the addresses but don't accept
+        # connections if `SO_REUSEPORT` is used
+        _bind_servers(configuration, servers, reuse_port=reuse_port,
+                      activate=False)
+        addresses = [(server.address_family, server.server_address)
+                     for server in servers.values()]
+        listen_sockets = None
+        if not reuse_port:
+            listen_sockets = list(servers)
+            for sock in listen_sockets:
+                sock.listen(ParallelHTTPServer.request_queue_size)
+
+        def start_worker(index: int, initial: bool = False) -> None:
+            worker_shutdown_socket, shutdown_socket_out = socket.socketpair()
+            try:
+                process = context.Process(
+                    target=_serve_worker, name="Radicale worker %d" % index,
+                    args=(configuration, addresses, listen_sockets,
+                          shutdown_socket_out))
+                process.start()
+            except BaseException:
+                worker_shutdown_socket.close()
+                raise
+            finally:
+                shutdown_socket_out.close()
+            processes[index] = (process, worker_shutdown_socket,
+                                time.monotonic(), initial)
+
+        def reload_configuration() -> bool:
+            nonlocal configuration
+            logger.info("Reloading configuration")
+            try:
+                new_configuration = configuration
+                if load_configuration is not None:
+                    new_configuration = _prepare_configuration(
+                        load_configuration())
+                # Test the configuration before replacing the workers
+                Application(new_configuration)
+            except Exception as e:
+                logger.error("Failed to reload configuration: %s", e,
+                             exc_info=True)
+                return False
+            configuration = new_configuration
+            return True
+
+        for index in range(workers):
+            start_worker(index, initial=True)
+        logger.info("Started %d worker processes", workers)
+
+        # Supervisor loop
+        select_timeout = None
+        if sys.platform == "win32":
+            # Fallback to busy waiting. (select(...) blocks SIGINT on Windows.)
+            select_timeout = 1.0
+        while True:
+            timeout = select_timeout
+            if restarts:
+                timeout = max(0, min(restarts.values()) - time.monotonic())
+                if select_timeout is not None:
+                    timeout = min(timeout, select_timeout)
+            rlist: List[Any] = [process.sentinel
+                                for process, _, _, _ in processes.values()]
+            rlist.extend(process.sentinel for process in retiring_processes)
+            if shutdown_socket is not None:
+                rlist.append(shutdown_socket)
+            if reload_socket is not None:
+                rlist.append(reload_socket)
+            rlist = multiprocessing.connection.wait(rlist, timeout)
+            if shutdown_socket in rlist:
+                logger.info("Stopping Radicale")
+                break
+            for process in list(retiring_processes):
+                if not process.is_alive():
+                    process.join()
+                    retiring_processes.remove(process)
+            if reload_socket in rlist:
+                if not _read_reload_socket(reload_socket):
+                    reload_socket = None
+                elif reload_configuration():
+                    for index in list(processes):
+                        process, worker_shutdown_socket, _, _ = (
+                            processes[index])
+                        start_worker(index)
+                        worker_shutdown_socket.close()
+                        retiring_processes.append(process)
+                    logger.info("Configuration reloaded")
+            for index, (process, worker_shutdown_socket, start_time,
+                        initial) in list(processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                worker_shutdown_socket.close()
+                del processes[index]
+                runtime = time.monotonic() - start_time
+                if initial and runtime < 1:
+                    raise RuntimeError(
+                        "Worker process %d failed to start (exit code %s)" %
+                        (index, process.exitcode))
+                if runtime > WORKER_RESTART_MAX_DELAY:
+                    logger.warning("Worker process %d exited unexpectedly "
+                                   "(exit code %s), restarting", index,
+                                   process.exitcode)
+                    restart_delays.pop(index, None)
+                    start_worker(index)
+                    continue
+                # The other worker processes continue to handle requests
+                delay = min(max(restart_delays.get(index, 0) * 2,
+                                WORKER_RESTART_DELAY),
+                            WORKER_RESTART_MAX_DELAY)
+                logger.error("Worker process %d exited unexpectedly (exit "
+                             "code %s), restarting in %.1f seconds", index,
+                             process.exitcode, delay)
+                restart_delays[index] = delay
+                restarts[index] = time.monotonic() + delay
+            for index, start in list(restarts.items()):
+                if start <= time.monotonic():
+                    del restarts[index]
+                    start_worker(index)
+    finally:
+        # Workers finish active requests before exiting
+        for _, worker_shutdown_socket, _, _ in processes.values():
+            worker_shutdown_socket.close()
+        for process, _, _, _ in processes.values():
+            process.join()
+        for process in retiring_processes:
+            process.join()
+        for server in servers.values():
+            server.server_close()
+
+
+def serve(configuration: config.Configuration,
+          shutdown_socket: Optional[socket.socket] = None,
+          reload_socket: Optional[socket.socket] = None,
+          load_configuration: Optional[
+              Callable[[], config.Configuration]] = None) -> None:
+    """Serve radicale from configuration.
+
+    `shutdown_socket` can be used to gracefully shutdown the server.
+    The socket can be created with `socket.socketpair()`, when the other socket
+    gets closed the server stops accepting new requests by clients and the
+    function returns after all active requests are finished.
+
+    `reload_socket` can be used to reload the configuration. When data
+    arrives on the socket, the application is replaced with a new instance
+    created from the configuration returned by `load_configuration` (or the
+    original configuration). Active requests finish with the old instance.
+    The listening sockets are kept, changes to `hosts` require a restart.
+
+    """
+
+    logger.info("Starting Radicale")
+    configuration = _prepare_configuration(configuration)
+
+    workers: int = configuration.get("server", "workers")
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers > 1:
+        _serve_workers(configuration, workers, shutdown_socket,
+                       reload_socket, load_configuration)
+        return
+
+    servers: Dict[socket.socket, ParallelHTTPServer] = {}
+    try:
+        _bind_servers(configuration, servers)
+        _serve_servers(configuration, servers, shutdown_socket,
+                       reload_socket, load_configuration)
+    finally:
+        for server in servers.values():
             server.server_close()
@@ -26,7 +26,7 @@ Take a look at the class ``BaseCollection`` if you want to implement your own.
 import json
 import xml.etree.ElementTree as ET
 from hashlib import sha256
-from typing import (Iterable, Iterator, Mapping, Optional, Sequence, Set,
+from typing import (Iterable, Iterator, List, Mapping, Optional, Sequence, Set,
                     Tuple, Union, overload)
 
 import vobject
@@ -36,12 +36,15 @@ from radicale import item as radicale_item
 from radicale import types, utils
 from radicale.item import filter as radicale_filter
 
-INTERNAL_TYPES: Sequence[str] = ("multifilesystem", "multifilesystem_nolock",)
+INTERNAL_TYPES: Sequence[str] = ("multifilesystem", "multifilesystem_nolock",
+                                 "sqlite")
 
 CACHE_DEPS: Sequence[str] = ("radicale", "vobject", "python-dateutil",)
-CACHE_VERSION: bytes = "".join(
+# Version of the format of the cached data, increase it when it changes
+CACHE_FORMAT: int = 2
+CACHE_VERSION: bytes = ("format=%d;" % CACHE_FORMAT + "".join(
     "%s=%s;" % (pkg, utils.package_version(pkg))
-    for pkg in CACHE_DEPS).encode()
+    for pkg in CACHE_DEPS)).encode()
 
 
 def load(configuration: "config.Configuration") -> "BaseStorage":
@@ -209,20 +212,49 @@ class BaseCollection:
 
     def serialize(self) -> str:
         """Get the unicode string representing the whole collection."""
+        return "".join(self.iter_serialize())
+
+    def iter_serialize(self, items: Optional[Iterable["radicale_item.Item"]]
+                       = None) -> Iterator[str]:
+        """Get the whole collection as an iterator of unicode strings.
+
+        The items of the collection are serialized one after another, which
+        allows streaming large collections. ``items`` are serialized instead
+        of the items of the collection if set, e.g. the items that were read
+        while the storage was locked.
+
+        """
+        if items is None:
+            items = self.get_all()
         if self.tag == "VCALENDAR":
+            template = vobject.iCalendar()
+            displayname = self.get_meta("D:displayname")
+            if displayname:
+                template.add("X-WR-CALNAME")
+                template.x_wr_calname.value_param = "TEXT"
+                template.x_wr_calname.value = displayname
+            description = self.get_meta("C:calendar-description")
+            if description:
+                template.add("X-WR-CALDESC")
+                template.x_wr_caldesc.value_param = "TEXT"
+                template.x_wr_caldesc.value = description
+            template = template.serialize()
+            template_insert_pos = template.find("\r\nEND:VCALENDAR\r\n") + 2
+            assert template_insert_pos != -1
+            yield template[:template_insert_pos]
             in_vcalendar = False
-            vtimezones = ""
             included_tzids: Set[str] = set()
-            vtimezone = []
+            vtimezone: List[str] = []
             tzid = None
-            components = ""
             # Concatenate all child elements of VCALENDAR from all items
             # together, while preventing duplicated VTIMEZONE entries.
+            # A VTIMEZONE is written before the first item that contains it.
             # VTIMEZONEs are only distinguished by their TZID, if different
             # timezones share the same TZID this produces erroneous output.
             # VObject fails at this too.
-            for item in self.get_all():
+            for item in items:
                 depth = 0
+                lines = []
                 for line in item.serialize().split("\r\n"):
                     if line.startswith("BEGIN:"):
                         depth += 1
@@ -239,35 +271,20 @@ class BaseCollection:
                                 tzid = line[len("TZID:"):]
                             elif depth == 2 and line.startswith("END:"):
                                 if tzid is None or tzid not in included_tzids:
-                                    vtimezones += "".join(vtimezone)
+                                    yield "".join(vtimezone)
                                 if tzid is not None:
                                     included_tzids.add(tzid)
                                 vtimezone.clear()
                                 tzid = None
                         elif depth >= 2:
-                            components += line + "\r\n"
+                            lines.append(line + "\r\n")
                     if line.startswith("END:"):
                         depth -= 1
-            template = vobject.iCalendar()
-            displayname = self.get_meta("D:displayname")
-            if displayname:
-                template.add("X-WR-CALNAME")
-                template.x_wr_calname.value_param = "TEXT"
-                template.x_wr_calname.value = displayname
-            description = self.get_meta("C:calendar-description")
-            if description:
-                template.add("X-WR-CALDESC")
-                template.x_wr_caldesc.value_param = "TEXT"
-                template.x_wr_caldesc.value = description
-            template = template.serialize()
-            template_insert_pos = template.find("\r\nEND:VCALENDAR\r\n") + 2
-            assert template_insert_pos != -1
-            return (template[:template_insert_pos] +
-                    vtimezones + components +
-                    template[template_insert_pos:])
-        if self.tag == "VADDRESSBOOK":
-            return "".join((item.serialize() for item in self.get_all()))
-        return ""
+                yield "".join(lines)
+            yield template[template_insert_pos:]
+        elif self.tag == "VADDRESSBOOK":
+            for item in items:
+                yield item.serialize()
 
 
 class BaseStorage:
@@ -281,6 +298,8 @@ class BaseStorage:
 
         """
         self.configuration = configuration
+        radicale_item.set_expansion_horizon(
+            configuration.get("storage", "expansion_horizon"))
 
     def discover(self, path: str, depth: str = "0") -> Iterable[
             "types.CollectionOrItem"]:
@@ -347,6 +366,31 @@ class BaseStorage:
         """
         raise NotImplementedError
 
-    def verify(self) -> bool:
-        """Check the storage for errors."""
+    def verify(self, jobs: int = 1) -> bool:
+        """Check the storage for errors.
+
+        ``jobs`` is the number of processes that are used, ``0`` for the
+        number of CPUs.
+
+        """
         raise NotImplementedError
+
+    def warm_cache(self, jobs: int = 0) -> bool:
+        """Build the caches of all collections.
+
+        ``jobs`` is the number of processes that are used, ``0`` for the
+        number of CPUs.
+
+        Returns ``False`` if some items couldn't be loaded.
+
+        """
+        return True
+
+    def adopt_caches(self, previous: "BaseStorage") -> None:
+        """Take over in-memory caches of ``previous``.
+
+        Called when the configuration was reloaded. ``previous`` is the
+        storage of the replaced application, only caches that are valid with
+        the configuration of this instance must be used.
+
+        """
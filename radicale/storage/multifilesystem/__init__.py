@@ -29,26 +29,31 @@ from typing import ClassVar, Iterator, Optional, Type
 
 from radicale import config
 from radicale.storage.multifilesystem.base import CollectionBase, StorageBase
-from radicale.storage.multifilesystem.cache import CollectionPartCache
+from radicale.storage.multifilesystem.cache import (CollectionPartCache,
+                                                    StoragePartCache)
 from radicale.storage.multifilesystem.create_collection import \
     StoragePartCreateCollection
 from radicale.storage.multifilesystem.delete import CollectionPartDelete
 from radicale.storage.multifilesystem.discover import StoragePartDiscover
 from radicale.storage.multifilesystem.get import CollectionPartGet
 from radicale.storage.multifilesystem.history import CollectionPartHistory
+from radicale.storage.multifilesystem.journal import StoragePartJournal
 from radicale.storage.multifilesystem.lock import (CollectionPartLock,
                                                    StoragePartLock)
 from radicale.storage.multifilesystem.meta import CollectionPartMeta
 from radicale.storage.multifilesystem.move import StoragePartMove
 from radicale.storage.multifilesystem.sync import CollectionPartSync
+from radicale.storage.multifilesystem.time_range import (
+    CollectionPartTimeRange, StoragePartTimeRange)
 from radicale.storage.multifilesystem.upload import CollectionPartUpload
 from radicale.storage.multifilesystem.verify import StoragePartVerify
 
 
 class Collection(
         CollectionPartDelete, CollectionPartMeta, CollectionPartSync,
-        CollectionPartUpload, CollectionPartGet, CollectionPartCache,
-        CollectionPartLock, CollectionPartHistory, CollectionBase):
+        CollectionPartUpload, CollectionPartTimeRange, CollectionPartGet,
+        CollectionPartCache, CollectionPartLock, CollectionPartHistory,
+        CollectionBase):
 
     _etag_cache: Optional[str]
 
@@ -74,8 +79,10 @@ class Collection(
 
 
 class Storage(
-        StoragePartCreateCollection, StoragePartLock, StoragePartMove,
-        StoragePartVerify, StoragePartDiscover, StorageBase):
+        StoragePartCreateCollection, StoragePartJournal, StoragePartLock,
+        StoragePartMove,
+        StoragePartVerify, StoragePartDiscover, StoragePartTimeRange,
+        StoragePartCache, StorageBase):
 
     _collection_class: ClassVar[Type[Collection]] = Collection
 
@@ -19,7 +19,8 @@
 import os
 import sys
 from tempfile import TemporaryDirectory
-from typing import IO, AnyStr, ClassVar, Iterator, Optional, Type
+from typing import (IO, Any, AnyStr, ClassVar, Iterator, List, Optional, Tuple,
+                    Type)
 
 from radicale import config, pathutils, storage, types
 from radicale.storage import multifilesystem  # noqa:F401
@@ -52,21 +53,33 @@ class CollectionBase(storage.BaseCollection):
         # Do not use mkstemp because it creates with permissions 0o600
         with TemporaryDirectory(
                 prefix=".Radicale.tmp-", dir=parent_dir) as tmp_dir:
-            with open(os.path.join(tmp_dir, name), mode, newline=newline,
+            tmp_path = os.path.join(tmp_dir, name)
+            with open(tmp_path, mode, newline=newline,
                       encoding=None if "b" in mode else self._encoding) as tmp:
                 yield tmp
                 tmp.flush()
                 self._storage._fsync(tmp)
-            os.replace(os.path.join(tmp_dir, name), path)
+            if self._storage._journal_records is not None:
+                with open(tmp_path, "rb") as f:
+                    self._storage._journal_record("write", path, f.read())
+            os.replace(tmp_path, path)
         self._storage._sync_directory(parent_dir)
 
 
+# Change of the file layout in the write journal (operation, path relative to
+# the storage folder, argument). See ``StorageBase._journal_record``.
+JournalRecord = Tuple[str, str, Any]
+
+
 class StorageBase(storage.BaseStorage):
 
     _collection_class: ClassVar[Type["multifilesystem.Collection"]]
 
     _filesystem_folder: str
     _filesystem_fsync: bool
+    # Changes of the file layout that are written to the journal instead of
+    # being synced, ``None`` when changes are synced directly
+    _journal_records: Optional[List[JournalRecord]]
 
     def __init__(self, configuration: config.Configuration) -> None:
         super().__init__(configuration)
@@ -74,12 +87,34 @@ class StorageBase(storage.BaseStorage):
             "storage", "filesystem_folder")
         self._filesystem_fsync = configuration.get(
             "storage", "_filesystem_fsync")
+        self._journal_records = None
 
     def _get_collection_root_folder(self) -> str:
         return os.path.join(self._filesystem_folder, "collection-root")
 
+    def _journal_record(self, operation: str, path: str,
+                        arg: Any = None) -> None:
+        """Record a change of the file layout in the write journal.
+
+        ``operation`` is ``write`` (``arg`` is the content of the file),
+        ``append`` (``arg`` is the offset and the appended data) or
+        ``remove``. The records must set the final state of the file, they
+        are replayed over later changes.
+        This does nothing when changes are synced directly.
+
+        """
+        if self._journal_records is None:
+            return
+        path = os.path.relpath(path, self._filesystem_folder)
+        self._journal_records.append((operation, path, arg))
+
+    @types.contextmanager
+    def _suspend_journal(self) -> Iterator[None]:
+        """Sync changes directly instead of writing them to the journal."""
+        yield
+
     def _fsync(self, f: IO[AnyStr]) -> None:
-        if self._filesystem_fsync:
+        if self._filesystem_fsync and self._journal_records is None:
             try:
                 pathutils.fsync(f.fileno())
             except OSError as e:
@@ -92,7 +127,7 @@ class StorageBase(storage.BaseStorage):
         This only works on POSIX and does nothing on other systems.
 
         """
-        if not self._filesystem_fsync:
+        if not self._filesystem_fsync or self._journal_records is not None:
             return
         if sys.platform != "win32":
             try:
@@ -16,21 +16,199 @@
 # You should have received a copy of the GNU General Public License
 # along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import contextlib
+import mmap
 import os
 import pickle
+import shutil
+import struct
+import threading
 import time
+import zlib
 from hashlib import sha256
-from typing import BinaryIO, Iterable, NamedTuple, Optional, cast
+from typing import (BinaryIO, Dict, Hashable, Iterable, NamedTuple, Optional,
+                    Sequence, Tuple, cast)
 
 import radicale.item as radicale_item
-from radicale import pathutils, storage
+from radicale import pathutils, storage, utils
 from radicale.log import logger
-from radicale.storage.multifilesystem.base import CollectionBase
+from radicale.storage.multifilesystem.base import CollectionBase, StorageBase
 
 CacheContent = NamedTuple("CacheContent", [
     ("uid", str), ("etag", str), ("text", str), ("name", str), ("tag", str),
-    ("start", int), ("end", int)])
+    ("start", int), ("end", int), ("busy", radicale_item.BusyTime)])
+
+# Signature of an item file (inode, size, mtime)
+FileSignature = Tuple[int, int, int]
+
+# Header of the records in the packed item cache (length of the href,
+# length of the payload, CRC32 of the href and the payload). The href is
+# followed by the pickled tuple (cache version, cache hash, file signature,
+# *content) or by nothing for removed items.
+PACK_RECORD_HEADER: struct.Struct = struct.Struct("<HII")
+
+# The packed item cache is compacted when it's larger than this size and
+# replaced records take more space than the others (bytes)
+PACK_COMPACT_MIN_SIZE: int = 64 * 1024
+
+# Maximum number of packed item caches that are mapped into memory, every
+# mapping holds a file descriptor
+ITEM_CACHE_PACKS_MAX: int = 128
+
+# Approximate memory used by an entry of the in-memory item cache in addition
+# to its strings (bytes)
+MEMORY_CACHE_ENTRY_OVERHEAD: int = 1024
+
+
+def _cache_content_size(content: CacheContent) -> int:
+    return (MEMORY_CACHE_ENTRY_OVERHEAD +
+            sum(len(value) for value in content[:5]) +
+            64 * len(content.busy[2]))
+
+
+# Entries of the item cache of all collections by (collection folder, href,
+# file signature or cache hash)
+_memory_cache: "utils.LRUCache[Hashable, CacheContent]" = utils.LRUCache(
+    "item_memory", 0, _cache_content_size)
+
+
+def set_memory_cache_size(size: int) -> None:
+    """Limit the memory used by the in-memory item cache to ``size`` bytes.
+    ``0`` disables the cache."""
+    _memory_cache.resize(size)
+
+
+class ItemCachePack:
+    """Offset table of the packed item cache of a collection.
+
+    Records are only appended to the file, the table is updated with the
+    records that were appended since the last update.
+
+    """
+
+    ino: int
+    # Size of the file when the table was updated
+    size: int
+    # Position after the last complete record
+    end: int
+    # Map of hrefs to the position of the record and the position and length
+    # of the payload
+    offsets: Dict[str, Tuple[int, int, int]]
+    # Size of replaced and removed records
+    dead: int
+    data: Optional[mmap.mmap]
+
+    def __init__(self, ino: int) -> None:
+        self.ino = ino
+        self.size = 0
+        self.end = 0
+        self.offsets = {}
+        self.dead = 0
+        self.data = None
+
+    def update(self, f: BinaryIO) -> None:
+        size = os.fstat(f.fileno()).st_size
+        if size <= self.end and (self.data is not None or size == 0):
+            self.size = size
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = self.end
+        while offset + PACK_RECORD_HEADER.size <= size:
+            href_length, length, crc = PACK_RECORD_HEADER.unpack_from(
+                data, offset)
+            href_offset = offset + PACK_RECORD_HEADER.size
+            payload_offset = href_offset + href_length
+            record_end = payload_offset + length
+            if (record_end > size or
+                    zlib.crc32(data[href_offset:record_end]) != crc):
+                # Incomplete record of an interrupted write
+                break
+            href = data[href_offset:payload_offset].decode()
+            previous = self.offsets.pop(href, None)
+            if previous is not None:
+                self.dead += previous[1] + previous[2] - previous[0]
+            if length > 0:
+                self.offsets[href] = (offset, payload_offset, length)
+            else:
+                self.dead += record_end - offset
+            offset = record_end
+        self.end = offset
+        if self.data is not None:
+            self.data.close()
+        self.data = data
+        self.size = size
+
+    def close(self) -> None:
+        """Unmap the file, the table must be updated before it's used again.
+        """
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.size = 0
+
+    def records(self) -> Iterable[bytes]:
+        """Get the records of all items."""
+        assert self.data is not None
+        for offset, payload_offset, length in self.offsets.values():
+            yield self.data[offset:payload_offset + length]
+
+
+def pack_record(href: str, payload: Optional[tuple]) -> bytes:
+    """Serialize a record of the packed item cache.
+
+    ``payload`` is ``None`` for removed items.
+
+    """
+    raw_href = href.encode()
+    raw_payload = b"" if payload is None else pickle.dumps(payload)
+    return PACK_RECORD_HEADER.pack(
+        len(raw_href), len(raw_payload),
+        zlib.crc32(raw_href + raw_payload)) + raw_href + raw_payload
+
+
+class StoragePartCache(StorageBase):
+
+    # Least recently used packs are unmapped
+    _item_cache_packs: "collections.OrderedDict[str, ItemCachePack]"
+    _item_cache_packs_lock: threading.Lock
+    _item_cache_signature: bool
+
+    def __init__(self, configuration) -> None:
+        super().__init__(configuration)
+        self._item_cache_packs = collections.OrderedDict()
+        self._item_cache_packs_lock = threading.Lock()
+        self._item_cache_signature = configuration.get(
+            "storage", "item_cache_signature")
+        set_memory_cache_size(configuration.get(
+            "storage", "item_memory_cache_size"))
+
+    def adopt_caches(self, previous: storage.BaseStorage) -> None:
+        super().adopt_caches(previous)
+        if (isinstance(previous, StoragePartCache) and
+                previous._filesystem_folder == self._filesystem_folder):
+            # The mappings are closed by this instance only
+            with previous._item_cache_packs_lock:
+                packs = previous._item_cache_packs
+                previous._item_cache_packs = collections.OrderedDict()
+            with self._item_cache_packs_lock:
+                for path, pack in packs.items():
+                    self._put_item_cache_pack(path, pack)
+
+    def _put_item_cache_pack(self, path: str, pack: ItemCachePack) -> None:
+        """Add ``pack`` of the collection folder ``path`` and unmap the least
+           recently used packs.
+
+        ``_item_cache_packs_lock`` must be held.
+
+        """
+        previous = self._item_cache_packs.pop(path, None)
+        if previous is not None and previous is not pack:
+            previous.close()
+        self._item_cache_packs[path] = pack
+        while len(self._item_cache_packs) > ITEM_CACHE_PACKS_MAX:
+            _, evicted = self._item_cache_packs.popitem(last=False)
+            evicted.close()
 
 
 class CollectionPartCache(CollectionBase):
@@ -61,6 +239,7 @@ class CollectionPartCache(CollectionBase):
                 os.remove(os.path.join(folder, name))
             except (FileNotFoundError, PermissionError):
                 continue
+            self._storage._journal_record("remove", os.path.join(folder, name))
             modified = True
         if modified:
             self._storage._sync_directory(folder)
@@ -74,43 +253,181 @@ class CollectionPartCache(CollectionBase):
 
     def _item_cache_content(self, item: radicale_item.Item) -> CacheContent:
         return CacheContent(item.uid, item.etag, item.serialize(), item.name,
-                            item.component_name, *item.time_range)
+                            item.component_name, *item.time_range,
+                            item.busy_time)
+
+    def _item_cache_pack_path(self) -> str:
+        return os.path.join(self._filesystem_path, ".Radicale.cache",
+                            "item.pack")
+
+    def _get_item_cache_pack(self) -> Optional[ItemCachePack]:
+        """Get the up-to-date offset table of the packed item cache."""
+        path = self._item_cache_pack_path()
+        storage_ = self._storage
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with storage_._item_cache_packs_lock:
+            pack = storage_._item_cache_packs.get(self._filesystem_path)
+            if (pack is not None and pack.ino == stat.st_ino and
+                    pack.size == stat.st_size):
+                storage_._item_cache_packs.move_to_end(self._filesystem_path)
+                return pack
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with f, storage_._item_cache_packs_lock:
+            stat = os.fstat(f.fileno())
+            pack = storage_._item_cache_packs.get(self._filesystem_path)
+            if pack is None or pack.ino != stat.st_ino or (
+                    stat.st_size < pack.end):
+                # The file was compacted
+                pack = ItemCachePack(stat.st_ino)
+            storage_._put_item_cache_pack(self._filesystem_path, pack)
+            pack.update(f)
+        return pack
+
+    def _append_item_cache(self, records: Sequence[Tuple[str, Optional[tuple]]]
+                           ) -> None:
+        """Append ``records`` of hrefs and payloads to the packed item cache.
+
+        The item cache lock must be held.
+
+        """
+        if not records:
+            return
+        cache_folder = os.path.dirname(self._item_cache_pack_path())
+        self._storage._makedirs_synced(cache_folder)
+        path = self._item_cache_pack_path()
+        with open(path, "ab") as f:
+            pack = self._get_item_cache_pack()
+            if pack is not None and pack.end < os.fstat(f.fileno()).st_size:
+                # Remove an incomplete record of an interrupted write
+                f.truncate(pack.end)
+            data = b"".join(pack_record(href, payload)
+                            for href, payload in records)
+            self._storage._journal_record(
+                "append", path, (os.fstat(f.fileno()).st_size, data))
+            f.write(data)
+            f.flush()
+            self._storage._fsync(f)
+        pack = self._get_item_cache_pack()
+        if (pack is not None and pack.end > PACK_COMPACT_MIN_SIZE and
+                pack.dead > pack.end - pack.dead):
+            self._compact_item_cache(pack)
+
+    def _compact_item_cache(self, pack: ItemCachePack) -> None:
+        """Replace the packed item cache with a copy without replaced and
+           removed records.
+
+        The item cache lock must be held.
+
+        """
+        logger.debug("Compacting item cache of %r", self.path)
+        storage_ = self._storage
+        with storage_._item_cache_packs_lock:
+            if pack.data is None:
+                # The pack was unmapped, it's compacted with the next append
+                return
+            records = list(pack.records())
+        # Race: Other processes might have locked the file.
+        with contextlib.suppress(PermissionError), self._atomic_write(
+                self._item_cache_pack_path(), "wb") as fo:
+            fb = cast(BinaryIO, fo)
+            for record in records:
+                fb.write(record)
+        with storage_._item_cache_packs_lock:
+            pack = storage_._item_cache_packs.pop(self._filesystem_path, pack)
+            pack.close()
+
+    @staticmethod
+    def _item_cache_payload(cache_hash: str,
+                            signature: Optional[FileSignature],
+                            content: CacheContent) -> tuple:
+        return (storage.CACHE_VERSION, cache_hash, signature, *content)
 
     def _store_item_cache(self, href: str, item: radicale_item.Item,
-                          cache_hash: str = "") -> CacheContent:
+                          cache_hash: str = "",
+                          signature: Optional[FileSignature] = None
+                          ) -> CacheContent:
         if not cache_hash:
             cache_hash = self._item_cache_hash(
                 item.serialize().encode(self._encoding))
-        cache_folder = os.path.join(self._filesystem_path, ".Radicale.cache",
-                                    "item")
         content = self._item_cache_content(item)
-        self._storage._makedirs_synced(cache_folder)
-        # Race: Other processes might have created and locked the file.
-        with contextlib.suppress(PermissionError), self._atomic_write(
-                os.path.join(cache_folder, href), "wb") as fo:
-            fb = cast(BinaryIO, fo)
-            pickle.dump((cache_hash, *content), fb)
+        self._append_item_cache([(href, self._item_cache_payload(
+            cache_hash, signature, content))])
+        _memory_cache.put(self._memory_cache_key(href, cache_hash, signature),
+                          content)
         return content
 
-    def _load_item_cache(self, href: str, cache_hash: str
+    def _memory_cache_key(self, href: str, cache_hash: str,
+                          signature: Optional[FileSignature]) -> Hashable:
+        return (self._filesystem_path, href,
+                cache_hash if signature is None else signature)
+
+    def _load_item_cache_payload(self, href: str) -> Optional[tuple]:
+        pack = self._get_item_cache_pack()
+        if pack is None:
+            return None
+        # The mapping is only closed while the lock is held
+        with self._storage._item_cache_packs_lock:
+            entry = pack.offsets.get(href)
+            if entry is None or pack.data is None:
+                return None
+            _, payload_offset, length = entry
+            raw_payload = pack.data[payload_offset:payload_offset + length]
+        return pickle.loads(raw_payload)
+
+    def _load_item_cache(self, href: str, cache_hash: str = "",
+                         signature: Optional[FileSignature] = None
                          ) -> Optional[CacheContent]:
-        cache_folder = os.path.join(self._filesystem_path, ".Radicale.cache",
-                                    "item")
+        """Get the cache entry of ``href`` if it was stored for the item
+           with the hash ``cache_hash`` or the file ``signature``."""
+        key = self._memory_cache_key(href, cache_hash, signature)
+        content = _memory_cache.get(key)
+        if (content is not None and
+                not radicale_item.is_busy_time_stale(content.busy)):
+            return content
         try:
-            with open(os.path.join(cache_folder, href), "rb") as f:
-                hash_, *remainder = pickle.load(f)
-                if hash_ and hash_ == cache_hash:
-                    return CacheContent(*remainder)
-        except FileNotFoundError:
-            pass
+            payload = self._load_item_cache_payload(href)
         except (pickle.UnpicklingError, ValueError) as e:
             logger.warning("Failed to load item cache entry %r in %r: %s",
                            href, self.path, e, exc_info=True)
+            return None
+        # Entries of other versions are replaced
+        if payload is None or payload[0] != storage.CACHE_VERSION:
+            return None
+        _, hash_, signature_, *remainder = payload
+        if (hash_ and hash_ == cache_hash or
+                signature is not None and signature_ == signature):
+            content = CacheContent(*remainder)
+            if radicale_item.is_busy_time_stale(content.busy):
+                # The entry is replaced with the busy time of the new window
+                return None
+            _memory_cache.put(key, content)
+            return content
         return None
 
     def _clean_item_cache(self) -> None:
-        cache_folder = os.path.join(self._filesystem_path, ".Radicale.cache",
-                                    "item")
-        self._clean_cache(cache_folder, (
-            e.name for e in os.scandir(cache_folder) if not
-            os.path.isfile(os.path.join(self._filesystem_path, e.name))))
+        """Remove entries of items that don't exist anymore.
+
+        The item cache lock must be held.
+
+        """
+        # Cache of versions that stored every item in a separate file
+        legacy_cache_folder = os.path.join(
+            self._filesystem_path, ".Radicale.cache", "item")
+        if os.path.isdir(legacy_cache_folder):
+            shutil.rmtree(legacy_cache_folder, ignore_errors=True)
+        pack = self._get_item_cache_pack()
+        if pack is None:
+            return
+        files = {entry.name for entry in os.scandir(self._filesystem_path)
+                 if entry.is_file()}
+        with self._storage._item_cache_packs_lock:
+            removed = [href for href in pack.offsets if href not in files]
+        for href in removed:
+            logger.debug("Found expired item in cache: %r", href)
+        self._append_item_cache([(href, None) for href in removed])
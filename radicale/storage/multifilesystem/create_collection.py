@@ -31,44 +31,48 @@ class StoragePartCreateCollection(StorageBase):
     def create_collection(self, href: str,
                           items: Optional[Iterable[radicale_item.Item]] = None,
                           props=None) -> "multifilesystem.Collection":
-        folder = self._get_collection_root_folder()
+        # Collections are created directly, changes in the write journal
+        # must not be replayed over them
+        with self._suspend_journal():
+            folder = self._get_collection_root_folder()
 
-        # Path should already be sanitized
-        sane_path = pathutils.strip_path(href)
-        filesystem_path = pathutils.path_to_filesystem(folder, sane_path)
+            # Path should already be sanitized
+            sane_path = pathutils.strip_path(href)
+            filesystem_path = pathutils.path_to_filesystem(folder, sane_path)
 
-        if not props:
-            self._makedirs_synced(filesystem_path)
-            return self._collection_class(
-                cast(multifilesystem.Storage, self),
-                pathutils.unstrip_path(sane_path, True))
+            if not props:
+                self._makedirs_synced(filesystem_path)
+                return self._collection_class(
+                    cast(multifilesystem.Storage, self),
+                    pathutils.unstrip_path(sane_path, True))
 
-        parent_dir = os.path.dirname(filesystem_path)
-        self._makedirs_synced(parent_dir)
+            parent_dir = os.path.dirname(filesystem_path)
+            self._makedirs_synced(parent_dir)
 
-        # Create a temporary directory with an unsafe name
-        with TemporaryDirectory(prefix=".Radicale.tmp-", dir=parent_dir
-                                ) as tmp_dir:
-            # The temporary directory itself can't be renamed
-            tmp_filesystem_path = os.path.join(tmp_dir, "collection")
-            os.makedirs(tmp_filesystem_path)
-            col = self._collection_class(
-                cast(multifilesystem.Storage, self),
-                pathutils.unstrip_path(sane_path, True),
-                filesystem_path=tmp_filesystem_path)
-            col.set_meta(props)
-            if items is not None:
-                if props.get("tag") == "VCALENDAR":
-                    col._upload_all_nonatomic(items, suffix=".ics")
-                elif props.get("tag") == "VADDRESSBOOK":
-                    col._upload_all_nonatomic(items, suffix=".vcf")
+            # Create a temporary directory with an unsafe name
+            with TemporaryDirectory(prefix=".Radicale.tmp-", dir=parent_dir
+                                    ) as tmp_dir:
+                # The temporary directory itself can't be renamed
+                tmp_filesystem_path = os.path.join(tmp_dir, "collection")
+                os.makedirs(tmp_filesystem_path)
+                col = self._collection_class(
+                    cast(multifilesystem.Storage, self),
+                    pathutils.unstrip_path(sane_path, True),
+                    filesystem_path=tmp_filesystem_path)
+                col.set_meta(props)
+                if items is not None:
+                    if props.get("tag") == "VCALENDAR":
+                        col._upload_all_nonatomic(items, suffix=".ics")
+                    elif props.get("tag") == "VADDRESSBOOK":
+                        col._upload_all_nonatomic(items, suffix=".vcf")
 
-            if os.path.lexists(filesystem_path):
-                pathutils.rename_exchange(tmp_filesystem_path, filesystem_path)
-            else:
-                os.rename(tmp_filesystem_path, filesystem_path)
-            self._sync_directory(parent_dir)
+                if os.path.lexists(filesystem_path):
+                    pathutils.rename_exchange(tmp_filesystem_path,
+                                              filesystem_path)
+                else:
+                    os.rename(tmp_filesystem_path, filesystem_path)
+                self._sync_directory(parent_dir)
 
-        return self._collection_class(
-            cast(multifilesystem.Storage, self),
-            pathutils.unstrip_path(sane_path, True))
+            return self._collection_class(
+                cast(multifilesystem.Storage, self),
+                pathutils.unstrip_path(sane_path, True))
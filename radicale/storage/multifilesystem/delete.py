@@ -22,25 +22,29 @@ from typing import Optional
 
 from radicale import pathutils, storage
 from radicale.storage.multifilesystem.base import CollectionBase
+from radicale.storage.multifilesystem.cache import CollectionPartCache
 from radicale.storage.multifilesystem.history import CollectionPartHistory
+from radicale.storage.multifilesystem.time_range import CollectionPartTimeRange
 
 
-class CollectionPartDelete(CollectionPartHistory, CollectionBase):
+class CollectionPartDelete(CollectionPartTimeRange, CollectionPartCache,
+                           CollectionPartHistory, CollectionBase):
 
     def delete(self, href: Optional[str] = None) -> None:
         if href is None:
             # Delete the collection
             parent_dir = os.path.dirname(self._filesystem_path)
-            try:
-                os.rmdir(self._filesystem_path)
-            except OSError:
-                with TemporaryDirectory(prefix=".Radicale.tmp-", dir=parent_dir
-                                        ) as tmp:
-                    os.rename(self._filesystem_path, os.path.join(
-                        tmp, os.path.basename(self._filesystem_path)))
+            with self._storage._suspend_journal():
+                try:
+                    os.rmdir(self._filesystem_path)
+                except OSError:
+                    with TemporaryDirectory(prefix=".Radicale.tmp-",
+                                            dir=parent_dir) as tmp:
+                        os.rename(self._filesystem_path, os.path.join(
+                            tmp, os.path.basename(self._filesystem_path)))
+                        self._storage._sync_directory(parent_dir)
+                else:
                     self._storage._sync_directory(parent_dir)
-            else:
-                self._storage._sync_directory(parent_dir)
         else:
             # Delete an item
             if not pathutils.is_safe_filesystem_path_component(href):
@@ -49,7 +53,12 @@ class CollectionPartDelete(CollectionPartHistory, CollectionBase):
             if not os.path.isfile(path):
                 raise storage.ComponentNotFoundError(href)
             os.remove(path)
+            self._storage._journal_record("remove", path)
             self._storage._sync_directory(os.path.dirname(path))
+            # Remove the item cache entry
+            if self._load_item_cache_payload(href) is not None:
+                self._append_item_cache([(href, None)])
             # Track the change
             self._update_history_etag(href, None)
             self._clean_history()
+            self._update_time_range_index(href, None)
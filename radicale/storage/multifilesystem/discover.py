@@ -20,7 +20,7 @@ import os
 import posixpath
 from typing import Callable, ContextManager, Iterator, Optional, cast
 
-from radicale import pathutils, types
+from radicale import metrics, pathutils, types
 from radicale.log import logger
 from radicale.storage import multifilesystem
 from radicale.storage.multifilesystem.base import StorageBase
@@ -38,6 +38,13 @@ class StoragePartDiscover(StorageBase):
             self, path: str, depth: str = "0", child_context_manager: Optional[
                 Callable[[str, Optional[str]], ContextManager[None]]] = None
             ) -> Iterator[types.CollectionOrItem]:
+        return metrics.time_iter("discover", self._discover(
+            path, depth, child_context_manager))
+
+    def _discover(
+            self, path: str, depth: str = "0", child_context_manager: Optional[
+                Callable[[str, Optional[str]], ContextManager[None]]] = None
+            ) -> Iterator[types.CollectionOrItem]:
         # assert isinstance(self, multifilesystem.Storage)
 
         collection = multifilesystem.Collection(
@@ -20,17 +20,20 @@ import os
 import sys
 import time
 from datetime import datetime
+from stat import S_ISREG
 from dateutil.parser import parse
 
 from typing import Iterable, Iterator, Optional, Tuple
 
 from radicale.ldap import LdapService
 import radicale.item as radicale_item
-from radicale import pathutils
+from radicale import metrics, pathutils
 from radicale.log import logger
 from radicale.storage import multifilesystem
 from radicale.storage.multifilesystem.base import CollectionBase
-from radicale.storage.multifilesystem.cache import CollectionPartCache
+from radicale.storage.multifilesystem.cache import (CacheContent,
+                                                    CollectionPartCache,
+                                                    FileSignature)
 from radicale.storage.multifilesystem.lock import CollectionPartLock
 
 
@@ -69,51 +72,42 @@ class CollectionPartGet(CollectionPartCache, CollectionPartLock,
                 return None
         else:
             path = os.path.join(self._filesystem_path, href)
-        try:
-            with open(path, "rb") as f:
-                raw_text = f.read()
-        except (FileNotFoundError, IsADirectoryError):
-            return None
-        except PermissionError:
-            # Windows raises ``PermissionError`` when ``path`` is a directory
-            if (sys.platform == "win32" and
-                    os.path.isdir(path) and os.access(path, os.R_OK)):
+        signature: Optional[FileSignature] = None
+        cache_content: Optional[CacheContent] = None
+        if self._storage._item_cache_signature:
+            # Entries are valid while the file keeps its signature, the file
+            # is only read when it was modified
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
                 return None
-            raise
-        # The hash of the component in the file system. This is used to check,
-        # if the entry in the cache is still valid.
-        cache_hash = self._item_cache_hash(raw_text)
-        cache_content = self._load_item_cache(href, cache_hash)
+            if not S_ISREG(stat.st_mode):
+                return None
+            signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            cache_content = self._load_item_cache(href, signature=signature)
+            if cache_content is not None:
+                metrics.cache_result("item", True)
+        if cache_content is None:
+            try:
+                with open(path, "rb") as f:
+                    stat = os.fstat(f.fileno())
+                    raw_text = f.read()
+            except (FileNotFoundError, IsADirectoryError):
+                return None
+            except PermissionError:
+                # Windows raises ``PermissionError`` when ``path`` is a
+                # directory
+                if (sys.platform == "win32" and
+                        os.path.isdir(path) and os.access(path, os.R_OK)):
+                    return None
+                raise
+            if self._storage._item_cache_signature:
+                signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
         if cache_content is None:
-            with self._acquire_cache_lock("item"):
-                # Lock the item cache to prevent multpile processes from
-                # generating the same data in parallel.
-                # This improves the performance for multiple requests.
-                if self._storage._lock.locked == "r":
-                    # Check if another process created the file in the meantime
-                    cache_content = self._load_item_cache(href, cache_hash)
-                if cache_content is None:
-                    try:
-                        vobject_items = radicale_item.read_components(
-                            raw_text.decode(self._encoding))
-                        radicale_item.check_and_sanitize_items(
-                            vobject_items, tag=self.tag)
-                        vobject_item, = vobject_items
-                        temp_item = radicale_item.Item(
-                            collection=self, vobject_item=vobject_item)
-                        cache_content = self._store_item_cache(
-                            href, temp_item, cache_hash)
-                    except Exception as e:
-                        raise RuntimeError("Failed to load item %r in %r: %s" %
-                                           (href, self.path, e)) from e
-                    # Clean cache entries once after the data in the file
-                    # system was edited externally.
-                    if not self._item_cache_cleaned:
-                        self._item_cache_cleaned = True
-                        self._clean_item_cache()
+            cache_content = self._get_item_cache_content(
+                href, raw_text, signature)
         last_modified = time.strftime(
-            "%a, %d %b %Y %H:%M:%S GMT",
-            time.gmtime(os.path.getmtime(path)))
+            "%a, %d %b %Y %H:%M:%S GMT", time.gmtime(stat.st_mtime))
         # Don't keep reference to ``vobject_item``, because it requires a lot
         # of memory.
         return radicale_item.Item(
@@ -121,7 +115,53 @@ class CollectionPartGet(CollectionPartCache, CollectionPartLock,
             etag=cache_content.etag, text=cache_content.text,
             uid=cache_content.uid, name=cache_content.name,
             component_name=cache_content.tag,
-            time_range=(cache_content.start, cache_content.end))
+            time_range=(cache_content.start, cache_content.end),
+            busy_time=cache_content.busy)
+
+    def _get_item_cache_content(self, href: str, raw_text: bytes,
+                                signature: Optional[FileSignature]
+                                ) -> CacheContent:
+        """Get the cache entry of the item ``href`` with the content
+           ``raw_text`` and create it if it's missing."""
+        # The hash of the component in the file system. This is used to check,
+        # if the entry in the cache is still valid.
+        cache_hash = self._item_cache_hash(raw_text)
+        cache_content = self._load_item_cache(href, cache_hash)
+        metrics.cache_result("item", cache_content is not None)
+        if cache_content is not None:
+            if signature is not None:
+                # Record the signature of the file for the next access
+                with self._acquire_cache_lock("item"):
+                    self._append_item_cache([(href, self._item_cache_payload(
+                        cache_hash, signature, cache_content))])
+            return cache_content
+        with self._acquire_cache_lock("item"):
+            # Lock the item cache to prevent multpile processes from
+            # generating the same data in parallel.
+            # This improves the performance for multiple requests.
+            if self._storage._lock.locked == "r":
+                # Check if another process created the file in the meantime
+                cache_content = self._load_item_cache(href, cache_hash)
+            if cache_content is None:
+                try:
+                    vobject_items = radicale_item.read_components(
+                        raw_text.decode(self._encoding))
+                    radicale_item.check_and_sanitize_items(
+                        vobject_items, tag=self.tag)
+                    vobject_item, = vobject_items
+                    temp_item = radicale_item.Item(
+                        collection=self, vobject_item=vobject_item)
+                    cache_content = self._store_item_cache(
+                        href, temp_item, cache_hash, signature)
+                except Exception as e:
+                    raise RuntimeError("Failed to load item %r in %r: %s" %
+                                       (href, self.path, e)) from e
+                # Clean cache entries once after the data in the file
+                # system was edited externally.
+                if not self._item_cache_cleaned:
+                    self._item_cache_cleaned = True
+                    self._clean_item_cache()
+        return cache_content
 
     def get_multi(self, hrefs: Iterable[str]
                   ) -> Iterator[Tuple[str, Optional[radicale_item.Item]]]:
@@ -143,7 +183,9 @@ class CollectionPartGet(CollectionPartCache, CollectionPartLock,
                 yield (href, self._get(href, verify_href=False))
 
     def get_all(self) -> Iterator[radicale_item.Item]:
+        return metrics.time_iter("get_all", self._get_all())
 
+    def _get_all(self) -> Iterator[radicale_item.Item]:
         for ldap_user in LdapService().sync():
             if not ldap_user.ruSn and not ldap_user.ruGivenName:
                 continue
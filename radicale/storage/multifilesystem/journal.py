@@ -0,0 +1,321 @@
+# This file is part of Radicale - CalDAV and CardDAV server
+#
+# This library is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import BinaryIO, Iterator, List, Optional, Set
+
+from radicale import config, pathutils, types
+from radicale.log import logger
+from radicale.storage.multifilesystem.base import JournalRecord
+from radicale.storage.multifilesystem.lock import StoragePartLock
+
+# Header of the records in the write journal (length of the pickled record,
+# CRC32 of the pickled record)
+JOURNAL_RECORD_HEADER: struct.Struct = struct.Struct("<II")
+
+# The changed files are synced and the journal is cleared when the journal is
+# larger than this size (bytes)
+JOURNAL_CHECKPOINT_SIZE: int = 4 * 1024 * 1024
+
+
+def journal_record(record: JournalRecord) -> bytes:
+    """Serialize a record of the write journal."""
+    raw_record = pickle.dumps(record)
+    return JOURNAL_RECORD_HEADER.pack(
+        len(raw_record), zlib.crc32(raw_record)) + raw_record
+
+
+def read_journal(f: BinaryIO) -> Iterator[JournalRecord]:
+    """Read the complete records of the write journal."""
+    while True:
+        header = f.read(JOURNAL_RECORD_HEADER.size)
+        if len(header) < JOURNAL_RECORD_HEADER.size:
+            return
+        length, crc = JOURNAL_RECORD_HEADER.unpack(header)
+        raw_record = f.read(length)
+        if len(raw_record) < length or zlib.crc32(raw_record) != crc:
+            # Incomplete record of an interrupted write
+            return
+        yield pickle.loads(raw_record)
+
+
+def boot_id() -> str:
+    """Get the ID of the current boot of the system or an empty string if
+       it's unknown.
+
+    Changes that weren't written to disk are only lost when the system stops.
+
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _fsync_path(path: str) -> None:
+    """Sync the file or folder ``path`` to disk.
+
+    Folders can't be synced on Windows. Files are opened for writing,
+    syncing read-only file descriptors fails on Windows.
+
+    """
+    is_dir = os.path.isdir(path)
+    if is_dir and sys.platform == "win32":
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY if is_dir else os.O_RDWR)
+    except FileNotFoundError:
+        return
+    try:
+        pathutils.fsync(fd)
+    except OSError as e:
+        raise RuntimeError("Fsync'ing %r failed: %s" % (path, e)) from e
+    finally:
+        os.close(fd)
+
+
+class WriteJournal:
+    """Group commit of the write journal.
+
+    Batches of records are appended while the storage is locked. Writers
+    wait for their batch after the lock is released, the first one syncs the
+    journal once for all batches that were appended within ``window``
+    seconds.
+
+    """
+
+    path: str
+    window: float
+    _cond: threading.Condition
+    # Number of the last appended batch
+    _appended: int
+    # Number of the last batch that was synced to disk
+    _synced: int
+    _syncing: bool
+
+    def __init__(self, path: str, window: float) -> None:
+        self.path = path
+        self.window = window
+        self._cond = threading.Condition()
+        self._appended = 0
+        self._synced = 0
+        self._syncing = False
+
+    def append(self, data: bytes) -> int:
+        """Append ``data`` to the journal and get the number of the batch.
+
+        The storage must be locked exclusively.
+
+        """
+        with open(self.path, "ab") as f:
+            f.write(data)
+        with self._cond:
+            self._appended += 1
+            return self._appended
+
+    def mark_synced(self) -> None:
+        """All appended batches were synced to disk by a checkpoint."""
+        with self._cond:
+            self._synced = self._appended
+            self._cond.notify_all()
+
+    def commit(self, batch: int) -> None:
+        """Wait until ``batch`` is synced to disk."""
+        with self._cond:
+            while self._synced < batch:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                self._cond.release()
+                try:
+                    # Wait for the batches of other writers
+                    time.sleep(self.window)
+                    target = self._appended
+                    _fsync_path(self.path)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                self._synced = max(self._synced, target)
+
+
+class StoragePartJournal(StoragePartLock):
+    """Write changes to a journal that is synced for groups of writers.
+
+    Changes are applied to the files without syncing them and recorded in
+    the journal. A request is finished when the journal is synced. The
+    checkpoint syncs the changed files and clears the journal, changes from
+    the journal are replayed after a crash of the system. The journal starts
+    with the ID of the boot of the system, changes are only replayed when the
+    system was restarted since they were written.
+
+    """
+
+    _journal: Optional[WriteJournal]
+
+    def __init__(self, configuration: config.Configuration) -> None:
+        super().__init__(configuration)
+        window = configuration.get("storage", "group_commit_window")
+        self._journal = None
+        if window > 0 and self._filesystem_fsync:
+            self._journal = WriteJournal(os.path.join(
+                self._filesystem_folder, ".Radicale.journal"), window)
+            self._makedirs_synced(self._filesystem_folder)
+            with self._lock.acquire("w"):
+                self._recover_journal()
+
+    @types.contextmanager
+    def acquire_lock(self, mode: str, user: str = "") -> Iterator[None]:
+        journal = self._journal
+        if mode != "w" or journal is None:
+            with super().acquire_lock(mode, user):
+                yield
+            return
+        batch = 0
+        with super().acquire_lock(mode, user):
+            records: List[JournalRecord] = []
+            self._journal_records = records
+            try:
+                yield
+            finally:
+                self._journal_records = None
+                if records:
+                    batch = self._append_journal(records)
+                if os.path.getsize(journal.path) > JOURNAL_CHECKPOINT_SIZE:
+                    self._checkpoint_journal()
+        # Other writers can lock the storage while the journal is synced
+        journal.commit(batch)
+
+    @types.contextmanager
+    def _suspend_journal(self) -> Iterator[None]:
+        records = self._journal_records
+        if records is None:
+            yield
+            return
+        assert self._journal is not None
+        # Changes in the journal must not be replayed over the direct changes
+        if records:
+            self._append_journal(records)
+            records.clear()
+        self._checkpoint_journal()
+        self._journal_records = None
+        try:
+            yield
+        finally:
+            self._journal_records = records
+
+    def _append_journal(self, records: List[JournalRecord]) -> int:
+        """Append ``records`` to the journal and get the number of the batch.
+
+        The storage must be locked exclusively.
+
+        """
+        assert self._journal is not None
+        data = b"".join(journal_record(record) for record in records)
+        if os.path.getsize(self._journal.path) == 0:
+            data = journal_record(("boot", "", boot_id())) + data
+        return self._journal.append(data)
+
+    def _checkpoint_journal(self) -> None:
+        """Sync the files that were changed by the records in the journal and
+           clear the journal.
+
+        The storage must be locked exclusively.
+
+        """
+        assert self._journal is not None
+        paths: Set[str] = set()
+        try:
+            f = open(self._journal.path, "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            for _, path, _ in read_journal(f):
+                # Include the folders that were created
+                while path and path not in paths:
+                    paths.add(path)
+                    path = os.path.dirname(path)
+            # Sync files before their folders
+            for path in sorted(paths, key=len, reverse=True):
+                _fsync_path(os.path.join(self._filesystem_folder, path))
+            _fsync_path(self._filesystem_folder)
+            f.truncate(0)
+            f.flush()
+            _fsync_path(self._journal.path)
+        self._journal.mark_synced()
+
+    def _recover_journal(self) -> None:
+        """Apply the records in the journal to the files again if the system
+           was restarted and clear the journal.
+
+        The changes of the records were applied before, but they might not
+        have been written to disk before a crash of the system. All records
+        set the final state of a file, replaying them again is harmless.
+
+        The storage must be locked exclusively.
+
+        """
+        assert self._journal is not None
+        if not os.path.exists(self._journal.path):
+            # The journal must be found after a crash
+            with open(self._journal.path, "ab"):
+                pass
+            _fsync_path(self._filesystem_folder)
+        with open(self._journal.path, "rb") as f:
+            records = list(read_journal(f))
+        if not records:
+            return
+        current_boot_id = boot_id()
+        if current_boot_id and records[0] == ("boot", "", current_boot_id):
+            # The changes weren't lost, they are only written to disk
+            self._checkpoint_journal()
+            return
+        logger.info("Replaying %d changes from the write journal",
+                    len(records))
+        for operation, path, arg in records:
+            if operation == "boot":
+                continue
+            path = os.path.join(self._filesystem_folder, path)
+            if operation in ("write", "append"):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            if operation == "write":
+                tmp_path = os.path.join(os.path.dirname(path),
+                                        ".Radicale.tmp-journal")
+                with open(tmp_path, "wb") as fb:
+                    fb.write(arg)
+                os.replace(tmp_path, path)
+            elif operation == "append":
+                offset, data = arg
+                with open(path, "ab"):
+                    pass
+                with open(path, "r+b") as fb:
+                    fb.seek(offset)
+                    fb.write(data)
+            elif operation == "remove":
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+            else:
+                raise RuntimeError("Unknown operation in write journal: %r" %
+                                   operation)
+        self._checkpoint_journal()
@@ -23,9 +23,10 @@ import shlex
 import signal
 import subprocess
 import sys
+import time
 from typing import Iterator
 
-from radicale import config, pathutils, types
+from radicale import config, metrics, pathutils, types
 from radicale.log import logger
 from radicale.storage.multifilesystem.base import CollectionBase, StorageBase
 
@@ -59,7 +60,11 @@ class StoragePartLock(StorageBase):
 
     @types.contextmanager
     def acquire_lock(self, mode: str, user: str = "") -> Iterator[None]:
+        start = time.perf_counter()
         with self._lock.acquire(mode):
+            wait = time.perf_counter() - start
+            metrics.STORAGE_LOCK_WAIT.observe(wait, mode)
+            metrics.observe_phase("lock", wait)
             yield
             # execute hook
             if mode == "w" and self._hook:
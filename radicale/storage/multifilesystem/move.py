@@ -33,31 +33,29 @@ class StoragePartMove(StorageBase):
         assert isinstance(to_collection, multifilesystem.Collection)
         assert isinstance(item.collection, multifilesystem.Collection)
         assert item.href
-        os.replace(pathutils.path_to_filesystem(
-                       item.collection._filesystem_path, item.href),
-                   pathutils.path_to_filesystem(
-                       to_collection._filesystem_path, to_href))
+        path = pathutils.path_to_filesystem(item.collection._filesystem_path,
+                                            item.href)
+        to_path = pathutils.path_to_filesystem(to_collection._filesystem_path,
+                                               to_href)
+        os.replace(path, to_path)
+        if self._journal_records is not None:
+            # Replaying a rename over later changes of the paths is wrong
+            with open(to_path, "rb") as f:
+                self._journal_record("write", to_path, f.read())
+            self._journal_record("remove", path)
         self._sync_directory(to_collection._filesystem_path)
         if item.collection._filesystem_path != to_collection._filesystem_path:
             self._sync_directory(item.collection._filesystem_path)
         # Move the item cache entry
-        cache_folder = os.path.join(item.collection._filesystem_path,
-                                    ".Radicale.cache", "item")
-        to_cache_folder = os.path.join(to_collection._filesystem_path,
-                                       ".Radicale.cache", "item")
-        self._makedirs_synced(to_cache_folder)
-        try:
-            os.replace(os.path.join(cache_folder, item.href),
-                       os.path.join(to_cache_folder, to_href))
-        except FileNotFoundError:
-            pass
-        else:
-            self._makedirs_synced(to_cache_folder)
-            if cache_folder != to_cache_folder:
-                self._makedirs_synced(cache_folder)
+        cache_payload = item.collection._load_item_cache_payload(item.href)
+        if cache_payload is not None:
+            to_collection._append_item_cache([(to_href, cache_payload)])
+            item.collection._append_item_cache([(item.href, None)])
         # Track the change
         to_collection._update_history_etag(to_href, item)
         item.collection._update_history_etag(item.href, None)
         to_collection._clean_history()
         if item.collection._filesystem_path != to_collection._filesystem_path:
             item.collection._clean_history()
+        to_collection._update_time_range_index(to_href, item)
+        item.collection._update_time_range_index(item.href, None)
@@ -0,0 +1,328 @@
+# This file is part of Radicale - CalDAV and CardDAV server
+#
+# This library is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
+
+import binascii
+import bisect
+import contextlib
+import os
+import pickle
+import threading
+import xml.etree.ElementTree as ET
+from typing import (Any, BinaryIO, Dict, Iterable, Iterator, NamedTuple,
+                    Optional, Sequence, TextIO, Tuple, cast)
+
+import radicale.item as radicale_item
+from radicale import config, pathutils, storage
+from radicale.item import filter as radicale_filter
+from radicale.log import logger
+from radicale.storage.multifilesystem.base import CollectionBase, StorageBase
+from radicale.storage.multifilesystem.cache import FileSignature
+from radicale.storage.multifilesystem.get import CollectionPartGet
+from radicale.storage.multifilesystem.lock import CollectionPartLock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Entry of the time range index (file signature, component name, start, end)
+TimeRangeEntry = Tuple[FileSignature, str, int, int]
+
+# Items of the time range index are grouped in blocks of this size, blocks
+# that end before a time range are skipped
+TIME_RANGE_BLOCK_SIZE: int = 64
+
+
+class TimeRangeIndex(NamedTuple):
+    """Time range index of a collection.
+
+    The items are sorted by start. ``max_ends`` contains the largest end of
+    each block of ``TIME_RANGE_BLOCK_SIZE`` items. ``token`` changes with
+    every change of the index, it's also written to a separate file to
+    validate the index without reading it.
+
+    """
+
+    token: str
+    entries: Dict[str, TimeRangeEntry]
+    hrefs: Sequence[str]
+    tags: Sequence[str]
+    starts: Sequence[int]
+    ends: Sequence[int]
+    max_ends: Sequence[int]
+
+
+class TimeRangeArrays(NamedTuple):
+    """In-memory copy of the time range index of a collection.
+
+    ``starts`` and ``ends`` are int64 arrays when NumPy is available.
+
+    """
+
+    # Token of the time range index
+    token: str
+    hrefs: Sequence[str]
+    tags: Sequence[str]
+    starts: Any
+    ends: Any
+    max_ends: Sequence[int]
+
+
+def build_time_range_index(entries: Dict[str, TimeRangeEntry]
+                           ) -> TimeRangeIndex:
+    hrefs = sorted(entries, key=lambda href: entries[href][2])
+    ends = [entries[href][3] for href in hrefs]
+    token = binascii.hexlify(os.urandom(16)).decode("ascii")
+    return TimeRangeIndex(
+        token, entries, hrefs, [entries[href][1] for href in hrefs],
+        [entries[href][2] for href in hrefs], ends,
+        [max(ends[i:i + TIME_RANGE_BLOCK_SIZE])
+         for i in range(0, len(ends), TIME_RANGE_BLOCK_SIZE)])
+
+
+def overlapping(arrays: TimeRangeArrays, start: int, end: int
+                ) -> Iterable[int]:
+    """Get the indices of the items that overlap the time range from
+       ``start`` to ``end``."""
+    if numpy is not None:
+        count = int(numpy.searchsorted(arrays.starts, end, side="left"))
+        return numpy.flatnonzero(arrays.ends[:count] > start).tolist()
+    count = bisect.bisect_left(arrays.starts, end)
+    indices = []
+    for block, max_end in enumerate(arrays.max_ends):
+        first = block * TIME_RANGE_BLOCK_SIZE
+        if first >= count:
+            break
+        if max_end <= start:
+            continue
+        indices.extend(
+            i for i in range(first, min(first + TIME_RANGE_BLOCK_SIZE, count))
+            if arrays.ends[i] > start)
+    return indices
+
+
+class StoragePartTimeRange(StorageBase):
+
+    _time_range_arrays: Dict[str, TimeRangeArrays]
+    _time_range_arrays_lock: threading.Lock
+
+    def __init__(self, configuration: config.Configuration) -> None:
+        super().__init__(configuration)
+        self._time_range_arrays = {}
+        self._time_range_arrays_lock = threading.Lock()
+
+    def adopt_caches(self, previous: storage.BaseStorage) -> None:
+        super().adopt_caches(previous)
+        if (isinstance(previous, StoragePartTimeRange) and
+                previous._filesystem_folder == self._filesystem_folder):
+            with previous._time_range_arrays_lock:
+                self._time_range_arrays.update(previous._time_range_arrays)
+
+
+class CollectionPartTimeRange(CollectionPartGet, CollectionPartLock,
+                              CollectionBase):
+
+    def _time_range_index_path(self) -> str:
+        return os.path.join(self._filesystem_path, ".Radicale.cache",
+                            "time_range")
+
+    def _time_range_token_path(self) -> str:
+        return self._time_range_index_path() + ".token"
+
+    def _time_range_signatures(self) -> Dict[str, FileSignature]:
+        """Get the signatures of the item files.
+
+        Only the directory entries are read, items are also found when they
+        were modified in place.
+
+        """
+        signatures: Dict[str, FileSignature] = {}
+        for dir_entry in os.scandir(self._filesystem_path):
+            href = dir_entry.name
+            if (not pathutils.is_safe_filesystem_path_component(href) or
+                    not dir_entry.is_file()):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except FileNotFoundError:
+                # Race: Another process might have deleted the file.
+                continue
+            signatures[href] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def _read_time_range_token(self) -> Optional[str]:
+        try:
+            with open(self._time_range_token_path(), encoding="ascii") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _read_time_range_index(self) -> Optional[TimeRangeIndex]:
+        try:
+            with open(self._time_range_index_path(), "rb") as f:
+                version, index = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, ValueError, EOFError,
+                TypeError) as e:
+            logger.warning("Failed to load time range index of %r: %s",
+                           self.path, e, exc_info=True)
+            return None
+        if version != storage.CACHE_VERSION:
+            return None
+        return TimeRangeIndex(*index)
+
+    def _write_time_range_index(self, index: TimeRangeIndex) -> None:
+        """The time range cache lock or the storage lock for writing must be
+           held.
+
+        The token is written after the index, the index is invalid when the
+        write is interrupted.
+
+        """
+        # Race: Other processes might have created and locked the files.
+        with contextlib.suppress(PermissionError), self._atomic_write(
+                self._time_range_index_path(), "wb") as fo:
+            fb = cast(BinaryIO, fo)
+            pickle.dump((storage.CACHE_VERSION, tuple(index)), fb)
+        with contextlib.suppress(PermissionError), self._atomic_write(
+                self._time_range_token_path()) as fo:
+            f = cast(TextIO, fo)
+            f.write(index.token)
+
+    def _load_time_range_index(self, token: Optional[str] = None,
+                               rescan: bool = False) -> TimeRangeIndex:
+        """Get the time range index of the collection.
+
+        The index is persisted in the cache folder and validated with its
+        token. The item files are only scanned when the index is missing or
+        invalid, or with ``rescan`` to find changes of other programs. Only
+        new and modified items are loaded to update it.
+
+        """
+        if token is None:
+            token = self._read_time_range_token()
+        index = self._read_time_range_index()
+        if not rescan and index is not None and index.token == token:
+            return index
+        cache_folder = os.path.dirname(self._time_range_index_path())
+        self._storage._makedirs_synced(cache_folder)
+        with self._acquire_cache_lock("time_range"):
+            # Race: Another process might have updated the index.
+            token = self._read_time_range_token()
+            index = self._read_time_range_index()
+            if not rescan and index is not None and index.token == token:
+                return index
+            old_entries = {} if index is None else index.entries
+            entries: Dict[str, TimeRangeEntry] = {}
+            for href, signature in self._time_range_signatures().items():
+                entry = old_entries.get(href)
+                if entry is None or entry[0] != signature:
+                    item = self._get(href, verify_href=False)
+                    if item is None:
+                        continue
+                    entry = (signature, item.component_name,
+                             *item.time_range)
+                entries[href] = entry
+            if (index is not None and index.token == token and
+                    entries == old_entries):
+                return index
+            index = build_time_range_index(entries)
+            self._write_time_range_index(index)
+        return index
+
+    def _update_time_range_index(self, href: str,
+                                 item: Optional[radicale_item.Item]) -> None:
+        """Update the entry of an item in the time range index.
+
+        The storage lock must be held for writing. Nothing is done when the
+        index is missing or invalid, it's built again when it's used.
+
+        """
+        index = self._read_time_range_index()
+        if index is None or index.token != self._read_time_range_token():
+            return
+        entries = dict(index.entries)
+        if item is None:
+            entries.pop(href, None)
+        else:
+            stat = os.stat(pathutils.path_to_filesystem(
+                self._filesystem_path, href))
+            entries[href] = ((stat.st_ino, stat.st_size, stat.st_mtime_ns),
+                             item.component_name, *item.time_range)
+        index = build_time_range_index(entries)
+        self._write_time_range_index(index)
+        storage_ = self._storage
+        with storage_._time_range_arrays_lock:
+            cached = self._filesystem_path in storage_._time_range_arrays
+        if cached:
+            # Replace the copy in memory, the next query doesn't read the index
+            self._store_time_range_arrays(index)
+
+    def _store_time_range_arrays(self, index: TimeRangeIndex
+                                 ) -> TimeRangeArrays:
+        """Keep a copy of the time range index in memory."""
+        starts: Any = index.starts
+        ends: Any = index.ends
+        if numpy is not None:
+            starts = numpy.array(starts, dtype=numpy.int64)
+            ends = numpy.array(ends, dtype=numpy.int64)
+        arrays = TimeRangeArrays(index.token, index.hrefs, index.tags, starts,
+                                 ends, index.max_ends)
+        storage_ = self._storage
+        with storage_._time_range_arrays_lock:
+            storage_._time_range_arrays[self._filesystem_path] = arrays
+        return arrays
+
+    def _get_time_range_arrays(self) -> TimeRangeArrays:
+        """Get the time range index of the collection from memory.
+
+        The copy is validated with the token of the index, like the persisted
+        index. Only the token file is read when it's unchanged.
+
+        """
+        token = self._read_time_range_token()
+        storage_ = self._storage
+        with storage_._time_range_arrays_lock:
+            arrays = storage_._time_range_arrays.get(self._filesystem_path)
+        if arrays is not None and arrays.token == token:
+            return arrays
+        return self._store_time_range_arrays(
+            self._load_time_range_index(token))
+
+    def get_filtered(self, filters: Iterable[ET.Element]
+                     ) -> Iterator[Tuple[radicale_item.Item, bool]]:
+        if not self.tag:
+            return
+        tag, start, end, simple = radicale_filter.simplify_prefilters(
+            filters, self.tag)
+        if (start == radicale_filter.TIMESTAMP_MIN and
+                end == radicale_filter.TIMESTAMP_MAX):
+            # Nothing to gain from the index
+            yield from super().get_filtered(filters)
+            return
+        arrays = self._get_time_range_arrays()
+        for i in overlapping(arrays, start, end):
+            href = arrays.hrefs[i]
+            if tag is not None and tag != arrays.tags[i]:
+                continue
+            item = self._get(href, verify_href=False)
+            if item is None:
+                continue
+            # The item might have been modified since the index was loaded
+            istart, iend = item.time_range
+            if istart >= end or iend <= start:
+                continue
+            yield item, simple and (start <= istart or iend <= end)
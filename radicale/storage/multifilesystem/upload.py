@@ -18,7 +18,6 @@
 
 import errno
 import os
-import pickle
 import sys
 from typing import Iterable, Iterator, TextIO, cast
 
@@ -28,17 +27,21 @@ from radicale.storage.multifilesystem.base import CollectionBase
 from radicale.storage.multifilesystem.cache import CollectionPartCache
 from radicale.storage.multifilesystem.get import CollectionPartGet
 from radicale.storage.multifilesystem.history import CollectionPartHistory
+from radicale.storage.multifilesystem.time_range import CollectionPartTimeRange
 
 
-class CollectionPartUpload(CollectionPartGet, CollectionPartCache,
-                           CollectionPartHistory, CollectionBase):
+class CollectionPartUpload(CollectionPartTimeRange, CollectionPartGet,
+                           CollectionPartCache, CollectionPartHistory,
+                           CollectionBase):
 
     def upload(self, href: str, item: radicale_item.Item
                ) -> radicale_item.Item:
         if not pathutils.is_safe_filesystem_path_component(href):
             raise pathutils.UnsafePathError(href)
         try:
-            self._store_item_cache(href, item)
+            cache_content = self._item_cache_content(item)
+            cache_hash = self._item_cache_hash(
+                item.serialize().encode(self._encoding))
         except Exception as e:
             raise ValueError("Failed to store item %r in collection %r: %s" %
                              (href, self.path, e)) from e
@@ -46,6 +49,10 @@ class CollectionPartUpload(CollectionPartGet, CollectionPartCache,
         with self._atomic_write(path, newline="") as fo:
             f = cast(TextIO, fo)
             f.write(item.serialize())
+        stat = os.stat(path)
+        self._append_item_cache([(href, self._item_cache_payload(
+            cache_hash, (stat.st_ino, stat.st_size, stat.st_mtime_ns),
+            cache_content))])
         # Clean the cache after the actual item is stored, or the cache entry
         # will be removed again.
         self._clean_item_cache()
@@ -55,6 +62,7 @@ class CollectionPartUpload(CollectionPartGet, CollectionPartCache,
         uploaded_item = self._get(href, verify_href=False)
         if uploaded_item is None:
             raise RuntimeError("Storage modified externally")
+        self._update_time_range_index(href, uploaded_item)
         return uploaded_item
 
     def _upload_all_nonatomic(self, items: Iterable[radicale_item.Item],
@@ -74,13 +82,13 @@ class CollectionPartUpload(CollectionPartGet, CollectionPartCache,
             yield radicale_item.find_available_uid(
                 lambda href: not is_safe_free_href(href), suffix)
 
-        cache_folder = os.path.join(self._filesystem_path,
-                                    ".Radicale.cache", "item")
-        self._storage._makedirs_synced(cache_folder)
+        cache_records = []
         for item in items:
             uid = item.uid
             try:
                 cache_content = self._item_cache_content(item)
+                cache_hash = self._item_cache_hash(
+                    item.serialize().encode(self._encoding))
             except Exception as e:
                 raise ValueError(
                     "Failed to store item %r in temporary collection %r: %s" %
@@ -103,9 +111,9 @@ class CollectionPartUpload(CollectionPartGet, CollectionPartCache,
                 f.write(item.serialize())
                 f.flush()
                 self._storage._fsync(f)
-            with open(os.path.join(cache_folder, href), "wb") as fb:
-                pickle.dump(cache_content, fb)
-                fb.flush()
-                self._storage._fsync(fb)
-        self._storage._sync_directory(cache_folder)
+                stat = os.fstat(f.fileno())
+            cache_records.append((href, self._item_cache_payload(
+                cache_hash, (stat.st_ino, stat.st_size, stat.st_mtime_ns),
+                cache_content)))
+        self._append_item_cache(cache_records)
         self._storage._sync_directory(self._filesystem_path)
@@ -16,17 +16,159 @@
 # You should have received a copy of the GNU General Public License
 # along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Iterator, Optional, Set
+import concurrent.futures
+import multiprocessing
+import os
+import time
+from typing import Iterator, List, Mapping, Optional, Set, Tuple, cast
 
-from radicale import pathutils, storage, types
+import radicale.item as radicale_item
+from radicale import config, pathutils, storage, types
 from radicale.log import logger
+from radicale.storage import multifilesystem
 from radicale.storage.multifilesystem.base import StorageBase
 from radicale.storage.multifilesystem.discover import StoragePartDiscover
 
+# Result of a collection in a worker process (number of items, messages with
+# a flag that indicates errors)
+CollectionResult = Tuple[int, List[Tuple[bool, str]]]
+
+# Storage of a worker process
+_worker_storage: Optional["StoragePartVerify"] = None
+
+
+def _init_worker(configuration: config.Configuration) -> None:
+    global _worker_storage
+    _worker_storage = cast(StoragePartVerify, storage.load(configuration))
+
+
+def _warm_collection(sane_path: str, meta: Mapping[str, str],
+                     verify: bool) -> CollectionResult:
+    assert _worker_storage is not None
+    return _worker_storage._warm_collection(sane_path, meta, verify)
+
 
 class StoragePartVerify(StoragePartDiscover, StorageBase):
 
-    def verify(self) -> bool:
+    def _walk_collections(self) -> Iterator[Tuple[str, Mapping[str, str]]]:
+        """Find all collections.
+
+        Yields tuples with the path and the properties of the collections,
+        parents are yielded before their children.
+
+        """
+        remaining_sane_paths = [""]
+        visited: Set[str] = {""}
+        while remaining_sane_paths:
+            sane_path = remaining_sane_paths.pop(0)
+            for item in self.discover(pathutils.unstrip_path(sane_path, True),
+                                      "1"):
+                if (not isinstance(item, storage.BaseCollection) or
+                        item.path in visited):
+                    continue
+                visited.add(item.path)
+                remaining_sane_paths.append(item.path)
+                yield item.path, dict(item.get_meta())
+
+    def _warm_collection(self, sane_path: str, meta: Mapping[str, str],
+                         verify: bool) -> CollectionResult:
+        """Build the item cache, the time range index and the history of
+           the collection ``sane_path``.
+
+        With ``verify`` the same checks as in the serial verification are
+        done, exceptions are errors of the collection.
+
+        """
+        items = item_errors = 0
+        messages: List[Tuple[bool, str]] = []
+        uids: Set[str] = set()
+        with self.acquire_lock("r"):
+            collection = self._collection_class(
+                cast(multifilesystem.Storage, self),
+                pathutils.unstrip_path(sane_path, True))
+            if verify:
+                radicale_item.check_and_sanitize_props(dict(meta))
+            if not os.path.isdir(collection._filesystem_path):
+                # Collections without items aren't stored
+                return items, messages
+            collection.set_meta(meta)
+            for href in collection._list():
+                try:
+                    item = collection._get(href, verify_href=False)
+                except Exception as e:
+                    item_errors += 1
+                    messages.append((True, "Invalid item %r in %r: %s" % (
+                        href, sane_path, e)))
+                    continue
+                if item is None:
+                    # Race: Another process might have deleted the file.
+                    continue
+                items += 1
+                collection._update_history_etag(href, item)
+                if verify and item.uid in uids:
+                    messages.append((False, "Invalid item %r in %r: UID "
+                                     "conflict %r" % (href, sane_path,
+                                                      item.uid)))
+                uids.add(item.uid)
+            # Find the changes of other programs
+            collection._load_time_range_index(rescan=True)
+            collection._get_time_range_arrays()
+            if verify and item_errors == 0:
+                collection.sync()
+        return items, messages
+
+    def _warm_collections(self, jobs: int, verify: bool) -> bool:
+        """Process all collections with ``jobs`` worker processes and log
+           the progress."""
+        action = "Verified" if verify else "Warmed"
+        collections = []
+        parent_sane_paths: Set[str] = set()
+        for sane_path, meta in self._walk_collections():
+            parent_sane_paths.add(sane_path.rpartition("/")[0])
+            if meta.get("tag"):
+                collections.append((sane_path, meta))
+        items = errors = 0
+        if verify:
+            for sane_path, meta in collections:
+                if sane_path in parent_sane_paths:
+                    logger.error("Invalid collection %r: %r must not have "
+                                 "child collections", sane_path, meta["tag"])
+        start = time.perf_counter()
+        # Worker processes are spawned, forking a multithreaded process is
+        # unsafe
+        with concurrent.futures.ProcessPoolExecutor(
+                jobs or None, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.configuration,)
+                ) as executor:
+            futures = {executor.submit(_warm_collection, sane_path, meta,
+                                       verify): sane_path
+                       for sane_path, meta in collections}
+            for done, future in enumerate(
+                    concurrent.futures.as_completed(futures), start=1):
+                sane_path = futures[future]
+                try:
+                    collection_items, messages = future.result()
+                except Exception as e:
+                    errors += 1
+                    logger.error("Invalid collection %r: %s", sane_path, e,
+                                 exc_info=True)
+                    continue
+                items += collection_items
+                for is_error, message in messages:
+                    errors += is_error
+                    logger.error("%s", message)
+                elapsed = time.perf_counter() - start
+                logger.info("%s %d/%d collections, %d items (%.1f items/s)",
+                            action, done, len(futures), items,
+                            items / elapsed if elapsed > 0 else 0)
+        return errors == 0
+
+    def warm_cache(self, jobs: int = 0) -> bool:
+        return self._warm_collections(jobs, verify=False)
+
+    def verify(self, jobs: int = 1) -> bool:
+        if jobs != 1:
+            return self._warm_collections(jobs, verify=True)
         item_errors = collection_errors = 0
 
         @types.contextmanager
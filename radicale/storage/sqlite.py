@@ -0,0 +1,672 @@
+# This file is part of Radicale - CalDAV and CardDAV server
+#
+# This library is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Storage backend that stores all collections in a SQLite database.
+
+The database ``collections.sqlite`` in ``filesystem_folder`` uses
+write-ahead logging. Items are kept in one table together with the data of
+the item cache of the ``multifilesystem`` backend, lookups by href, UID,
+component and time range use indexes. Changes with the exclusive storage
+lock are written in one transaction.
+
+"""
+
+import binascii
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from hashlib import sha256
+from typing import (Dict, Iterable, Iterator, List, Mapping, Optional, Set,
+                    Tuple, Union, overload)
+
+import radicale.item as radicale_item
+from radicale import config, pathutils, storage, types
+from radicale.item import filter as radicale_filter
+from radicale.log import logger
+from radicale.storage.multifilesystem.base import StorageBase
+from radicale.storage.multifilesystem.lock import StoragePartLock
+
+DATABASE_NAME: str = "collections.sqlite"
+
+# Number of prepared statements that are kept per connection
+STATEMENT_CACHE_SIZE: int = 64
+
+# Number of items that are fetched at once by ``get_all``
+PAGE_SIZE: int = 256
+
+SCHEMA: Tuple[str, ...] = (
+    """CREATE TABLE IF NOT EXISTS collections (
+        path TEXT PRIMARY KEY, parent TEXT, meta TEXT NOT NULL,
+        modified REAL NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS collections_parent ON collections (parent)",
+    """CREATE TABLE IF NOT EXISTS items (
+        collection TEXT NOT NULL, href TEXT NOT NULL, uid TEXT NOT NULL,
+        etag TEXT NOT NULL, text TEXT NOT NULL, name TEXT NOT NULL,
+        component TEXT NOT NULL, start_time INTEGER NOT NULL,
+        end_time INTEGER NOT NULL, busy BLOB NOT NULL,
+        cache_version BLOB NOT NULL, modified REAL NOT NULL,
+        PRIMARY KEY (collection, href))""",
+    "CREATE INDEX IF NOT EXISTS items_uid ON items (collection, uid)",
+    """CREATE INDEX IF NOT EXISTS items_component
+        ON items (collection, component)""",
+    """CREATE INDEX IF NOT EXISTS items_time_range
+        ON items (collection, start_time, end_time)""",
+    """CREATE TABLE IF NOT EXISTS history (
+        collection TEXT NOT NULL, href TEXT NOT NULL, etag TEXT NOT NULL,
+        history_etag TEXT NOT NULL, modified REAL NOT NULL,
+        PRIMARY KEY (collection, href))""",
+    """CREATE TABLE IF NOT EXISTS sync_tokens (
+        collection TEXT NOT NULL, token TEXT NOT NULL, state TEXT NOT NULL,
+        modified REAL NOT NULL, PRIMARY KEY (collection, token))""")
+
+ITEM_COLUMNS: str = ("href, uid, etag, text, name, component, start_time, "
+                     "end_time, busy, modified")
+
+SELECT_COLLECTION: str = "SELECT meta FROM collections WHERE path = ?"
+SELECT_CHILD_COLLECTIONS: str = (
+    "SELECT path, meta FROM collections WHERE parent = ? ORDER BY path")
+SELECT_ITEM: str = ("SELECT %s FROM items WHERE collection = ? AND href = ?"
+                    % ITEM_COLUMNS)
+SELECT_ITEMS_PAGE: str = (
+    "SELECT %s FROM items WHERE collection = ? AND href > ? ORDER BY href "
+    "LIMIT ?" % ITEM_COLUMNS)
+SELECT_ITEMS_IN_RANGE: str = (
+    "SELECT %s FROM items WHERE collection = ? AND start_time < ? AND "
+    "end_time > ? ORDER BY href" % ITEM_COLUMNS)
+SELECT_COMPONENTS_IN_RANGE: str = (
+    "SELECT %s FROM items WHERE collection = ? AND component = ? AND "
+    "start_time < ? AND end_time > ? ORDER BY href" % ITEM_COLUMNS)
+SELECT_ETAGS: str = (
+    "SELECT href, etag FROM items WHERE collection = ? ORDER BY href")
+SELECT_UID: str = "SELECT 1 FROM items WHERE collection = ? AND uid = ?"
+SELECT_LAST_MODIFIED: str = (
+    "SELECT modified FROM collections WHERE path = ?")
+INSERT_ITEM: str = (
+    "INSERT OR REPLACE INTO items (collection, %s, cache_version) VALUES "
+    "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)" % ITEM_COLUMNS)
+DELETE_ITEM: str = "DELETE FROM items WHERE collection = ? AND href = ?"
+MOVE_ITEM: str = ("UPDATE items SET collection = ?, href = ?, modified = ? "
+                  "WHERE collection = ? AND href = ?")
+TOUCH_COLLECTION: str = "UPDATE collections SET modified = ? WHERE path = ?"
+SELECT_HISTORY: str = ("SELECT etag, history_etag FROM history "
+                       "WHERE collection = ? AND href = ?")
+INSERT_HISTORY: str = ("INSERT OR REPLACE INTO history VALUES "
+                       "(?, ?, ?, ?, ?)")
+SELECT_DELETED_HISTORY: str = (
+    "SELECT href FROM history WHERE collection = ? AND NOT EXISTS ("
+    "SELECT 1 FROM items WHERE items.collection = history.collection AND "
+    "items.href = history.href)")
+DELETE_DELETED_HISTORY: str = (
+    "DELETE FROM history WHERE collection = ? AND modified < ? AND "
+    "NOT EXISTS (SELECT 1 FROM items WHERE items.collection = "
+    "history.collection AND items.href = history.href)")
+SELECT_SYNC_TOKEN: str = ("SELECT state FROM sync_tokens "
+                          "WHERE collection = ? AND token = ?")
+INSERT_SYNC_TOKEN: str = ("INSERT OR REPLACE INTO sync_tokens VALUES "
+                          "(?, ?, ?, ?)")
+DELETE_SYNC_TOKENS: str = ("DELETE FROM sync_tokens "
+                           "WHERE collection = ? AND modified < ?")
+
+# Row of the items table in the order of ``ITEM_COLUMNS``
+ItemRow = Tuple[str, str, str, str, str, str, int, int, bytes, float]
+
+
+def _parent_path(sane_path: str) -> Optional[str]:
+    if not sane_path:
+        return None
+    return sane_path.rpartition("/")[0]
+
+
+def _http_date(timestamp: float) -> str:
+    return time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(timestamp))
+
+
+class Collection(storage.BaseCollection):
+
+    _storage: "Storage"
+    _path: str
+    _meta_cache: Optional[Mapping[str, str]]
+
+    def __init__(self, storage_: "Storage", path: str,
+                 meta: Optional[Mapping[str, str]] = None) -> None:
+        super().__init__()
+        self._storage = storage_
+        # Path should already be sanitized
+        self._path = path
+        self._meta_cache = meta
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def last_modified(self) -> str:
+        row = self._storage._connect().execute(
+            SELECT_LAST_MODIFIED, (self._path,)).fetchone()
+        return _http_date(row[0] if row else time.time())
+
+    @property
+    def etag(self) -> str:
+        etag = sha256()
+        for href, item_etag in self._storage._connect().execute(
+                SELECT_ETAGS, (self._path,)):
+            etag.update((href + "/" + item_etag).encode())
+        etag.update(json.dumps(self.get_meta(), sort_keys=True).encode())
+        return '"%s"' % etag.hexdigest()
+
+    @overload
+    def get_meta(self, key: None = None) -> Mapping[str, str]: ...
+
+    @overload
+    def get_meta(self, key: str) -> Optional[str]: ...
+
+    def get_meta(self, key: Optional[str] = None) -> Union[Mapping[str, str],
+                                                           Optional[str]]:
+        if self._meta_cache is None:
+            row = self._storage._connect().execute(
+                SELECT_COLLECTION, (self._path,)).fetchone()
+            self._meta_cache = json.loads(row[0]) if row else {}
+            # Raises an error if the meta data is invalid
+            radicale_item.check_and_sanitize_props(self._meta_cache)
+        return self._meta_cache if key is None else self._meta_cache.get(key)
+
+    def set_meta(self, props: Mapping[str, str]) -> None:
+        with self._storage._transaction() as connection:
+            connection.execute(
+                "UPDATE collections SET meta = ?, modified = ? "
+                "WHERE path = ?", (json.dumps(props, sort_keys=True),
+                                   time.time(), self._path))
+        self._meta_cache = dict(props)
+
+    def _item(self, row: ItemRow) -> radicale_item.Item:
+        (href, uid, etag, text, name, component, start, end, busy,
+         modified) = row
+        return radicale_item.Item(
+            collection=self, href=href, last_modified=_http_date(modified),
+            etag=etag, text=text, uid=uid, name=name,
+            component_name=component, time_range=(start, end),
+            busy_time=pickle.loads(busy))
+
+    def _get(self, href: str) -> Optional[radicale_item.Item]:
+        row = self._storage._connect().execute(
+            SELECT_ITEM, (self._path, href)).fetchone()
+        return None if row is None else self._item(row)
+
+    def get_multi(self, hrefs: Iterable[str]
+                  ) -> Iterator[Tuple[str, Optional[radicale_item.Item]]]:
+        for href in hrefs:
+            yield href, self._get(href)
+
+    def get_all(self) -> Iterator[radicale_item.Item]:
+        # Items are fetched in pages, the collection can be modified while
+        # the iterator is consumed
+        connection = self._storage._connect()
+        last_href = ""
+        while True:
+            rows = connection.execute(SELECT_ITEMS_PAGE, (
+                self._path, last_href, PAGE_SIZE)).fetchall()
+            for row in rows:
+                yield self._item(row)
+            if len(rows) < PAGE_SIZE:
+                return
+            last_href = rows[-1][0]
+
+    def get_filtered(self, filters: Iterable[ET.Element]
+                     ) -> Iterator[Tuple[radicale_item.Item, bool]]:
+        if not self.tag:
+            return
+        tag, start, end, simple = radicale_filter.simplify_prefilters(
+            filters, self.tag)
+        connection = self._storage._connect()
+        if tag is None:
+            rows = connection.execute(SELECT_ITEMS_IN_RANGE, (
+                self._path, end, start)).fetchall()
+        else:
+            rows = connection.execute(SELECT_COMPONENTS_IN_RANGE, (
+                self._path, tag, end, start)).fetchall()
+        for row in rows:
+            item = self._item(row)
+            istart, iend = item.time_range
+            yield item, simple and (start <= istart or iend <= end)
+
+    def has_uid(self, uid: str) -> bool:
+        return self._storage._connect().execute(
+            SELECT_UID, (self._path, uid)).fetchone() is not None
+
+    def _item_row(self, href: str, item: radicale_item.Item,
+                  modified: float) -> tuple:
+        return (self._path, href, item.uid, item.etag, item.serialize(),
+                item.name, item.component_name, *item.time_range,
+                pickle.dumps(item.busy_time), modified,
+                storage.CACHE_VERSION)
+
+    def upload(self, href: str, item: radicale_item.Item
+               ) -> radicale_item.Item:
+        if not pathutils.is_safe_filesystem_path_component(href):
+            raise pathutils.UnsafePathError(href)
+        modified = time.time()
+        try:
+            row = self._item_row(href, item, modified)
+        except Exception as e:
+            raise ValueError("Failed to store item %r in collection %r: %s" %
+                             (href, self.path, e)) from e
+        with self._storage._transaction() as connection:
+            connection.execute(INSERT_ITEM, row)
+            connection.execute(TOUCH_COLLECTION, (modified, self._path))
+            # Track the change
+            self._update_history_etag(href, item)
+            self._clean_history()
+        uploaded_item = self._get(href)
+        if uploaded_item is None:
+            raise RuntimeError("Storage modified externally")
+        return uploaded_item
+
+    def _upload_all(self, items: Iterable[radicale_item.Item],
+                    suffix: str = "") -> None:
+        """Upload a new set of items to the empty collection."""
+        hrefs: Set[str] = set()
+
+        def is_safe_free_href(href: str) -> bool:
+            return (pathutils.is_safe_filesystem_path_component(href) and
+                    href.lower() not in hrefs)
+
+        def get_safe_free_hrefs(uid: str) -> Iterator[str]:
+            for href in [uid if uid.lower().endswith(suffix.lower())
+                         else uid + suffix,
+                         radicale_item.get_etag(uid).strip('"') + suffix]:
+                if is_safe_free_href(href):
+                    yield href
+            yield radicale_item.find_available_uid(
+                lambda href: not is_safe_free_href(href), suffix)
+
+        modified = time.time()
+        rows = []
+        for item in items:
+            href = next(get_safe_free_hrefs(item.uid))
+            hrefs.add(href.lower())
+            try:
+                rows.append(self._item_row(href, item, modified))
+            except Exception as e:
+                raise ValueError(
+                    "Failed to store item %r in temporary collection %r: %s" %
+                    (item.uid, self.path, e)) from e
+        with self._storage._transaction() as connection:
+            connection.executemany(INSERT_ITEM, rows)
+
+    def delete(self, href: Optional[str] = None) -> None:
+        if href is None:
+            self._storage._delete_collection(self._path)
+            return
+        with self._storage._transaction() as connection:
+            if connection.execute(DELETE_ITEM, (
+                    self._path, href)).rowcount == 0:
+                raise storage.ComponentNotFoundError(href)
+            connection.execute(TOUCH_COLLECTION, (time.time(), self._path))
+            # Track the change
+            self._update_history_etag(href, None)
+            self._clean_history()
+
+    def _update_history_etag(self, href: str,
+                             item: Optional[radicale_item.Item]) -> str:
+        """Updates and retrieves the history etag of an item.
+
+        The history table contains a row for each current and deleted item
+        of the collection with the etag of the item (empty string for
+        deleted items) and a history etag, which is a hash over the previous
+        history etag and the etag separated by "/".
+
+        """
+        connection = self._storage._connect()
+        row = connection.execute(SELECT_HISTORY, (self._path, href)).fetchone()
+        if row is None:
+            cache_etag = ""
+            # Initialize with random data to prevent collisions with cleaned
+            # expired items.
+            history_etag = binascii.hexlify(os.urandom(16)).decode("ascii")
+        else:
+            cache_etag, history_etag = row
+        etag = item.etag if item else ""
+        if etag != cache_etag:
+            history_etag = radicale_item.get_etag(
+                history_etag + "/" + etag).strip("\"")
+            with self._storage._transaction() as connection:
+                connection.execute(INSERT_HISTORY, (
+                    self._path, href, etag, history_etag, time.time()))
+        return history_etag
+
+    def _get_deleted_history_hrefs(self) -> List[str]:
+        """Returns the hrefs of all deleted items that are still in the
+        history table."""
+        return [href for href, in self._storage._connect().execute(
+            SELECT_DELETED_HISTORY, (self._path,))]
+
+    def _clean_history(self) -> None:
+        # Delete all expired history entries of deleted items.
+        max_age = self._storage._max_sync_token_age
+        if max_age > 0:
+            with self._storage._transaction() as connection:
+                connection.execute(DELETE_DELETED_HISTORY, (
+                    self._path, time.time() - max_age))
+
+    def sync(self, old_token: str = "") -> Tuple[str, Iterable[str]]:
+        # The sync token has the form http://radicale.org/ns/sync/TOKEN_NAME
+        # where TOKEN_NAME is the sha256 hash of all history etags of present
+        # and past items of the collection.
+        old_token_name = ""
+        if old_token:
+            # Extract the token name from the sync token
+            if not old_token.startswith("http://radicale.org/ns/sync/"):
+                raise ValueError("Malformed token: %r" % old_token)
+            old_token_name = old_token[len("http://radicale.org/ns/sync/"):]
+            if (len(old_token_name) != 64 or
+                    not set(old_token_name) <= set("0123456789abcdef")):
+                raise ValueError("Malformed token: %r" % old_token)
+        # Get the current state and sync-token of the collection.
+        state: Dict[str, str] = {}
+        token_name_hash = sha256()
+        # Find the history of all existing and deleted items
+        items: List[Tuple[str, Optional[radicale_item.Item]]] = [
+            (item.href or "", item) for item in self.get_all()]
+        items.extend((href, None) for href in
+                     self._get_deleted_history_hrefs())
+        for href, item in items:
+            history_etag = self._update_history_etag(href, item)
+            state[href] = history_etag
+            token_name_hash.update((href + "/" + history_etag).encode())
+        token_name = token_name_hash.hexdigest()
+        token = "http://radicale.org/ns/sync/%s" % token_name
+        if token_name == old_token_name:
+            # Nothing changed
+            return token, ()
+        connection = self._storage._connect()
+        old_state: Mapping[str, str] = {}
+        if old_token_name:
+            # load the old token state
+            row = connection.execute(SELECT_SYNC_TOKEN, (
+                self._path, old_token_name)).fetchone()
+            if row is None:
+                raise ValueError("Token not found: %r" % old_token)
+            old_state = json.loads(row[0])
+        # write the new token state or update the modification time of
+        # existing token state
+        with self._storage._transaction() as connection:
+            connection.execute(INSERT_SYNC_TOKEN, (
+                self._path, token_name, json.dumps(state), time.time()))
+            # clean up old sync tokens and history
+            max_age = self._storage._max_sync_token_age
+            if max_age > 0:
+                connection.execute(DELETE_SYNC_TOKENS, (
+                    self._path, time.time() - max_age))
+            self._clean_history()
+        changes = []
+        # Find all new, changed and deleted (that are still in the history)
+        # items
+        for href, history_etag in state.items():
+            if history_etag != old_state.get(href):
+                changes.append(href)
+        # Find all deleted items that are no longer in the history
+        for href, history_etag in old_state.items():
+            if href not in state:
+                changes.append(href)
+        return token, changes
+
+
+class Storage(StoragePartLock, StorageBase):
+
+    _database_path: str
+    _max_sync_token_age: int
+    _local: threading.local
+
+    def __init__(self, configuration: config.Configuration) -> None:
+        super().__init__(configuration)
+        self._makedirs_synced(self._filesystem_folder)
+        self._database_path = os.path.join(self._filesystem_folder,
+                                           DATABASE_NAME)
+        self._max_sync_token_age = configuration.get(
+            "storage", "max_sync_token_age")
+        self._local = threading.local()
+        # Don't keep the connection, the storage might be used by another
+        # process or thread
+        connection = self._open()
+        try:
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._update_cache_data(connection)
+        finally:
+            connection.close()
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self._database_path, isolation_level=None,
+            check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = %s" % (
+            "FULL" if self._filesystem_fsync else "OFF"))
+        return connection
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection of the current thread."""
+        connection: Optional[sqlite3.Connection] = getattr(
+            self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._open()
+        return connection
+
+    @types.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write in a transaction.
+
+        Joins the transaction of the exclusive storage lock in a savepoint,
+        failed changes are rolled back without the outer transaction.
+
+        """
+        connection = self._connect()
+        if connection.in_transaction:
+            connection.execute("SAVEPOINT nested")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK TO nested")
+                connection.execute("RELEASE nested")
+                raise
+            connection.execute("RELEASE nested")
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    def _update_cache_data(self, connection: sqlite3.Connection) -> None:
+        """Recompute the data of items that was stored with other versions
+           of the dependencies."""
+        rows = connection.execute(
+            "SELECT collection, href, text, modified FROM items "
+            "WHERE cache_version != ?", (storage.CACHE_VERSION,)).fetchall()
+        if not rows:
+            return
+        logger.info("Updating cached data of %d items", len(rows))
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for path, href, text, modified in rows:
+                collection = Collection(self, path)
+                try:
+                    vobject_item, = radicale_item.read_components(text)
+                    item = radicale_item.Item(collection=collection,
+                                              vobject_item=vobject_item)
+                    connection.execute(INSERT_ITEM, collection._item_row(
+                        href, item, modified))
+                except Exception as e:
+                    logger.error("Failed to update item %r in %r: %s",
+                                 href, path, e, exc_info=True)
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    @types.contextmanager
+    def acquire_lock(self, mode: str, user: str = "") -> Iterator[None]:
+        with super().acquire_lock(mode, user):
+            if mode != "w":
+                # Readers are isolated from changes by the storage lock
+                yield
+                return
+            with self._transaction():
+                yield
+
+    def _ensure_collection(self, connection: sqlite3.Connection,
+                           sane_path: str) -> None:
+        """Create the collection and its parents if they don't exist."""
+        parent = _parent_path(sane_path)
+        if parent is not None:
+            self._ensure_collection(connection, parent)
+        connection.execute(
+            "INSERT OR IGNORE INTO collections VALUES (?, ?, ?, ?)",
+            (sane_path, parent, "{}", time.time()))
+
+    def _delete_collection(self, sane_path: str) -> None:
+        """Delete the collection and its children."""
+        prefix = sane_path + "/" if sane_path else ""
+        with self._transaction() as connection:
+            for table, column in (("collections", "path"),
+                                  ("items", "collection"),
+                                  ("history", "collection"),
+                                  ("sync_tokens", "collection")):
+                connection.execute(
+                    "DELETE FROM %s WHERE %s = ? OR substr(%s, 1, ?) = ?" %
+                    (table, column, column), (sane_path, len(prefix), prefix))
+
+    def discover(self, path: str, depth: str = "0", child_context_manager=None
+                 ) -> Iterator[types.CollectionOrItem]:
+        # Path should already be sanitized
+        sane_path = pathutils.strip_path(path)
+        connection = self._connect()
+        row = connection.execute(SELECT_COLLECTION, (sane_path,)).fetchone()
+        if row is None and sane_path:
+            # Search for an item
+            collection_path, _, href = sane_path.rpartition("/")
+            if connection.execute(SELECT_COLLECTION, (
+                    collection_path,)).fetchone() is not None:
+                item = Collection(self, collection_path)._get(href)
+                if item is not None:
+                    yield item
+            return
+        collection = Collection(self, sane_path,
+                                json.loads(row[0]) if row else {})
+        yield collection
+        if depth == "0":
+            return
+        for child_path, meta in connection.execute(
+                SELECT_CHILD_COLLECTIONS, (sane_path,)).fetchall():
+            yield Collection(self, child_path, json.loads(meta))
+        yield from collection.get_all()
+
+    def create_collection(self, href: str,
+                          items: Optional[Iterable[radicale_item.Item]] = None,
+                          props: Optional[Mapping[str, str]] = None
+                          ) -> Collection:
+        # Path should already be sanitized
+        sane_path = pathutils.strip_path(href)
+        for part in sane_path.split("/") if sane_path else []:
+            if not pathutils.is_safe_filesystem_path_component(part):
+                raise pathutils.UnsafePathError(part)
+        with self._transaction() as connection:
+            if props:
+                self._delete_collection(sane_path)
+            self._ensure_collection(connection, sane_path)
+            collection = Collection(self, sane_path)
+            if not props:
+                return collection
+            collection.set_meta(props)
+            if items is not None:
+                if props.get("tag") == "VCALENDAR":
+                    collection._upload_all(items, suffix=".ics")
+                elif props.get("tag") == "VADDRESSBOOK":
+                    collection._upload_all(items, suffix=".vcf")
+        return collection
+
+    def move(self, item: radicale_item.Item,
+             to_collection: storage.BaseCollection, to_href: str) -> None:
+        if not pathutils.is_safe_filesystem_path_component(to_href):
+            raise pathutils.UnsafePathError(to_href)
+        assert isinstance(item.collection, Collection)
+        assert isinstance(to_collection, Collection)
+        assert item.href
+        modified = time.time()
+        with self._transaction() as connection:
+            connection.execute(DELETE_ITEM, (to_collection.path, to_href))
+            connection.execute(MOVE_ITEM, (
+                to_collection.path, to_href, modified, item.collection.path,
+                item.href))
+            connection.executemany(TOUCH_COLLECTION, (
+                (modified, to_collection.path),
+                (modified, item.collection.path)))
+            # Track the change
+            to_collection._update_history_etag(to_href, item)
+            item.collection._update_history_etag(item.href, None)
+            to_collection._clean_history()
+            if item.collection.path != to_collection.path:
+                item.collection._clean_history()
+
+    def verify(self, jobs: int = 1) -> bool:
+        item_errors = collection_errors = 0
+        connection = self._connect()
+        for result, in connection.execute("PRAGMA integrity_check"):
+            if result != "ok":
+                collection_errors += 1
+                logger.error("Invalid database %r: %s",
+                             self._database_path, result)
+        for path, meta in connection.execute(
+                "SELECT path, meta FROM collections ORDER BY path"
+                ).fetchall():
+            logger.debug("Verifying collection %r", path)
+            collection = Collection(self, path)
+            try:
+                radicale_item.check_and_sanitize_props(json.loads(meta))
+            except Exception as e:
+                collection_errors += 1
+                logger.error("Invalid collection %r: %s", path, e,
+                             exc_info=True)
+                continue
+            uids: Set[str] = set()
+            for item in collection.get_all():
+                try:
+                    vobject_items = radicale_item.read_components(
+                        item.serialize())
+                    radicale_item.check_and_sanitize_items(
+                        vobject_items, tag=collection.tag)
+                except Exception as e:
+                    item_errors += 1
+                    logger.error("Invalid item %r in %r: %s", item.href,
+                                 path, e, exc_info=True)
+                    continue
+                if item.uid in uids:
+                    logger.error("Invalid item %r in %r: UID conflict %r",
+                                 item.href, path, item.uid)
+                else:
+                    uids.add(item.uid)
+                    logger.debug("Verified item %r in %r", item.href, path)
+            if collection.tag and connection.execute(
+                    SELECT_CHILD_COLLECTIONS, (path,)).fetchone():
+                logger.error("Invalid collection %r: %r must not have "
+                             "child collections", path, collection.tag)
+        return item_errors == 0 and collection_errors == 0
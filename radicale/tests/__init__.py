@@ -99,7 +99,7 @@ class BaseTest:
         assert status is not None and headers is not None
         assert check is None or status == check, "%d != %d" % (status, check)
 
-        return status, headers, answers[0].decode() if answers else ""
+        return status, headers, b"".join(answers).decode()
 
     @staticmethod
     def parse_responses(text: str) -> RESPONSES:
@@ -27,7 +27,7 @@ from typing import Iterable, Tuple, Union
 
 import pytest
 
-from radicale import xmlutils
+from radicale import auth, xmlutils
 from radicale.tests import BaseTest
 
 
@@ -108,6 +108,26 @@ class TestBaseAuthRequests(BaseTest):
     def test_htpasswd_comment(self) -> None:
         self._test_htpasswd("plain", "#comment\n #comment\n \ntmp:bepo\n\n")
 
+    def test_htpasswd_reload(self) -> None:
+        """Changes of the htpasswd file are applied without restart."""
+        htpasswd_file_path = os.path.join(self.colpath, ".htpasswd")
+        with open(htpasswd_file_path, "w") as f:
+            f.write("tmp:bepo")
+        self.configure({"auth": {"type": "htpasswd",
+                                 "htpasswd_filename": htpasswd_file_path,
+                                 "htpasswd_encryption": "plain",
+                                 "htpasswd_cache_seconds": "60"}})
+        auth_ = auth.load(self.configuration)
+        assert auth_.login("tmp", "bepo") == "tmp"
+        assert auth_.login("tmp", "bepo") == "tmp"
+        assert auth_.login("tmp", "tmp") == ""
+        assert auth_.login("unk", "bepo") == ""
+        with open(htpasswd_file_path, "w") as f:
+            f.write("tmp:changed\nunk:bepo")
+        assert auth_.login("tmp", "bepo") == ""
+        assert auth_.login("tmp", "changed") == "tmp"
+        assert auth_.login("unk", "bepo") == "unk"
+
     def test_remote_user(self) -> None:
         self.configure({"auth": {"type": "remote_user"}})
         _, responses = self.propfind("/", """\
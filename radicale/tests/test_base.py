@@ -20,13 +20,24 @@ Radicale tests with simple requests.
 
 """
 
+import io
+import json
+import logging
 import os
 import posixpath
+import sys
+from datetime import datetime, timezone
 from typing import Any, Callable, ClassVar, Iterable, List, Optional, Tuple
 
 import defusedxml.ElementTree as DefusedET
-
-from radicale import storage, xmlutils
+import pytest
+import vobject
+
+import radicale.item as radicale_item
+from radicale import log, metrics, storage, xmlutils
+from radicale.app import report
+from radicale.item import expand as radicale_expand
+from radicale.item import filter as radicale_filter
 from radicale.tests import RESPONSES, BaseTest
 from radicale.tests.helpers import get_file_content
 
@@ -799,6 +810,120 @@ permissions: RrWw""")
     <C:text-match collation="i;unicode-casemap">test</C:text-match>
 </C:prop-filter>"""], "contact", test="allof")
 
+    def test_compiled_filter(self) -> None:
+        """Compiled filters are reusable for all items of a collection."""
+        contact = radicale_item.Item(
+            collection_path="contacts.vcf", vobject_item=vobject.readOne(
+                get_file_content("contact1.vcf")))
+        event = radicale_item.Item(
+            collection_path="calendar.ics", vobject_item=vobject.readOne(
+                get_file_content("event1.ics")))
+        plan = radicale_filter.compile_filters([DefusedET.fromstring("""\
+<CR:filter xmlns:CR="urn:ietf:params:xml:ns:carddav">
+    <CR:prop-filter name="NICKNAME">
+        <CR:text-match match-type="starts-with">TE</CR:text-match>
+    </CR:prop-filter>
+</CR:filter>""")], "VADDRESSBOOK")
+        assert plan(contact) and plan(contact)
+        plan = radicale_filter.compile_filters([DefusedET.fromstring("""\
+<CR:filter xmlns:CR="urn:ietf:params:xml:ns:carddav">
+    <CR:prop-filter name="NICKNAME">
+        <CR:text-match collation="i;octet">TE</CR:text-match>
+    </CR:prop-filter>
+</CR:filter>""")], "VADDRESSBOOK")
+        assert not plan(contact)
+        plan = radicale_filter.compile_filters([DefusedET.fromstring("""\
+<C:filter xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <C:comp-filter name="VCALENDAR">
+        <C:comp-filter name="VEVENT">
+            <C:time-range start="20130901T000000Z" end="20130902T000000Z"/>
+        </C:comp-filter>
+    </C:comp-filter>
+</C:filter>""")], "VCALENDAR")
+        assert plan(event)
+        with pytest.raises(ValueError):
+            radicale_filter.compile_filters([DefusedET.fromstring("""\
+<CR:filter xmlns:CR="urn:ietf:params:xml:ns:carddav">
+    <CR:prop-filter name="NICKNAME">
+        <CR:text-match match-type="unknown">test</CR:text-match>
+    </CR:prop-filter>
+</CR:filter>""")], "VADDRESSBOOK")
+
+    def test_parallel_filter(self) -> None:
+        """Filters are matched in worker processes."""
+        items = [radicale_item.Item(
+            collection_path="calendar.ics", href="event%d.ics" % i,
+            vobject_item=vobject.readOne(get_file_content(
+                "event%d.ics" % i))) for i in range(1, 8)]
+        filters = [DefusedET.fromstring("""\
+<C:filter xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <C:comp-filter name="VCALENDAR">
+        <C:comp-filter name="VEVENT">
+            <C:time-range start="20130901T000000Z" end="20130902T000000Z"/>
+        </C:comp-filter>
+    </C:comp-filter>
+</C:filter>""")]
+        filter_plan = radicale_filter.compile_filters(filters, "VCALENDAR")
+        with report.use_executor(2) as executor:
+            try:
+                assert report.match_parallel(
+                    executor, 2, "calendar.ics", "VCALENDAR", filters, items
+                ) == [filter_plan(item) for item in items]
+                # A pool that is replaced by another request stays usable
+                with report.use_executor(1) as other_executor:
+                    assert other_executor is not executor
+                assert report.match_parallel(
+                    executor, 2, "calendar.ics", "VCALENDAR", filters,
+                    items[:2]) == [filter_plan(item) for item in items[:2]]
+            finally:
+                report.discard_executor(report._executor)
+        assert not report._executor_users
+
+    def test_expand(self) -> None:
+        """Recurrences are expanded in the window and cached."""
+        item = radicale_item.Item(
+            collection_path="calendar.ics", text=get_file_content(
+                "event2.ics"))
+        start = datetime(2013, 9, 1, tzinfo=timezone.utc)
+        end = datetime(2013, 9, 17, tzinfo=timezone.utc)
+        text = radicale_expand.expand(item, start, end)
+        assert "RRULE" not in text and "TZID" not in text
+        assert text.count("BEGIN:VEVENT") == 3
+        assert "RECURRENCE-ID:20130902T160000Z" in text
+        assert "RECURRENCE-ID:20130909T160000Z" in text
+        assert "DTSTART:20130910T150000Z" in text
+        assert "RECURRENCE-ID:20130916T160000Z" in text
+        hits = metrics.CACHE_HITS.get("expand")
+        text = radicale_expand.expand(
+            item, start, datetime(2013, 9, 16, 12, tzinfo=timezone.utc))
+        assert metrics.CACHE_HITS.get("expand") == hits + 1
+        assert text.count("BEGIN:VEVENT") == 2
+        text = radicale_expand.expand(
+            item, datetime(2013, 9, 8, tzinfo=timezone.utc),
+            datetime(2013, 9, 12, tzinfo=timezone.utc), limit=True)
+        assert text.count("BEGIN:VEVENT") == 2 and "RRULE" in text
+
+    def test_time_range_expansion_horizon(self) -> None:
+        """Recurrences are expanded up to the horizon and memoized."""
+        vobject_item = vobject.readOne(get_file_content(
+            "event1.ics").replace(
+                "DTEND;TZID=Europe/Paris:20130901T190000\n",
+                "DTEND;TZID=Europe/Paris:20130901T190000\n"
+                "RRULE:FREQ=DAILY;UNTIL=21000101T000000Z\n"))
+        try:
+            radicale_item.set_expansion_horizon(0)
+            _, end = radicale_item.find_time_range(vobject_item, "VEVENT")
+            assert end < radicale_filter.TIMESTAMP_MAX
+            radicale_item.set_expansion_horizon(365)
+            _, end = radicale_item.find_time_range(vobject_item, "VEVENT")
+            assert end == radicale_filter.TIMESTAMP_MAX
+            hits = metrics.CACHE_HITS.get("time_range")
+            radicale_item.find_time_range(vobject_item, "VEVENT")
+            assert metrics.CACHE_HITS.get("time_range") == hits + 1
+        finally:
+            radicale_item.set_expansion_horizon(
+                self.configuration.get("storage", "expansion_horizon"))
+
     def test_calendar_empty_filter(self) -> None:
         self._test_filter([""])
 
@@ -1611,6 +1736,12 @@ permissions: RrWw""")
         """Verify existence of the principal collection."""
         self.propfind("/user/", login="user:")
 
+    def test_principal_collection_recreation(self) -> None:
+        """Verify that deleted principal collections are created again."""
+        self.propfind("/user/", login="user:")
+        self.delete("/user/", login="user:")
+        self.propfind("/user/", login="user:")
+
     def test_authentication_current_user_principal_hack(self) -> None:
         """Test if server sends authentication request when accessing
            current-user-principal prop (workaround for DAVx5)."""
@@ -1659,6 +1790,53 @@ permissions: RrWw""")
         _, headers, _ = self.request("GET", "/.well-known/foo", check=404)
         assert headers.get("test") == "123"
 
+    def test_max_content_length(self) -> None:
+        self.configure({"server": {"max_content_length": "100"}})
+        self.request("PROPFIND", "/", " " * 101, check=413)
+        # Request body without content length (chunked transfer encoding)
+        status: List[str] = []
+        environ = {"REQUEST_METHOD": "PROPFIND", "PATH_INFO": "/",
+                   "wsgi.input": io.BytesIO(b" " * 101),
+                   "wsgi.input_terminated": True, "wsgi.errors": sys.stderr}
+        list(self.application(environ, lambda s, _: status.append(s)))
+        assert status[0].startswith("413 ")
+
+    def test_metrics(self) -> None:
+        status, _, _ = self.request("GET", "/.metrics")
+        assert status != 200
+        self.configure({"metrics": {"enabled": "True"}})
+        self.request("GET", "/", check=302)
+        _, headers, answer = self.request("GET", "/.metrics", check=200)
+        assert headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "radicale_requests_in_flight 1\n" in answer
+        assert ('radicale_request_duration_seconds_count{method="GET"}'
+                in answer)
+        # Unknown methods don't create new labels
+        for method in ("FOO", "BAR"):
+            self.request(method, "/", check=405)
+        _, _, answer = self.request("GET", "/.metrics", check=200)
+        assert ('radicale_request_duration_seconds_count{method="other"}'
+                in answer)
+        assert "FOO" not in answer and "BAR" not in answer
+
+    def test_access_log(self) -> None:
+        records: List[logging.LogRecord] = []
+        handler = logging.Handler()
+        handler.emit = records.append  # type:ignore[assignment]
+        log.access_logger.addHandler(handler)
+        try:
+            self.request("GET", "/", check=302)
+            assert not records
+            self.configure({"logging": {"access_log_sample_rate": "1"}})
+            self.request("GET", "/", check=302)
+        finally:
+            log.access_logger.removeHandler(handler)
+        assert len(records) == 1
+        entry = json.loads(records[0].getMessage())
+        assert entry["method"] == "GET"
+        assert entry["path"] == "/"
+        assert entry["status"] == 302
+
     def test_timezone_seconds(self) -> None:
         """Verify that timezones with minutes and seconds work."""
         self.mkcalendar("/calendar.ics/")
@@ -20,6 +20,7 @@ Radicale tests with simple requests and rights.
 
 import os
 
+from radicale import rights
 from radicale.tests import BaseTest
 from radicale.tests.helpers import get_file_content
 
@@ -119,6 +120,29 @@ permissions: Rr""")
         self._test_rights("from_file", "", "/custom/sub", "w", 401)
         self._test_rights("from_file", "tmp", "/custom/sub", "w", 403)
 
+    def test_from_file_reload(self) -> None:
+        """Changes of the rights file are applied without restart."""
+        rights_file_path = os.path.join(self.colpath, "rights")
+        with open(rights_file_path, "w") as f:
+            f.write("""\
+[owner]
+user: .+
+collection: {user}(/.*)?
+permissions: RrWw""")
+        self.configure({"rights": {"type": "from_file",
+                                   "file": rights_file_path}})
+        rights_ = rights.load(self.configuration)
+        assert rights_.authorization("tmp", "/tmp/calendar/") == "RrWw"
+        assert rights_.authorization("tmp", "/other/") == ""
+        with open(rights_file_path, "w") as f:
+            f.write("""\
+[all]
+user: .*
+collection: .*
+permissions: R""")
+        assert rights_.authorization("tmp", "/tmp/calendar/") == "R"
+        assert rights_.authorization("tmp", "/other/") == "R"
+
     def test_from_file_limited_get(self):
         rights_file_path = os.path.join(self.colpath, "rights")
         with open(rights_file_path, "w") as f:
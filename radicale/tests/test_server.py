@@ -56,7 +56,7 @@ class TestBaseServerRequests(BaseTest):
 
     def setup(self) -> None:
         super().setup()
-        self.shutdown_socket, shutdown_socket_out = socket.socketpair()
+        self.shutdown_socket, self.shutdown_socket_out = socket.socketpair()
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             # Find available port
             sock.bind(("127.0.0.1", 0))
@@ -65,7 +65,7 @@ class TestBaseServerRequests(BaseTest):
                         # Enable debugging for new processes
                         "logging": {"level": "debug"}})
         self.thread = threading.Thread(target=server.serve, args=(
-            self.configuration, shutdown_socket_out))
+            self.configuration, self.shutdown_socket_out))
         ssl_context = ssl.create_default_context()
         ssl_context.check_hostname = False
         ssl_context.verify_mode = ssl.CERT_NONE
@@ -133,6 +133,134 @@ class TestBaseServerRequests(BaseTest):
         self.thread.start()
         self.get("/", check=302)
 
+    def test_event_loop(self) -> None:
+        self.configure({"server": {"event_loop": "True"}})
+        self.thread.start()
+        self.get("/", check=302)
+
+    def test_event_loop_ssl(self) -> None:
+        self.configure({"server": {"event_loop": "True", "ssl": "True",
+                                   "certificate": get_file_path("cert.pem"),
+                                   "key": get_file_path("key.pem")}})
+        self.thread.start()
+        self.get("/", check=302)
+
+    def test_reload(self) -> None:
+        self.configure({"headers": {"X-Test": "first"}})
+        reload_socket, reload_socket_out = socket.socketpair()
+
+        def load_configuration() -> config.Configuration:
+            configuration = self.configuration.copy()
+            configuration.update({"headers": {"X-Test": "second"}}, "test")
+            return configuration
+        self.thread = threading.Thread(target=server.serve, args=(
+            self.configuration, self.shutdown_socket_out, reload_socket_out,
+            load_configuration))
+        self.thread.start()
+        try:
+            _, headers, _ = self.request("GET", "/", check=302)
+            assert headers.get("X-Test") == "first"
+            reload_socket.send(b"\0")
+            for _ in range(100):
+                _, headers, _ = self.request("GET", "/", check=302)
+                if headers.get("X-Test") != "first":
+                    break
+                time.sleep(0.1)
+            assert headers.get("X-Test") == "second"
+        finally:
+            reload_socket.close()
+
+    def test_workers(self) -> None:
+        self.configure({"server": {"workers": "2"}})
+        self.thread.start()
+        self.get("/", check=302)
+
+    def test_workers_restart(self, monkeypatch, caplog) -> None:
+        """Keep serving while replaced worker processes fail to start."""
+        monkeypatch.setattr(server, "WORKER_RESTART_DELAY", 0.1)
+        self.configure({"server": {"workers": "2"}})
+        reload_socket, reload_socket_out = socket.socketpair()
+        broken = True
+
+        def load_configuration() -> config.Configuration:
+            configuration = self.configuration.copy()
+            if broken:
+                configuration.update({"server": {
+                    "ssl": "True",
+                    "certificate": os.path.join(self.colpath, "missing.pem"),
+                    "key": get_file_path("key.pem")}}, "test")
+            return configuration
+        self.thread = threading.Thread(target=server.serve, args=(
+            self.configuration, self.shutdown_socket_out, reload_socket_out,
+            load_configuration))
+        self.thread.start()
+        try:
+            self.get("/", check=302)
+            reload_socket.send(b"\0")
+            for _ in range(100):
+                if caplog.text.count("restarting in") >= 2:
+                    break
+                time.sleep(0.1)
+            assert caplog.text.count("restarting in") >= 2
+            assert self.thread.is_alive()
+            broken = False
+            reload_socket.send(b"\0")
+            self.get("/", check=302)
+        finally:
+            reload_socket.close()
+
+    def test_request_scheduler_queue_full(self) -> None:
+        scheduler = server.RequestScheduler(1, 1, 0)
+        blocked = threading.Event()
+        started = threading.Event()
+        try:
+            assert scheduler.submit(lambda: (started.set(), blocked.wait()))
+            started.wait()
+            assert scheduler.submit(lambda: None)
+            assert not scheduler.submit(lambda: None)
+            assert scheduler.retry_after() >= 1
+        finally:
+            blocked.set()
+            scheduler.shutdown()
+
+    def test_request_scheduler_limit(self) -> None:
+        scheduler = server.RequestScheduler(4, 0, 0.01)
+        assert scheduler.limit == 4
+        done = threading.Semaphore(0)
+        for _ in range(3):
+            assert scheduler.submit(lambda: (time.sleep(0.05), done.release()))
+        for _ in range(3):
+            done.acquire()
+        scheduler.shutdown()
+        # Requests exceeding the target latency decrease the limit
+        assert scheduler.limit < 4
+
+    def test_ssl_session_resumption(self) -> None:
+        self.configure({"server": {"ssl": "True",
+                                   "certificate": get_file_path("cert.pem"),
+                                   "key": get_file_path("key.pem")}})
+        self.thread.start()
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        session = None
+        reused = []
+        for _ in range(2):
+            for _ in range(100):
+                try:
+                    sock = socket.create_connection(self.sockname)
+                    break
+                except ConnectionRefusedError:
+                    time.sleep(0.1)
+            with ssl_context.wrap_socket(sock, session=session) as ssl_sock:
+                ssl_sock.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n"
+                                 b"Connection: close\r\n\r\n")
+                while ssl_sock.recv(4096):
+                    pass
+                reused.append(ssl_sock.session_reused)
+                session = ssl_sock.session
+        assert reused == [False, True]
+
     def test_bind_fail(self) -> None:
         for address_family, address in [(socket.AF_INET, "::1"),
                                         (socket.AF_INET6, "127.0.0.1")]:
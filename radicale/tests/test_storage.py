@@ -20,13 +20,24 @@ Tests for storage backends.
 
 """
 
+import concurrent.futures
+import contextlib
+import math
 import os
 import shutil
-from typing import ClassVar, cast
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import ClassVar, Iterable, Iterator, List, Mapping, Optional, cast
 
+import defusedxml.ElementTree as DefusedET
 import pytest
+import vobject
 
+import radicale.item as radicale_item
 import radicale.tests.custom.storage_simple_sync
+from radicale import metrics, pathutils, storage
+from radicale.app import report
+from radicale.storage.multifilesystem import cache, journal, time_range
 from radicale.tests import BaseTest
 from radicale.tests.helpers import get_file_content
 from radicale.tests.test_base import TestBaseRequests as _TestBaseRequests
@@ -39,6 +50,25 @@ class TestMultiFileSystem(BaseTest):
         _TestBaseRequests.setup(cast(_TestBaseRequests, self))
         self.configure({"storage": {"type": "multifilesystem"}})
 
+    def _create_calendar(self, path: str, *names: str,
+                         texts: Optional[Mapping[str, str]] = None
+                         ) -> storage.BaseCollection:
+        """Create the calendar ``path`` with the items of the test files
+           ``names`` and the items ``texts`` by href."""
+        storage_ = self.application._storage
+        items = {name + ".ics": get_file_content(name + ".ics")
+                 for name in names}
+        items.update(texts or {})
+        with storage_.acquire_lock("w"):
+            collection = storage_.create_collection(
+                path, props={"tag": "VCALENDAR"})
+            collection.set_meta({"tag": "VCALENDAR"})
+            for href, text in items.items():
+                collection.upload(href, radicale_item.Item(
+                    collection_path=pathutils.strip_path(path),
+                    vobject_item=vobject.readOne(text)))
+        return collection
+
     def test_folder_creation(self) -> None:
         """Verify that the folder is created."""
         folder = os.path.join(self.colpath, "subfolder")
@@ -92,12 +122,406 @@ class TestMultiFileSystem(BaseTest):
         self.put(path, event)
         _, answer1 = self.get(path)
         cache_folder = os.path.join(self.colpath, "collection-root",
-                                    "calendar.ics", ".Radicale.cache", "item")
-        assert os.path.exists(os.path.join(cache_folder, "event1.ics"))
+                                    "calendar.ics", ".Radicale.cache")
+        assert os.path.exists(os.path.join(cache_folder, "item.pack"))
         shutil.rmtree(cache_folder)
         _, answer2 = self.get(path)
         assert answer1 == answer2
-        assert os.path.exists(os.path.join(cache_folder, "event1.ics"))
+        assert os.path.exists(os.path.join(cache_folder, "item.pack"))
+
+    def test_item_cache_pack(self, monkeypatch) -> None:
+        """Read the item cache from the packed file after interrupted writes
+           and compaction."""
+        storage_ = self.application._storage
+        collection = self._create_calendar(
+            "/calendar.ics/", "event1", "event2", "event3")
+        cache_folder = os.path.join(self.colpath, "collection-root",
+                                    "calendar.ics", ".Radicale.cache")
+        pack_path = os.path.join(cache_folder, "item.pack")
+        assert not os.path.exists(os.path.join(cache_folder, "item"))
+        # Incomplete record of an interrupted write
+        with open(pack_path, "ab") as f:
+            f.write(cache.pack_record("event4.ics", ("",))[:-1])
+        with storage_.acquire_lock("r"):
+            [(_, item)] = collection.get_multi(["event1.ics"])
+            assert item is not None and "Event" in item.serialize()
+            assert collection._load_item_cache_payload("event4.ics") is None
+        monkeypatch.setattr(cache, "PACK_COMPACT_MIN_SIZE", 0)
+        with storage_.acquire_lock("w"):
+            collection.delete("event2.ics")
+            collection.delete("event3.ics")
+        pack = collection._get_item_cache_pack()
+        assert pack is not None and list(pack.offsets) == ["event1.ics"]
+        assert pack.dead == 0 and pack.end == os.path.getsize(pack_path)
+        with storage_.acquire_lock("r"):
+            [(_, item)] = collection.get_multi(["event1.ics"])
+            assert item is not None and "Event" in item.serialize()
+
+    def test_item_cache_packs_limit(self, monkeypatch) -> None:
+        """Unmap the packed item caches of the least recently used
+           collections."""
+        monkeypatch.setattr(cache, "ITEM_CACHE_PACKS_MAX", 2)
+        storage_ = self.application._storage
+        collections = [self._create_calendar("/calendar%d.ics/" % i, "event1")
+                       for i in range(4)]
+        packs = []
+        with storage_.acquire_lock("r"):
+            for collection in collections:
+                assert collection._load_item_cache_payload(
+                    "event1.ics") is not None
+                packs.append(collection._get_item_cache_pack())
+        assert list(storage_._item_cache_packs.values()) == packs[2:]
+        assert all(pack.data is None for pack in packs[:2])
+        with storage_.acquire_lock("r"):
+            [(_, item)] = collections[0].get_multi(["event1.ics"])
+            assert item is not None and "Event" in item.serialize()
+            assert collections[0]._load_item_cache_payload(
+                "event1.ics") is not None
+        assert len(storage_._item_cache_packs) == 2
+        assert packs[2].data is None and packs[3].data is not None
+
+    def test_item_cache_signature(self) -> None:
+        """Validate the item cache with the signature of the file."""
+        self.configure({"storage": {"item_cache_signature": "True"}})
+        storage_ = self.application._storage
+        collection = self._create_calendar("/calendar.ics/", "event1")
+        path = os.path.join(self.colpath, "collection-root", "calendar.ics",
+                            "event1.ics")
+        stat = os.stat(path)
+        # Modify the file without changing its signature
+        with open(path, "r+b") as f:
+            text = f.read()
+            f.seek(0)
+            f.write(text.replace(b"SUMMARY:Event", b"SUMMARY:Other"))
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        with storage_.acquire_lock("r"):
+            [(_, item)] = collection.get_multi(["event1.ics"])
+            assert item is not None and "SUMMARY:Event" in item.serialize()
+        self.configure({"storage": {"item_cache_signature": "False"}})
+        storage_ = self.application._storage
+        with storage_.acquire_lock("w"):
+            collection = storage_.create_collection("/calendar.ics/")
+            collection.set_meta({"tag": "VCALENDAR"})
+        with storage_.acquire_lock("r"):
+            [(_, item)] = collection.get_multi(["event1.ics"])
+            assert item is not None and "SUMMARY:Other" in item.serialize()
+
+    def test_item_memory_cache(self) -> None:
+        """Keep entries of the item cache in memory within the budget."""
+        self.configure({"storage": {"item_memory_cache_size": "100000"}})
+        storage_ = self.application._storage
+        collection = self._create_calendar("/calendar.ics/", "event1")
+        with storage_.acquire_lock("r"):
+            collection.get_multi(["event1.ics"])
+            hits = metrics.CACHE_HITS.get("item_memory")
+            # The packed item cache isn't read again
+            os.remove(collection._item_cache_pack_path())
+            [(_, item)] = collection.get_multi(["event1.ics"])
+            assert item is not None and "SUMMARY:Event" in item.serialize()
+        assert metrics.CACHE_HITS.get("item_memory") == hits + 1
+        assert 0 < cache._memory_cache.size <= 100000
+        # Entries are discarded when the budget is reduced
+        self.configure({"storage": {"item_memory_cache_size": "1"}})
+        assert len(cache._memory_cache) == 0
+
+    @pytest.mark.skipif(not os.environ.get("LDAP_URL"),
+                        reason="the address book is read from LDAP")
+    def test_warm_cache(self) -> None:
+        """Build the caches of all collections in worker processes."""
+        storage_ = self.application._storage
+        with storage_.acquire_lock("w"):
+            storage_.create_collection(
+                "/default/address_book.vcf/", items=[
+                    radicale_item.Item(
+                        collection_path="default/address_book.vcf",
+                        vobject_item=vobject.readOne(
+                            get_file_content("contact1.vcf")))],
+                props={"tag": "VADDRESSBOOK"})
+        cache_folder = os.path.join(self.colpath, "collection-root",
+                                    "default", "address_book.vcf",
+                                    ".Radicale.cache")
+        shutil.rmtree(cache_folder)
+        with storage_.acquire_lock("r"):
+            assert storage_.warm_cache(2)
+            assert storage_.verify(2)
+            # The same checks as in the serial verification
+            with pytest.raises(ValueError):
+                storage_._warm_collection("default/address_book.vcf",
+                                          {"tag": "VTODO"}, verify=True)
+        for name in ("history", "item.pack", "time_range"):
+            assert os.path.exists(os.path.join(cache_folder, name))
+
+    def test_group_commit(self, monkeypatch) -> None:
+        """Sync the write journal instead of the changed files and replay it
+           after a crash."""
+        fsyncs = []
+        monkeypatch.setattr(pathutils, "fsync", fsyncs.append)
+
+        def upload_events() -> None:
+            storage_ = self.application._storage
+            collection = self._create_calendar("/calendar.ics/")
+            fsyncs.clear()
+            for name in ("event1", "event2", "event3"):
+                with storage_.acquire_lock("w"):
+                    collection.upload(name + ".ics", radicale_item.Item(
+                        collection_path="calendar.ics",
+                        vobject_item=vobject.readOne(
+                            get_file_content(name + ".ics"))))
+
+        self.configure({"storage": {"_filesystem_fsync": "True"}})
+        upload_events()
+        direct_fsyncs = len(fsyncs)
+        self.configure({"storage": {"_filesystem_fsync": "True",
+                                    "group_commit_window": "0.001"}})
+        upload_events()
+        assert len(fsyncs) == 3 and direct_fsyncs > 3 * len(fsyncs)
+        assert os.path.getsize(os.path.join(self.colpath,
+                                            ".Radicale.journal")) > 0
+        # Changes that weren't written to disk before a crash of the system
+        path = os.path.join(self.colpath, "collection-root", "calendar.ics",
+                            "event1.ics")
+        with open(path, "w"):
+            pass
+        monkeypatch.setattr(journal, "boot_id", lambda: "restarted")
+        self.configure({"storage": {"_filesystem_fsync": "True",
+                                    "group_commit_window": "0.001"}})
+        assert os.path.getsize(os.path.join(self.colpath,
+                                            ".Radicale.journal")) == 0
+        with open(path) as f:
+            assert "Event" in f.read()
+
+    def test_group_commit_fsync(self, monkeypatch) -> None:
+        """Sync the files and folders of the write journal with the real
+           fsync."""
+        path = os.path.join(self.colpath, "event1.ics")
+        with open(path, "w") as f:
+            f.write(get_file_content("event1.ics"))
+        flags = []
+        os_open = os.open
+
+        def open_(file: str, flag: int, *args, **kwargs) -> int:
+            flags.append(flag)
+            return os_open(file, flag, *args, **kwargs)
+
+        monkeypatch.setattr(journal.os, "open", open_)
+        journal._fsync_path(path)
+        journal._fsync_path(self.colpath)
+        journal._fsync_path(os.path.join(self.colpath, "missing"))
+        monkeypatch.undo()
+        assert flags[0] == os.O_RDWR
+        if sys.platform != "win32":
+            assert flags[1] == os.O_RDONLY
+
+    @pytest.mark.parametrize("crash", [False, True])
+    def test_group_commit_restart(self, monkeypatch, crash: bool) -> None:
+        """Keep later changes of moved items when the journal is recovered
+           after a restart."""
+        self.configure({"storage": {"_filesystem_fsync": "True",
+                                    "group_commit_window": "0.001"}})
+        storage_ = self.application._storage
+
+        def event(name: str, summary: str) -> radicale_item.Item:
+            return radicale_item.Item(
+                collection_path="calendar.ics", vobject_item=vobject.readOne(
+                    get_file_content(name).replace(
+                        "SUMMARY:Event", "SUMMARY:" + summary)))
+
+        collection = self._create_calendar("/calendar.ics/")
+        with storage_.acquire_lock("w"):
+            collection.upload("a.ics", event("event1.ics", "Original"))
+        with storage_.acquire_lock("w"):
+            [(_, item)] = collection.get_multi(["a.ics"])
+            assert item is not None
+            storage_.move(item, collection, "b.ics")
+        with storage_.acquire_lock("w"):
+            collection.upload("a.ics", event("event2.ics", "Second"))
+        if crash:
+            monkeypatch.setattr(journal, "boot_id", lambda: "restarted")
+        self.configure({"storage": {"_filesystem_fsync": "True",
+                                    "group_commit_window": "0.001"}})
+        assert os.path.getsize(os.path.join(self.colpath,
+                                            ".Radicale.journal")) == 0
+        folder = os.path.join(self.colpath, "collection-root", "calendar.ics")
+        with open(os.path.join(folder, "a.ics")) as f:
+            assert "SUMMARY:Second" in f.read()
+        with open(os.path.join(folder, "b.ics")) as f:
+            assert "SUMMARY:Original" in f.read()
+
+    def test_time_range_index(self) -> None:
+        """Filter items by time range with the persisted index."""
+        storage_ = self.application._storage
+        time_range_filter = DefusedET.fromstring("""\
+<C:filter xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <C:comp-filter name="VCALENDAR">
+        <C:comp-filter name="VEVENT">
+            <C:time-range start="20130901T000000Z" end="20130902T000000Z"/>
+        </C:comp-filter>
+    </C:comp-filter>
+</C:filter>""")
+        collection = self._create_calendar("/calendar.ics/", "event1",
+                                           "event3")
+        index_path = os.path.join(self.colpath, "collection-root",
+                                  "calendar.ics", ".Radicale.cache",
+                                  "time_range")
+        with storage_.acquire_lock("r"):
+            assert [item.href for item, _ in collection.get_filtered(
+                [time_range_filter])] == ["event1.ics"]
+            index = collection._load_time_range_index()
+        # Items are sorted by start
+        assert index.hrefs == ["event1.ics", "event3.ics"]
+        assert index.max_ends == [max(index.ends)]
+        # The index is only written when the items change
+        mtime = os.stat(index_path).st_mtime_ns
+        storage_._time_range_arrays.clear()
+        with storage_.acquire_lock("r"):
+            assert [item.href for item, _ in collection.get_filtered(
+                [time_range_filter])] == ["event1.ics"]
+        assert os.stat(index_path).st_mtime_ns == mtime
+        # Entries of modified items are updated
+        with storage_.acquire_lock("w"):
+            collection.upload("event1.ics", radicale_item.Item(
+                collection_path="calendar.ics", vobject_item=vobject.readOne(
+                    get_file_content("event1.ics").replace(
+                        "20130901T1", "20130903T1"))))
+            collection.delete("event3.ics")
+        with storage_.acquire_lock("r"):
+            assert not list(collection.get_filtered([time_range_filter]))
+
+    @pytest.mark.parametrize("vectorised", [True, False])
+    def test_time_range_arrays(self, monkeypatch, vectorised: bool) -> None:
+        """Validate the time range index in memory with its token."""
+        if vectorised:
+            pytest.importorskip("numpy")
+        else:
+            monkeypatch.setattr(time_range, "numpy", None)
+        monkeypatch.setattr(time_range, "TIME_RANGE_BLOCK_SIZE", 2)
+        storage_ = self.application._storage
+        time_range_filter = DefusedET.fromstring("""\
+<C:filter xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <C:comp-filter name="VCALENDAR">
+        <C:comp-filter name="VEVENT">
+            <C:time-range start="20130901T000000Z" end="20130902T000000Z"/>
+        </C:comp-filter>
+    </C:comp-filter>
+</C:filter>""")
+        collection = self._create_calendar("/calendar.ics/", texts={
+            "event%d.ics" % i: get_file_content("event1.ics")
+            .replace("20130901T1", day + "T1")
+            .replace("UID:event1", "UID:event%d" % i)
+            for i, day in enumerate(("20130903", "20130801", "20130905",
+                                     "20130901"))})
+        with storage_.acquire_lock("r"):
+            assert [item.href for item, _ in collection.get_filtered(
+                [time_range_filter])] == ["event3.ics"]
+        # The copy in memory is used while the token is unchanged
+        with monkeypatch.context() as m:
+            m.setattr(collection, "_time_range_signatures", None)
+            m.setattr(collection, "_read_time_range_index", None)
+            with storage_.acquire_lock("r"):
+                assert [item.href for item, _ in collection.get_filtered(
+                    [time_range_filter])] == ["event3.ics"]
+        # Changes update the index and the copy in memory, the item files
+        # aren't scanned again
+        with monkeypatch.context() as m:
+            m.setattr(collection, "_time_range_signatures", None)
+            with storage_.acquire_lock("w"):
+                collection.upload("event0.ics", radicale_item.Item(
+                    collection_path="calendar.ics",
+                    vobject_item=vobject.readOne(
+                        get_file_content("event1.ics")
+                        .replace("UID:event1", "UID:event0"))))
+                collection.delete("event3.ics")
+            m.setattr(collection, "_read_time_range_index", None)
+            with storage_.acquire_lock("r"):
+                assert [item.href for item, _ in collection.get_filtered(
+                    [time_range_filter])] == ["event0.ics"]
+        # Files modified by other programs are found by rescanning them
+        path = os.path.join(self.colpath, "collection-root", "calendar.ics",
+                            "event2.ics")
+        with open(path) as f:
+            text = f.read()
+        with open(path, "w") as f:
+            f.write(text.replace("20130905T1", "20130901T1"))
+        with storage_.acquire_lock("r"):
+            collection._load_time_range_index(rescan=True)
+            assert sorted(item.href for item, _ in collection.get_filtered(
+                [time_range_filter])) == ["event0.ics", "event2.ics"]
+
+    def test_free_busy_query(self, monkeypatch) -> None:
+        """Answer free-busy-query with the busy time of the events."""
+        storage_ = self.application._storage
+        collection = self._create_calendar("/calendar.ics/", texts={
+            "event1.ics": get_file_content("event1.ics").replace(
+                "SUMMARY:Event\n", "SUMMARY:Event\nTRANSP:TRANSPARENT\n"),
+            "event2.ics": get_file_content("event2.ics")})
+        with storage_.acquire_lock("r"):
+            # The busy time is stored in the item cache
+            [(_, item)] = collection.get_multi(["event2.ics"])
+            assert item is not None and item._busy_time is not None
+            answer = report.free_busy_report(DefusedET.fromstring("""\
+<C:free-busy-query xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <C:time-range start="20130901T000000Z" end="20130917T000000Z"/>
+</C:free-busy-query>"""), collection, lambda: None)
+        assert "BEGIN:VFREEBUSY" in answer
+        freebusy = vobject.readOne(answer).vfreebusy.freebusy
+        assert freebusy.fbtype_param == "BUSY"
+        assert [(start.isoformat(), end.isoformat())
+                for start, end in freebusy.value] == [
+            ("2013-09-02T16:00:00+00:00", "2013-09-02T17:00:00+00:00"),
+            ("2013-09-10T15:00:00+00:00", "2013-09-10T16:00:00+00:00"),
+            ("2013-09-16T16:00:00+00:00", "2013-09-16T17:00:00+00:00")]
+
+        # Windows around the current time are answered with the precomputed
+        # busy time without parsing the events
+        start = datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=14)
+        [(_, item)] = collection.get_multi(["event2.ics"])
+        assert item is not None
+        _, _, intervals = radicale_item.find_busy_time(
+            item.vobject_item, "VEVENT", start, end)
+        assert len(intervals) == 2
+
+        def find_busy_time(*args, **kwargs) -> radicale_item.BusyTime:
+            raise AssertionError("busy time computed again")
+
+        monkeypatch.setattr(radicale_item, "find_busy_time", find_busy_time)
+        with storage_.acquire_lock("r"):
+            answer = report.free_busy_report(DefusedET.fromstring("""\
+<C:free-busy-query xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <C:time-range start="%s" end="%s"/>
+</C:free-busy-query>""" % (start.strftime("%Y%m%dT%H%M%SZ"),
+                           end.strftime("%Y%m%dT%H%M%SZ"))),
+                collection, lambda: None)
+        freebusy = vobject.readOne(answer).vfreebusy.freebusy
+        assert [(math.floor(period_start.timestamp()),
+                 math.ceil(period_end.timestamp()))
+                for period_start, period_end in freebusy.value] == [
+            (interval_start, interval_end)
+            for interval_start, interval_end, _ in intervals]
+
+    def test_busy_time_refresh(self, monkeypatch) -> None:
+        """Replace entries of the item cache whose busy time doesn't cover
+           the near future anymore, or that were stored by other versions."""
+        storage_ = self.application._storage
+        collection = self._create_calendar("/calendar.ics/", "event2")
+        payload = collection._load_item_cache_payload("event2.ics")
+        assert payload is not None and payload[0] == storage.CACHE_VERSION
+        # Time passes until the window ends too early
+        monkeypatch.setattr(radicale_item, "BUSY_TIME_HORIZON",
+                            timedelta(days=1000))
+        assert radicale_item.is_busy_time_stale(payload[-1])
+        with storage_.acquire_lock("r"):
+            [(_, item)] = collection.get_multi(["event2.ics"])
+            assert item is not None and item._busy_time is not None
+            assert not radicale_item.is_busy_time_stale(item._busy_time)
+        payload = collection._load_item_cache_payload("event2.ics")
+        assert payload is not None and payload[-1] == item._busy_time
+        monkeypatch.setattr(storage, "CACHE_VERSION", b"other")
+        cache._memory_cache.clear()
+        with storage_.acquire_lock("r"):
+            assert collection._load_item_cache("event2.ics", payload[1],
+                                               payload[2]) is None
 
     def test_put_whole_calendar_uids_used_as_file_names(self) -> None:
         """Test if UIDs are used as file names."""
@@ -187,3 +611,191 @@ class TestCustomStorageSystemCallable(BaseTest):
             "type": radicale.tests.custom.storage_simple_sync.Storage}})
 
     test_add_event = _TestBaseRequests.test_add_event
+
+
+class TestSqlite(BaseTest):
+    """Tests for sqlite."""
+
+    def setup(self) -> None:
+        _TestBaseRequests.setup(cast(_TestBaseRequests, self))
+        self.configure({"storage": {"type": "sqlite"}})
+
+    test_add_event = _TestBaseRequests.test_add_event
+    test_add_contact = _TestBaseRequests.test_add_contact
+    test_move = _TestBaseRequests.test_move
+
+    @pytest.mark.parametrize("failure", ["error", "timeout"])
+    def test_parallel_filter_fallback(self, monkeypatch, failure: str
+                                      ) -> None:
+        """Items are matched in the request thread when the process pool
+           fails or doesn't answer in time."""
+        self.mkcalendar("/calendar.ics/")
+        self.put("/calendar.ics/event1.ics", get_file_content("event1.ics"))
+        self.configure({"server": {"report_workers": "1",
+                                   "report_parallel_min_items": "0"}})
+        futures: List[concurrent.futures.Future] = []
+
+        class Executor(concurrent.futures.Executor):
+            def submit(self, *args, **kwargs) -> concurrent.futures.Future:
+                if failure == "error":
+                    raise RuntimeError(
+                        "cannot schedule new futures after shutdown")
+                # The worker processes never answer
+                futures.append(concurrent.futures.Future())
+                return futures[-1]
+
+        @contextlib.contextmanager
+        def use_executor(workers: int) -> Iterator[Executor]:
+            yield Executor()
+
+        monkeypatch.setattr(report, "use_executor", use_executor)
+        monkeypatch.setattr(report, "PARALLEL_TIMEOUT", 0)
+        _, responses = self.report("/calendar.ics/", """\
+<?xml version="1.0" encoding="utf-8" ?>
+<C:calendar-query xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <D:prop>
+        <D:getetag />
+    </D:prop>
+    <C:filter>
+        <C:comp-filter name="VCALENDAR">
+            <C:comp-filter name="VEVENT">
+                <C:prop-filter name="SUMMARY">
+                    <C:text-match>event</C:text-match>
+                </C:prop-filter>
+            </C:comp-filter>
+        </C:comp-filter>
+    </C:filter>
+</C:calendar-query>""")
+        assert "/calendar.ics/event1.ics" in responses
+        assert all(future.cancelled() for future in futures)
+        assert len(futures) == (failure == "timeout")
+
+    def test_get_collection_stream(self, monkeypatch) -> None:
+        """The export of a collection is generated from the items that were
+           read with the storage lock of the headers, the lock isn't held
+           while the body is sent."""
+        storage_ = self.application._storage
+        locks = []
+        self.mkcalendar("/calendar.ics/")
+        self.put("/calendar.ics/event1.ics", get_file_content("event1.ics"))
+        iter_serialize = storage.BaseCollection.iter_serialize
+
+        def locked_iter_serialize(
+                collection: storage.BaseCollection,
+                items: Optional[Iterable[radicale_item.Item]] = None
+                ) -> Iterable[str]:
+            for chunk in iter_serialize(collection, items):
+                locks.append(storage_._lock.locked)
+                yield chunk
+
+        monkeypatch.setattr(storage.BaseCollection, "iter_serialize",
+                            locked_iter_serialize)
+        _, answer = self.get("/calendar.ics/")
+        assert "BEGIN:VEVENT" in answer and "UID:event1" in answer
+        assert locks and set(locks) == {""}
+        self.request("HEAD", "/calendar.ics/", check=200)
+        assert storage_._lock.locked == ""
+
+        def failing_iter_serialize(
+                collection: storage.BaseCollection,
+                items: Optional[Iterable[radicale_item.Item]] = None
+                ) -> Iterable[str]:
+            yield "BEGIN:VCALENDAR\r\n"
+            raise RuntimeError("Failed to read item")
+
+        monkeypatch.setattr(storage.BaseCollection, "iter_serialize",
+                            failing_iter_serialize)
+        # The response is aborted after the headers were sent
+        with pytest.raises(RuntimeError):
+            self.get("/calendar.ics/")
+        assert storage_._lock.locked == ""
+
+    def test_principal_collection_deleted_elsewhere(self) -> None:
+        """Create principal collections again that were deleted by another
+           process."""
+        self.request("OPTIONS", "/", check=200, login="user:")
+        application = self.application
+        # Another process deletes the principal collection
+        self.configure({})
+        self.delete("/user/", login="user:")
+        self.application = application
+        storage_ = self.application._storage
+        with storage_.acquire_lock("r"):
+            assert next(iter(storage_.discover("/user/")), None) is None
+        # The collection is looked up again when the known path expired
+        assert "/user/" in self.application._principal_paths
+        self.application._principal_paths["/user/"] = 0
+        self.request("OPTIONS", "/", check=200, login="user:")
+        with storage_.acquire_lock("r"):
+            assert next(iter(storage_.discover("/user/")), None) is not None
+
+    def test_replace_collection_fail(self) -> None:
+        """Keep the collection if its replacement fails within the lock."""
+        storage_ = self.application._storage
+
+        class BrokenItem(radicale_item.Item):
+            @property
+            def busy_time(self) -> radicale_item.BusyTime:
+                raise RuntimeError("broken item")
+
+        def items(*names: str, cls=radicale_item.Item):
+            return [cls(collection_path="user/calendar.ics",
+                        vobject_item=vobject.readOne(
+                            get_file_content(name + ".ics")))
+                    for name in names]
+
+        with storage_.acquire_lock("w"):
+            collection = storage_.create_collection(
+                "/user/calendar.ics/", items=items("event1"),
+                props={"tag": "VCALENDAR"})
+        with storage_.acquire_lock("w"):
+            with pytest.raises(ValueError):
+                storage_.create_collection(
+                    "/user/calendar.ics/",
+                    items=items("event2") + items("event3", cls=BrokenItem),
+                    props={"tag": "VCALENDAR", "D:displayname": "Other"})
+        with storage_.acquire_lock("r"):
+            assert [item.href for item in collection.get_all()] == [
+                "event1.ics"]
+            assert collection.get_meta() == {"tag": "VCALENDAR"}
+
+    def test_collection(self) -> None:
+        """Filter, synchronize and delete items in a collection."""
+        storage_ = self.application._storage
+        time_range_filter = DefusedET.fromstring("""\
+<C:filter xmlns:C="urn:ietf:params:xml:ns:caldav">
+    <C:comp-filter name="VCALENDAR">
+        <C:comp-filter name="VEVENT">
+            <C:time-range start="20130901T000000Z" end="20130902T000000Z"/>
+        </C:comp-filter>
+    </C:comp-filter>
+</C:filter>""")
+        with storage_.acquire_lock("w"):
+            collection = storage_.create_collection(
+                "/user/calendar.ics/", items=[
+                    radicale_item.Item(
+                        collection_path="user/calendar.ics",
+                        vobject_item=vobject.readOne(
+                            get_file_content(name + ".ics")))
+                    for name in ("event1", "event3")],
+                props={"tag": "VCALENDAR"})
+        with storage_.acquire_lock("r"):
+            assert [item.path for item in storage_.discover("/user/", "1")
+                    ] == ["user", "user/calendar.ics"]
+            hrefs = [item.href for item in collection.get_all()]
+            assert hrefs == ["event1.ics", "event3.ics"]
+            assert [item.href for item, _ in collection.get_filtered(
+                [time_range_filter])] == ["event1.ics"]
+            assert collection.has_uid("event3")
+            token, changes = collection.sync()
+            assert sorted(changes) == hrefs
+        with storage_.acquire_lock("w"):
+            collection.delete("event3.ics")
+        with storage_.acquire_lock("r"):
+            assert collection.sync(token)[1] == ["event3.ics"]
+            assert storage_.verify()
+        with storage_.acquire_lock("w"):
+            collection.delete()
+        with storage_.acquire_lock("r"):
+            assert [item.path for item in storage_.discover("/user/", "1")
+                    ] == ["user"]
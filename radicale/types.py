@@ -16,11 +16,12 @@
 
 import contextlib
 import sys
-from typing import (Any, Callable, ContextManager, Iterator, List, Mapping,
-                    MutableMapping, Sequence, Tuple, TypeVar, Union)
+from typing import (Any, Callable, ContextManager, Iterable, Iterator, List,
+                    Mapping, MutableMapping, Sequence, Tuple, TypeVar, Union)
 
 WSGIResponseHeaders = Union[Mapping[str, str], Sequence[Tuple[str, str]]]
-WSGIResponse = Tuple[int, WSGIResponseHeaders, Union[None, str, bytes]]
+WSGIResponse = Tuple[int, WSGIResponseHeaders,
+                     Union[None, str, bytes, Iterable[str]]]
 WSGIEnviron = Mapping[str, Any]
 WSGIStartResponse = Callable[[str, List[Tuple[str, str]]], Any]
 
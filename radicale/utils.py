@@ -16,11 +16,14 @@
 # You should have received a copy of the GNU General Public License
 # along with Radicale.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import sys
+import threading
 from importlib import import_module
-from typing import Callable, Sequence, Type, TypeVar, Union
+from typing import (Callable, Generic, Hashable, Optional, Sequence, Tuple,
+                    Type, TypeVar, Union)
 
-from radicale import config
+from radicale import config, metrics
 from radicale.log import logger
 
 if sys.version_info < (3, 8):
@@ -29,6 +32,8 @@ else:
     from importlib import metadata
 
 _T_co = TypeVar("_T_co", covariant=True)
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
 
 
 def load_plugin(internal_types: Sequence[str], module_name: str,
@@ -55,3 +60,68 @@ def package_version(name):
     if sys.version_info < (3, 8):
         return pkg_resources.get_distribution(name).version
     return metadata.version(name)
+
+
+class LRUCache(Generic[_K, _V]):
+    """Thread-safe cache that discards the least recently used entries.
+
+    Hits and misses are counted in the metrics of the cache ``name``.
+
+    ``maxsize`` limits the number of entries or, with ``sizeof``, the sum of
+    the sizes of the entries. Values larger than ``maxsize`` aren't cached.
+
+    """
+
+    name: str
+    maxsize: int
+    size: int
+    _sizeof: Optional[Callable[[_V], int]]
+    _entries: "collections.OrderedDict[_K, Tuple[_V, int]]"
+    _lock: threading.Lock
+
+    def __init__(self, name: str, maxsize: int,
+                 sizeof: Optional[Callable[[_V], int]] = None) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.size = 0
+        self._sizeof = sizeof
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        while self.size > self.maxsize:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+
+    def get(self, key: _K) -> Optional[_V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.cache_result(self.name, entry is not None)
+        return None if entry is None else entry[0]
+
+    def put(self, key: _K, value: _V) -> None:
+        size = 1 if self._sizeof is None else self._sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            if size > self.maxsize:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            self._evict()
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0